@@ -0,0 +1,212 @@
+#  EMEKA EXPENSE — spending analytics
+#
+# Top-N selection with heapq (O(n log k) instead of sorting everything) and
+# per-period spend distributions from KLL quantile sketches. One sketch is
+# kept per (month, category); because KLL sketches merge, "this category
+# over all months" or "everything in March" is a merge of a handful of
+# small sketches rather than a pass over the ledger.
+
+import heapq
+import math
+import random
+from collections import defaultdict
+
+from ledger import month_key
+
+_rng = random.Random(0x5EED)  # compaction coin flips; seeded for repeatable reports
+
+
+class KLLSketch:
+    """Mergeable streaming quantile sketch (Karnin, Lang & Liberty 2016).
+
+    Level ``h`` holds items of weight 2**h. When a level overflows it is
+    sorted and every other item (random offset) is promoted to the next
+    level. With ``k=200`` the rank error is around 1% and the sketch holds
+    about 3k values at most (a few hundred in practice), however many it
+    has seen. Small groups are stored exactly.
+    """
+
+    def __init__(self, k=200):
+        self.k = k
+        self.n = 0
+        self.levels = [[]]
+        self._size = 0
+        self._max_size = self._capacity(0)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, x):
+        self.levels[0].append(x)
+        self.n += 1
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for h, lv in enumerate(other.levels):
+            self.levels[h].extend(lv)
+        self.n += other.n
+        self._size += other._size
+        self._max_size = sum(self._capacity(h) for h in range(len(self.levels)))
+        self._compress()
+        return self
+
+    def _compress(self):
+        # compact the lowest overflowing level until everything fits again
+        while self._size >= self._max_size:
+            for h, lv in enumerate(self.levels):
+                if len(lv) >= self._capacity(h):
+                    break
+            if h + 1 == len(self.levels):
+                self.levels.append([])
+                self._max_size = sum(self._capacity(i) for i in range(len(self.levels)))
+            lv.sort()
+            keep = [lv.pop()] if len(lv) % 2 else []
+            promoted = lv[_rng.randrange(2)::2]
+            self.levels[h + 1].extend(promoted)
+            self.levels[h] = keep
+            self._size -= len(lv) - len(promoted)
+
+    def quantiles(self, qs):
+        """Values at each fraction in ``qs`` (0..1), None when empty."""
+        weighted = sorted((v, 1 << h) for h, lv in enumerate(self.levels) for v in lv)
+        if not weighted:
+            return [None for _ in qs]
+        total = sum(w for _, w in weighted)
+        out = []
+        for q in qs:
+            target = q * total
+            acc = 0
+            for v, w in weighted:
+                acc += w
+                if acc >= target:
+                    out.append(v)
+                    break
+            else:
+                out.append(weighted[-1][0])
+        return out
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    @classmethod
+    def merged(cls, sketches, k=200):
+        out = cls(k)
+        for s in sketches:
+            out.merge(s)
+        return out
+
+
+def top_categories(totals, n=5):
+    """Largest (category, amount) pairs of a category -> total mapping."""
+    return heapq.nlargest(n, totals.items(), key=lambda kv: kv[1])
+
+
+class SpendAnalytics:
+    """Per (month, category) sketches and rows, maintained incrementally.
+
+    Built once with ``build_steps`` (a generator, so the UI scheduler can
+    run it in slices); until then ``ready`` is False and ``add``/``remove``
+    are ignored because the build picks up every row still in the list.
+    Sketches can't forget values, so ``remove`` marks the period dirty and
+    its sketch is rebuilt from the period's rows the next time it's read.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, k=200):
+        self.k = k
+        self._reset()
+
+    def _reset(self):
+        self.ready = False
+        self._restart = False
+        self.sketches = {}
+        self.rows = defaultdict(list)
+        self.totals = defaultdict(float)
+        self._dirty = set()
+
+    def build_steps(self, expenses, chunk=2000):
+        while True:
+            self._reset()
+            i = 0
+            # the list may grow while we yield; read its length each round
+            while i < len(expenses) and not self._restart:
+                for e in expenses[i:i + chunk]:
+                    self._add(e)
+                i += chunk
+                yield
+            if not self._restart:
+                break
+        self.ready = True
+
+    def _key(self, e):
+        return (month_key(e.get("date", "")), e.get("category", ""))
+
+    def _add(self, e):
+        key = self._key(e)
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = KLLSketch(self.k)
+        sketch.update(e["amount"])
+        self.rows[key].append(e)
+        self.totals[key] += e["amount"]
+
+    def add(self, e):
+        if self.ready:
+            self._add(e)
+
+    def remove(self, e):
+        if not self.ready:
+            self._restart = True  # the build may already have counted it
+            return
+        key = self._key(e)
+        rows = self.rows.get(key, [])
+        for i, r in enumerate(rows):
+            if r is e:
+                del rows[i]
+                self.totals[key] -= e["amount"]
+                self._dirty.add(key)
+                break
+
+    def _sketch(self, key):
+        if key in self._dirty:
+            self._dirty.discard(key)
+            sketch = KLLSketch(self.k)
+            for e in self.rows[key]:
+                sketch.update(e["amount"])
+            self.sketches[key] = sketch
+        return self.sketches[key]
+
+    # ---- queries ----
+    def months(self):
+        return sorted({m for m, _ in self.rows if m}, reverse=True)
+
+    def _keys(self, month=None):
+        return [key for key, rows in self.rows.items() if rows and (month is None or key[0] == month)]
+
+    def distribution(self, month=None):
+        """Per-category count/total/median/p90/p99 for ``month`` (None: all time)."""
+        by_cat = defaultdict(list)
+        for key in self._keys(month):
+            by_cat[key[1]].append(key)
+        out = []
+        for cat, keys in by_cat.items():
+            sketch = KLLSketch.merged((self._sketch(k) for k in keys), self.k)
+            p50, p90, p99 = sketch.quantiles(self.QUANTILES)
+            out.append({
+                "category": cat,
+                "count": sum(len(self.rows[k]) for k in keys),
+                "total": sum(self.totals[k] for k in keys),
+                "median": p50, "p90": p90, "p99": p99,
+            })
+        out.sort(key=lambda d: d["total"], reverse=True)
+        return out
+
+    def top_expenses(self, n=10, month=None):
+        keys = self._keys(month)
+        return heapq.nlargest(n, (e for k in keys for e in self.rows[k]), key=lambda e: e["amount"])
@@ -0,0 +1,180 @@
+#  EMEKA EXPENSE — unusual expense detection
+#
+# Per category, amounts are tracked on a log scale (a mistyped ₦120,000 for
+# ₦1,200 is a 100x jump whatever the category) with two O(1)-per-update
+# estimators: Welford's running mean/variance, and a P² (Jain & Chlamtac)
+# streaming median plus a second P² over absolute deviations from it for
+# the MAD. The robust z-score (value - median) / (1.4826 * MAD) decides;
+# one big outlier barely moves the median/MAD, unlike the mean/stddev.
+#
+#     python anomaly.py statement.csv     # streaming scan, constant memory
+
+import math
+import sys
+
+from formatting import money, whole
+
+MIN_SAMPLES = 8     # don't judge a category before it has some history
+THRESHOLD = 3.5     # robust z above which an amount is flagged (Iglewicz & Hoaglin)
+MIN_SCALE = 0.1     # log-scale floor, so a category of identical amounts still tolerates ~10%
+
+
+class P2Quantile:
+    """Streaming quantile estimate in constant space (P² algorithm)."""
+
+    def __init__(self, p=0.5):
+        self.p = p
+        self.q = []  # marker heights
+        self.n = [0, 1, 2, 3, 4]  # marker positions
+        self.np = [0, 2 * p, 4 * p, 2 + 2 * p, 4]  # desired positions
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, x):
+        q = self.q
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        n = self.n
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # parabolic prediction, linear if that would break ordering
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self):
+        q = self.q
+        if not q:
+            return None
+        if len(q) < 5:
+            return q[min(len(q) - 1, int(self.p * len(q)))]
+        return q[2]
+
+
+class CategoryStats:
+    __slots__ = ("count", "mean", "m2", "median", "mad")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.median = P2Quantile(0.5)
+        self.mad = P2Quantile(0.5)
+
+    def update(self, x):
+        # Welford
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        # deviation from the median estimate so far, then the median itself
+        med = self.median.value()
+        if med is not None:
+            self.mad.update(abs(x - med))
+        self.median.update(x)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def zscore(self, x):
+        med = self.median.value()
+        mad = self.mad.value() or 0.0
+        scale = 1.4826 * mad if mad > 1e-9 else self.std
+        return (x - med) / max(scale, MIN_SCALE)
+
+
+def _log(amount):
+    return math.log1p(max(amount, 0.0))
+
+
+class AnomalyDetector:
+    def __init__(self, min_samples=MIN_SAMPLES, threshold=THRESHOLD):
+        self.min_samples = min_samples
+        self.threshold = threshold
+        self.stats = {}
+
+    def observe(self, e):
+        cat = e.get("category", "")
+        st = self.stats.get(cat)
+        if st is None:
+            st = self.stats[cat] = CategoryStats()
+        st.update(_log(e["amount"]))
+
+    def check(self, e):
+        """Warning text if ``e``'s amount is unusual for its category, else None.
+
+        Deleting or editing rows doesn't un-observe them; the estimates are
+        robust enough that a rebuild on load is sufficient.
+        """
+        st = self.stats.get(e.get("category", ""))
+        if st is None or st.count < self.min_samples:
+            return None
+        x = _log(e["amount"])
+        z = st.zscore(x)
+        if abs(z) < self.threshold:
+            return None
+        usual = math.expm1(st.median.value())
+        ratio = e["amount"] / usual if usual > 0 else float("inf")
+        if ratio >= 1:
+            size = f"about {ratio:,.0f}× the" if ratio >= 2 else "well above the"
+        else:
+            size = f"about 1/{1 / ratio:,.0f} of the" if 0 < ratio <= 0.5 else "well below the"
+        return f"{money(e['amount'])} is {size} usual {e.get('category') or 'uncategorized'} expense ({whole(usual)})."
+
+    def build_steps(self, expenses, chunk=5000):
+        for start in range(0, len(expenses), chunk):
+            for e in expenses[start:start + chunk]:
+                self.observe(e)
+            yield
+
+    def scan(self, rows):
+        """Stream ``rows``, yielding (index, row, warning) for unusual ones.
+
+        Each row is judged against what came before it and then observed,
+        so memory stays constant whatever the input size.
+        """
+        for i, e in enumerate(rows):
+            warning = self.check(e)
+            if warning is not None:
+                yield i, e, warning
+            self.observe(e)
+
+
+if __name__ == "__main__":
+    from ledger import read_csv
+    from rules import RulesEngine
+
+    if len(sys.argv) != 2:
+        sys.exit("usage: python anomaly.py <expenses.csv>")
+    rules = RulesEngine()
+
+    def categorized(f):
+        for e in read_csv(f):
+            e["category"] = e["category"] or rules.categorize(e["description"], e["amount"], default="Other")
+            yield e
+
+    with open(sys.argv[1], newline="", encoding="utf-8-sig") as f:
+        for i, e, warning in AnomalyDetector().scan(categorized(f)):
+            print(f"row {i + 1}: {e['date']} {e['description']!r}: {warning}")
@@ -0,0 +1,375 @@
+#  EMEKA EXPENSE — local HTTP/JSON API
+#
+# Lets scripts and phones on the LAN log and query expenses in the same data
+# file as the desktop app. Plain asyncio streams, no dependencies:
+#
+#     python api_server.py --host 0.0.0.0 --port 8765 --token s3cret
+#
+#   GET  /summary                        total, budget, count, currency
+#   GET  /expenses?q=&category=&limit=&offset=   newest first
+#   GET  /expenses/<id>
+#   POST /expenses                       one expense object or a list of them
+#   GET  /aggregate/monthly              {"YYYY-MM": amount}
+#   GET  /aggregate/categories           {category: amount}
+#
+# An expense may name a "currency" (ISO code); without one it is in the
+# ledger's base currency. Totals and aggregates are in the ledger's
+# reporting currency, converted with its rates as in the app; rows with no
+# rate are left out and counted in /summary's "no_rate".
+# Connections are kept alive (HTTP/1.1). Every write goes through a single
+# writer task: adds queued by concurrent requests are merged into one delta
+# and one journal commit, so clients can't interleave writes to the file.
+# Aggregates are kept up to date as rows are added rather than recomputed
+# per request. Their responses carry an ETag derived from the ledger
+# version and answer If-None-Match with 304 while nothing has changed.
+#
+# An encrypted ledger is opened with the passphrase in $EMEKA_PASSPHRASE.
+#
+# The desktop app picks up writes made here on its next refresh (Storage
+# notices the file changed); run the server while the app is closed or
+# idle if both are going to write.
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+import encryption
+from formatting import normalize_date, parse_timestamp
+from fx import Converter
+from instrumentation import metrics
+from ledger import (DATA_FILE, DATE_FORMAT, Storage, apply_delta, ensure_ids, expense_matcher, month_key, new_id,
+                    parse_amount)
+from rules import RulesEngine
+
+MAX_BODY = 8 * 1024 * 1024
+MAX_BATCH = 5000       # rows merged into one commit by the writer
+IDLE_TIMEOUT = 30      # seconds a kept-alive connection may sit idle
+REASONS = {200: "OK", 201: "Created", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized",
+           404: "Not Found", 405: "Method Not Allowed", 411: "Length Required", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LedgerService:
+    """The data file plus the single writer that mutates it."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.queue = asyncio.Queue()
+        # ETags are "<generation>-<version>": the generation keeps a restarted
+        # server from matching tags handed out by the previous one
+        self.generation = f"{os.getpid():x}{int(datetime.now().timestamp()):x}"
+        self.version = 0
+        # set while Storage.commit runs in the executor; the file looks stale
+        # until it returns, and must not be reloaded half-written
+        self._committing = False
+        self.data = None
+        self._reload()
+
+    def _reload(self):
+        data = self.storage.load()
+        if self.storage.last_error is not None:
+            if self.data is None:
+                raise self.storage.last_error  # don't start serving (and saving over) an empty ledger
+            return  # keep serving what we have; retried once the file changes again
+        self.data = data
+        if "expenses" not in self.data:
+            self.data = {"expenses": [], "budget": 0.0}
+        ensure_ids(self.data)
+        self.by_id = {e["id"]: e for e in self.data["expenses"]}
+        self.rules = RulesEngine(self.data.get("rules"))
+        self.fx = Converter.for_ledger(self.data)
+        self.no_rate = 0
+        self.total = 0.0
+        self.monthly = defaultdict(float)
+        self.by_category = defaultdict(float)
+        self._aggregate(self.data["expenses"])
+        self.version += 1
+
+    def _aggregate(self, rows):
+        for e in rows:
+            amount = self.fx.amount(e)
+            if amount is None:
+                self.no_rate += 1
+                continue
+            self.total += amount
+            self.by_category[e["category"]] += amount
+            key = month_key(e["date"])
+            if key:
+                self.monthly[key] += amount
+
+    def fresh(self):
+        # the desktop app may have written since; our own commit in flight
+        # doesn't count (this and the writer both run on the event loop)
+        if not self._committing and self.storage.is_stale():
+            self._reload()
+
+    @property
+    def etag(self):
+        return f'W/"{self.generation}-{self.version}"'
+
+    # ---- writes ----
+    def validate(self, obj):
+        if not isinstance(obj, dict):
+            raise HTTPError(400, "each expense must be a JSON object")
+        try:
+            amount = round(parse_amount(obj["amount"]), 2)
+        except (KeyError, ValueError):
+            raise HTTPError(400, "amount is required and must be a number")
+        date = str(obj.get("date") or datetime.now().strftime(DATE_FORMAT))
+        if parse_timestamp(date) is None:
+            # "2024-01-31", "31/01/2024" … are stored in the canonical layout
+            date = normalize_date(date)
+            if date is None:
+                raise HTTPError(400, f"date must look like {datetime.now().strftime(DATE_FORMAT)!r}")
+        currency = str(obj.get("currency") or "").strip().upper()
+        if currency and not (len(currency) == 3 and currency.isalpha()):
+            raise HTTPError(400, "currency must be a three-letter code like USD")
+        desc = str(obj.get("description") or "-").strip()
+        category = str(obj.get("category") or "").strip().title()
+        row = {"amount": amount, "category": category or self.rules.categorize(desc, amount, default="Other"),
+               "description": desc, "date": date}
+        if currency and currency != self.fx.base:
+            row["currency"] = currency
+        return row
+
+    def _discard(self, rows, total, no_rate, by_category, monthly):
+        apply_delta(self.data, {"op": "pop", "ids": [e["id"] for e in rows]})
+        for e in rows:
+            self.by_id.pop(e["id"], None)
+        self.total = total
+        self.no_rate = no_rate
+        self.by_category = defaultdict(float, by_category)
+        self.monthly = defaultdict(float, monthly)
+
+    async def add(self, rows):
+        done = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, done))
+        return await done
+
+    async def writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self.queue.get()]
+            count = len(jobs[0][0])
+            while count < MAX_BATCH and not self.queue.empty():
+                jobs.append(self.queue.get_nowait())
+                count += len(jobs[-1][0])
+            applied = None
+            try:
+                self.fresh()
+                rows = []
+                for job_rows, _ in jobs:
+                    for e in job_rows:
+                        e["id"] = new_id(self.data)
+                    rows.extend(job_rows)
+                delta = {"op": "add", "rows": rows}
+                # what to put back if the commit fails: copies are per
+                # category and month, not per row
+                applied = (rows, self.total, self.no_rate, dict(self.by_category), dict(self.monthly))
+                apply_delta(self.data, delta)
+                for e in rows:
+                    self.by_id[e["id"]] = e
+                self._aggregate(rows)
+                # file I/O off the loop; nothing else writes until it's done
+                self._committing = True
+                try:
+                    await loop.run_in_executor(None, self.storage.commit, self.data, [delta])
+                finally:
+                    self._committing = False
+                applied = None
+                self.version += 1
+                metrics.count("api.commits")
+                metrics.count("api.rows_added", len(rows))
+                for job_rows, done in jobs:
+                    done.set_result(job_rows)
+            except Exception as exc:
+                if applied is not None:
+                    self._discard(*applied)  # the file doesn't have them; neither should we
+                for _, done in jobs:
+                    if not done.done():
+                        done.set_exception(exc)
+
+
+# ---------- Routes ----------
+def _int(query, name, default):
+    try:
+        return int(query.get(name, [default])[0])
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer")
+
+
+async def route(service, method, path, query, body):
+    """(status, payload, cacheable) for one request."""
+    service.fresh()
+    parts = [p for p in path.split("/") if p]
+    if parts == ["expenses"]:
+        if method == "POST":
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                raise HTTPError(400, "body must be JSON")
+            objs = payload if isinstance(payload, list) else [payload]
+            rows = [service.validate(o) for o in objs]
+            if not rows:
+                raise HTTPError(400, "nothing to add")
+            added = await service.add(rows)
+            return 201, added if isinstance(payload, list) else added[0], False
+        if method != "GET":
+            raise HTTPError(405, "use GET or POST")
+        matches = expense_matcher(query.get("q", [""])[0], query.get("category", ["All"])[0])
+        limit, offset = _int(query, "limit", 100), _int(query, "offset", 0)
+        out, skipped = [], 0
+        for e in reversed(service.data["expenses"]):
+            if len(out) >= limit:
+                break
+            if matches is None or matches(e):
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                out.append(e)
+        return 200, out, False
+    if method != "GET":
+        raise HTTPError(405, "read-only endpoint")
+    if len(parts) == 2 and parts[0] == "expenses":
+        try:
+            e = service.by_id.get(int(parts[1]))
+        except ValueError:
+            e = None
+        if e is None:
+            raise HTTPError(404, "no such expense")
+        return 200, e, False
+    if parts == ["summary"]:
+        return 200, {"total": round(service.total, 2), "budget": service.data.get("budget", 0.0),
+                     "count": len(service.data["expenses"]), "currency": service.fx.reporting,
+                     "no_rate": service.no_rate}, True
+    if parts == ["aggregate", "monthly"]:
+        return 200, {k: round(v, 2) for k, v in sorted(service.monthly.items())}, True
+    if parts == ["aggregate", "categories"]:
+        return 200, {k: round(v, 2) for k, v in service.by_category.items()}, True
+    raise HTTPError(404, "unknown endpoint")
+
+
+# ---------- HTTP ----------
+async def _read_request(reader):
+    line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = h.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = b""
+    if method in ("POST", "PUT"):
+        if "content-length" not in headers:
+            raise HTTPError(411, "Content-Length required")
+        length = int(headers["content-length"])
+        if length > MAX_BODY:
+            raise HTTPError(413, "body too large")
+        body = await reader.readexactly(length)
+    return method, target, version, headers, body
+
+
+def _response(status, payload=None, headers=(), keep_alive=True):
+    body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Length: {len(body)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close")]
+    if payload is not None:
+        head.append("Content-Type: application/json; charset=utf-8")
+    head.extend(headers)
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+
+def make_handler(service, token=None):
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    req = await _read_request(reader)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HTTPError as exc:
+                    writer.write(_response(exc.status, {"error": str(exc)}, keep_alive=False))
+                    break
+                if req is None:
+                    break
+                method, target, version, headers, body = req
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                url = urlsplit(target)
+                with metrics.timer("api.request"):
+                    try:
+                        if token and not hmac.compare_digest(headers.get("authorization", ""), f"Bearer {token}"):
+                            raise HTTPError(401, "missing or wrong bearer token")
+                        status, payload, cacheable = await route(service, method, url.path,
+                                                                 parse_qs(url.query), body)
+                        extra = []
+                        if cacheable:
+                            etag = service.etag
+                            extra = [f"ETag: {etag}", "Cache-Control: no-cache"]
+                            if headers.get("if-none-match") == etag:
+                                status, payload = 304, None
+                    except HTTPError as exc:
+                        status, payload, extra = exc.status, {"error": str(exc)}, []
+                    except Exception as exc:  # keep serving other clients
+                        status, payload, extra = 500, {"error": repr(exc)}, []
+                writer.write(_response(status, payload, extra, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(filename=DATA_FILE, host="127.0.0.1", port=8765, token=None, ready=None):
+    vault = None
+    if encryption.is_encrypted(filename):
+        vault = encryption.Vault(os.environ.get("EMEKA_PASSPHRASE", ""))
+        vault.check(filename)
+    service = LedgerService(Storage(filename, vault=vault))
+    writer_task = asyncio.create_task(service.writer())
+    server = await asyncio.start_server(make_handler(service, token), host, port)
+    if ready is not None:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        writer_task.cancel()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Serve an expense ledger over HTTP/JSON.")
+    p.add_argument("--file", default=DATA_FILE, help="ledger file (default: %(default)s)")
+    p.add_argument("--host", default="127.0.0.1", help="use 0.0.0.0 to accept LAN clients")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--token", help="require 'Authorization: Bearer <token>' on every request")
+    args = p.parse_args(argv)
+    if args.host not in ("127.0.0.1", "localhost") and not args.token:
+        print("warning: listening beyond localhost without --token; anyone on the network can write")
+    print(f"Serving {args.file} on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(args.file, args.host, args.port, args.token))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
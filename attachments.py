@@ -0,0 +1,189 @@
+#  EMEKA EXPENSE — receipt attachments
+#
+# Receipts (images, PDFs) live in a content-addressed store next to the
+# ledger, never inside the JSON that Storage rewrites:
+#
+#     expenses_modern_attachments/
+#         objects/3f/a2/3fa2...c9        the file, named by its SHA-256
+#         thumbs/3f/a2/3fa2...c9_160.png thumbnails, made on first view
+#         tmp/                           copies in progress
+#
+# An expense references its files by hash:
+#
+#     "attachments": [{"sha256": "3fa2...c9", "name": "receipt.jpg", "size": 48213}]
+#
+# Two levels of two-hex-digit shards keep any directory small however many
+# receipts there are. Adding a file streams it in CHUNK-sized reads, hashing
+# while copying into tmp/, then renames the copy into place; if that hash is
+# already stored the copy is dropped, so attaching the same receipt twice
+# costs no space. Nothing ever holds a whole file in memory.
+#
+# Blobs are never removed when an expense is deleted (undo may bring it
+# back); ``python attachments.py gc expenses_modern.json`` removes the ones
+# no expense refers to.
+#
+# Thumbnails need Pillow (pip install Pillow); without it receipts are
+# listed and opened but not previewed.
+
+import hashlib
+import os
+import sys
+import tempfile
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CHUNK = 1 << 20
+THUMB_SIZE = 160
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+def thumbnails_available():
+    return Image is not None
+
+
+def store_dir(data_file):
+    """Attachment directory that goes with ledger ``data_file``."""
+    return os.path.splitext(data_file)[0] + "_attachments"
+
+
+def refs(e):
+    return e.get("attachments") or []
+
+
+class AttachmentStore:
+    def __init__(self, root):
+        self.root = root
+
+    def _shard(self, kind, sha256):
+        return os.path.join(self.root, kind, sha256[:2], sha256[2:4])
+
+    def path(self, sha256):
+        return os.path.join(self._shard("objects", sha256), sha256)
+
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    # ---------- Adding ----------
+    def put_steps(self, src, out, chunk=CHUNK):
+        """Generator that stores file ``src``, one ``chunk`` per step, for the
+        UI scheduler. The reference dict is appended to ``out`` at the end."""
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with open(src, "rb") as f, os.fdopen(fd, "wb") as dst:
+                while True:
+                    block = f.read(chunk)
+                    if not block:
+                        break
+                    digest.update(block)
+                    dst.write(block)
+                    size += len(block)
+                    yield
+            sha256 = digest.hexdigest()
+            target = self.path(sha256)
+            if os.path.exists(target):
+                os.remove(tmp)  # same bytes already stored
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        out.append({"sha256": sha256, "name": os.path.basename(src), "size": size})
+
+    def put(self, src):
+        """Store file ``src``; returns its reference dict."""
+        out = []
+        for _ in self.put_steps(src, out):
+            pass
+        return out[0]
+
+    # ---------- Reading ----------
+    def open(self, sha256):
+        return open(self.path(sha256), "rb")
+
+    def verify(self, sha256, chunk=CHUNK):
+        """True if the stored bytes still hash to ``sha256``."""
+        digest = hashlib.sha256()
+        try:
+            with self.open(sha256) as f:
+                for block in iter(lambda: f.read(chunk), b""):
+                    digest.update(block)
+        except OSError:
+            return False
+        return digest.hexdigest() == sha256
+
+    def thumbnail(self, ref, size=THUMB_SIZE):
+        """Path of a PNG thumbnail for image ``ref``, made on first request;
+        None for non-images, missing files or without Pillow."""
+        if Image is None or os.path.splitext(ref.get("name", ""))[1].lower() not in IMAGE_EXTENSIONS:
+            return None
+        sha256 = ref["sha256"]
+        thumb = os.path.join(self._shard("thumbs", sha256), f"{sha256}_{size}.png")
+        if os.path.exists(thumb):
+            return thumb
+        try:
+            with Image.open(self.path(sha256)) as img:
+                # draft() lets JPEG decode at reduced scale instead of full size
+                img.draft("RGB", (size, size))
+                img.thumbnail((size, size))
+                os.makedirs(os.path.dirname(thumb), exist_ok=True)
+                tmp = thumb + ".tmp"
+                img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB").save(tmp, "PNG")
+                os.replace(tmp, thumb)
+        except (OSError, ValueError):
+            return None
+        return thumb
+
+    # ---------- Housekeeping ----------
+    def hashes(self):
+        objects = os.path.join(self.root, "objects")
+        for dirpath, _, files in os.walk(objects):
+            yield from files
+
+    def gc(self, expenses):
+        """Remove blobs (and their thumbnails) no expense in ``expenses``
+        refers to. Returns (files removed, bytes freed)."""
+        keep = {r["sha256"] for e in expenses for r in refs(e)}
+        removed = freed = 0
+        for sha256 in list(self.hashes()):
+            if sha256 in keep:
+                continue
+            path = self.path(sha256)
+            freed += os.path.getsize(path)
+            os.remove(path)
+            removed += 1
+            thumbs = self._shard("thumbs", sha256)
+            if os.path.isdir(thumbs):
+                for name in os.listdir(thumbs):
+                    if name.startswith(sha256):
+                        os.remove(os.path.join(thumbs, name))
+        return removed, freed
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2 or argv[0] not in ("gc", "verify"):
+        sys.exit("usage: python attachments.py gc|verify <expenses.json>")
+    from ledger import Storage
+    expenses = Storage(argv[1], create=False).load().get("expenses", [])
+    store = AttachmentStore(store_dir(argv[1]))
+    if argv[0] == "gc":
+        removed, freed = store.gc(expenses)
+        print(f"{removed:,} unreferenced file(s) removed, {freed / 1e6:.1f} MB freed")
+        return
+    bad = [r for e in expenses for r in refs(e) if not store.verify(r["sha256"])]
+    for r in bad:
+        print(f"missing or damaged: {r['name']} ({r['sha256']})")
+    print(f"{len(bad):,} problem(s)")
+
+
+if __name__ == "__main__":
+    main()
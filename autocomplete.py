@@ -0,0 +1,176 @@
+#  EMEKA EXPENSE — description autocomplete
+#
+# Past descriptions live in a radix tree (a trie with single-child chains
+# collapsed into one edge, so there are at most ~2 nodes per distinct
+# description rather than one per character). Every node caches the keys
+# of the TOP_K best-ranked descriptions below it, so a lookup walks the
+# prefix and reads that list: O(len(prefix) + k) however many
+# descriptions there are.
+#
+# Ranking is frequency weighted by recency: each use adds
+# 2 ** (days since 2000 / HALF_LIFE_DAYS), so a use HALF_LIFE_DAYS newer
+# counts double. Scores only ever grow, which keeps the per-node caches
+# exact with a single pass along the inserted key's path. Deleting an
+# expense doesn't un-rank its description.
+#
+# Matching is case-insensitive; a suggestion shows the spelling and
+# category from the most recent use.
+
+import heapq
+
+from cube import day_ordinal
+
+TOP_K = 8
+HALF_LIFE_DAYS = 90
+EPOCH_DAY = 730120  # 2000-01-01
+
+
+class _Node:
+    __slots__ = ("children", "top", "key")
+
+    def __init__(self, top=None):
+        self.children = {}  # first char -> (edge label, child)
+        self.top = top or []  # keys, best first
+        self.key = None  # the description ending exactly here
+
+
+class Autocomplete:
+    def __init__(self, top_k=TOP_K):
+        self.top_k = top_k
+        self.root = _Node()
+        self.terms = {}  # key -> [display, score, category, day of last use]
+        self.ready = False
+        self._pending = None
+
+    def __len__(self):
+        return len(self.terms)
+
+    def build_steps(self, expenses, chunk=5000):
+        """Generator for the UI scheduler; sets ``ready`` when done.
+
+        Rows appended to ``expenses`` while it runs are picked up by the
+        build (see SpendAnalytics); ones added after the last row has been
+        read wait in ``_pending`` until the caches are filled.
+        """
+        i = 0
+        while i < len(expenses):
+            for e in expenses[i:i + chunk]:
+                key = self._count(e)
+                if key is not None:
+                    self._insert(key, offer=False)
+            i += chunk
+            yield
+        self._pending = []
+        # fill the caches bottom-up once instead of per insert
+        score = lambda k: self.terms[k][1]  # noqa: E731
+        stack = [(self.root, False)]
+        done = 0
+        while stack:
+            node, children_done = stack.pop()
+            if not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for _, child in node.children.values())
+                continue
+            keys = [node.key] if node.key is not None else []
+            for _, child in node.children.values():
+                keys.extend(child.top)
+            node.top = heapq.nlargest(self.top_k, keys, key=score)
+            done += 1
+            if done % chunk == 0:
+                yield
+        self.ready = True
+        for e in self._pending:
+            self.add(e)
+        self._pending = None
+
+    def add(self, e):
+        if self.ready:
+            key = self._count(e)
+            if key is not None:
+                self._insert(key)
+        elif self._pending is not None:
+            self._pending.append(e)
+
+    def _count(self, e):
+        """Record one use of ``e``'s description; its key, or None if it has none."""
+        display = " ".join(str(e.get("description", "")).split())
+        if not display or display == "-":
+            return
+        key = display.casefold()
+        day = day_ordinal(e.get("date", "")) or EPOCH_DAY
+        weight = 2.0 ** ((day - EPOCH_DAY) / HALF_LIFE_DAYS)
+        term = self.terms.get(key)
+        if term is None:
+            self.terms[key] = [display, weight, e.get("category", ""), day]
+        else:
+            term[1] += weight
+            if day >= term[3]:
+                term[0], term[2], term[3] = display, e.get("category", "") or term[2], day
+        return key
+
+    def _offer(self, node, key):
+        top = node.top
+        terms = self.terms
+        score = terms[key][1]
+        if key in top:
+            top.remove(key)
+        elif len(top) >= self.top_k and terms[top[-1]][1] >= score:
+            return
+        i = len(top)
+        while i and terms[top[i - 1]][1] < score:
+            i -= 1
+        top.insert(i, key)
+        del top[self.top_k:]
+
+    def _insert(self, key, offer=True):
+        node = self.root
+        if offer:
+            self._offer(node, key)
+        i = 0
+        while i < len(key):
+            edge = node.children.get(key[i])
+            if edge is None:
+                leaf = _Node()
+                leaf.key = key
+                node.children[key[i]] = (key[i:], leaf)
+                if offer:
+                    self._offer(leaf, key)
+                return
+            label, child = edge
+            rest = key[i:]
+            j = 0
+            limit = min(len(label), len(rest))
+            while j < limit and label[j] == rest[j]:
+                j += 1
+            if j < len(label):
+                # split the edge: the new middle node covers exactly the old subtree
+                mid = _Node(list(child.top))
+                mid.children[label[j]] = (label[j:], child)
+                node.children[key[i]] = (label[:j], mid)
+                child = mid
+            node = child
+            i += j
+            if offer:
+                self._offer(node, key)
+        node.key = key
+
+    def suggest(self, prefix, k=None):
+        """[(description, category)] for descriptions starting with ``prefix``, best first."""
+        words = prefix.split()
+        if not words:
+            return []
+        # a trailing space still counts: "uber " shouldn't offer "ubers"
+        prefix = (" ".join(words) + (" " if prefix[-1].isspace() else "")).casefold()
+        node = self.root
+        i = 0
+        while i < len(prefix):
+            edge = node.children.get(prefix[i])
+            if edge is None:
+                return []
+            label, child = edge
+            rest = prefix[i:i + len(label)]
+            if not label.startswith(rest):
+                return []
+            node = child
+            i += len(label)
+        return [(self.terms[key][0], self.terms[key][2]) for key in node.top[:k or self.top_k]]
@@ -0,0 +1,146 @@
+#  EMEKA EXPENSE — API load test
+#
+# Hammers api_server.py with concurrent keep-alive clients and reports
+# requests/sec and latency percentiles per request kind. Without --url it
+# starts a server in-process on a throwaway copy of a synthetic ledger:
+#
+#     python benchmarks/load_test.py --clients 50 --requests 200
+#     python benchmarks/load_test.py --url http://192.168.1.20:8765 --token s3cret
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from api_server import serve  # noqa: E402
+from ledger import Storage  # noqa: E402
+from synthetic import generate_ledger, iter_expenses  # noqa: E402
+
+
+class Client:
+    """One kept-alive connection; requests are sent one after another."""
+
+    def __init__(self, host, port, token=None):
+        self.host, self.port, self.token = host, port, token
+        self.etags = {}
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, payload=None):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(body)}"]
+        if self.token:
+            head.append(f"Authorization: Bearer {self.token}")
+        if path in self.etags:
+            head.append(f"If-None-Match: {self.etags[path]}")
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = (await self.reader.readline()).decode("latin-1")
+            if line in ("\r\n", ""):
+                break
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+            elif name.lower() == "etag":
+                self.etags[path] = value.strip()
+        await self.reader.readexactly(length)
+        return status
+
+    def close(self):
+        self.writer.close()
+
+
+# (kind, method, path, payload factory) picked round-robin by every client
+def _mix(batch):
+    rows = iter_expenses(10 ** 9, seed=7)
+    return [
+        ("summary", "GET", "/summary", None),
+        ("monthly", "GET", "/aggregate/monthly", None),
+        ("list", "GET", "/expenses?limit=50", None),
+        ("add", "POST", "/expenses", lambda: {k: v for k, v in next(rows).items() if k != "id"}),
+        ("search", "GET", "/expenses?q=uber&limit=20", None),
+        ("bulk_add", "POST", "/expenses", lambda: [{k: v for k, v in next(rows).items() if k != "id"}
+                                                   for _ in range(batch)]),
+    ]
+
+
+async def run_load(host, port, clients, requests, token=None, batch=50):
+    mix = _mix(batch)
+    latencies = {kind: [] for kind, *_ in mix}
+    statuses = {}
+
+    async def worker(n):
+        c = Client(host, port, token)
+        await c.connect()
+        try:
+            for i in range(requests):
+                kind, method, path, make = mix[(n + i) % len(mix)]
+                t0 = time.perf_counter()
+                status = await c.request(method, path, make() if make else None)
+                latencies[kind].append(time.perf_counter() - t0)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            c.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(clients)))
+    return time.perf_counter() - t0, latencies, statuses
+
+
+def report(elapsed, latencies, statuses, out=sys.stdout):
+    total = sum(len(v) for v in latencies.values())
+    out.write(f"{total:,} requests in {elapsed:.2f} s: {total / elapsed:,.0f} req/s  statuses {statuses}\n")
+    for kind, xs in latencies.items():
+        if xs:
+            xs = sorted(xs)
+            out.write(f"  {kind:<10} n={len(xs):>6,}  p50 {statistics.median(xs) * 1000:7.2f} ms  "
+                      f"p95 {xs[int(len(xs) * 0.95)] * 1000:7.2f} ms\n")
+
+
+async def _local(args):
+    workdir = tempfile.mkdtemp(prefix="emeka-load-")
+    path = os.path.join(workdir, "ledger.json")
+    Storage(path).save(generate_ledger(args.rows, seed=args.seed))
+    started = asyncio.get_running_loop().create_future()
+    server = asyncio.create_task(serve(path, "127.0.0.1", 0, ready=started.set_result))
+    srv = await started
+    port = srv.sockets[0].getsockname()[1]
+    try:
+        return await run_load("127.0.0.1", port, args.clients, args.requests, batch=args.batch)
+    finally:
+        server.cancel()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Load-test the expense API.")
+    p.add_argument("--url", help="test a running server instead of starting one")
+    p.add_argument("--token")
+    p.add_argument("--clients", type=int, default=20)
+    p.add_argument("--requests", type=int, default=100, help="per client")
+    p.add_argument("--batch", type=int, default=50, help="rows per bulk add")
+    p.add_argument("--rows", type=int, default=10_000, help="size of the local synthetic ledger")
+    p.add_argument("--seed", type=int, default=2024)
+    args = p.parse_args(argv)
+    if args.url:
+        u = urlsplit(args.url)
+        result = asyncio.run(run_load(u.hostname, u.port or 80, args.clients, args.requests, args.token,
+                                      args.batch))
+    else:
+        result = asyncio.run(_local(args))
+    report(*result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+#  EMEKA EXPENSE — hot path benchmarks
+#
+# Times the core ledger paths headlessly (no Tk window, no matplotlib) over
+# synthetic ledgers and writes the numbers to JSON so runs can be compared:
+#
+#     python benchmarks/run_benchmarks.py --sizes 1000 100000 -o results.json
+#     python benchmarks/run_benchmarks.py --baseline results.json
+#
+# With --baseline, any benchmark whose median got slower than the threshold
+# is reported and the exit status is 1, so the script can gate a CI job.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from ledger import (Storage, filter_expenses, total_spent, monthly_totals,  # noqa: E402
+                    last_n_months, read_csv, write_csv, write_report_txt)
+import columnar  # noqa: E402
+import encryption  # noqa: E402
+from analytics import SpendAnalytics  # noqa: E402
+from autocomplete import Autocomplete  # noqa: E402
+from dedupe import DuplicateFinder  # noqa: E402
+from forecast import SpendForecast  # noqa: E402
+from formatting import MoneyFormat  # noqa: E402
+from migrations import migrate  # noqa: E402
+from precompute import ReportCache  # noqa: E402
+from fx import Converter, RateTable  # noqa: E402
+from rules import RulesEngine  # noqa: E402
+from sort_index import SortIndex  # noqa: E402
+from timeseries import Timeline  # noqa: E402
+from synthetic import generate_ledger  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+# ---------- Benchmarks ----------
+# Each entry is (name, setup). ``setup(data, workdir)`` returns the callable
+# that gets timed, so per-benchmark preparation stays out of the measurement.
+
+def _storage_save(data, workdir):
+    storage = Storage(os.path.join(workdir, "save.json"))
+    return lambda: storage.save(data)
+
+
+def _storage_load(data, workdir):
+    storage = Storage(os.path.join(workdir, "load.json"))
+    storage.save(data)
+    return storage.load
+
+
+# same as storage.save / storage.load, encrypted; compare the two pairs for
+# the overhead. The vault is reused, as in the app, so scrypt runs once.
+def _storage_save_encrypted(data, workdir):
+    storage = Storage(os.path.join(workdir, "save.enc.json"), vault=encryption.Vault("benchmark"))
+    return lambda: storage.save(data)
+
+
+def _storage_load_encrypted(data, workdir):
+    storage = Storage(os.path.join(workdir, "load.enc.json"), vault=encryption.Vault("benchmark"))
+    storage.save(data)
+    return storage.load
+
+
+def _migrate_premium(data, workdir):
+    # a version-0 ledger (no ids, no header) upgraded by the streaming
+    # migration: both passes, written next to it
+    src = os.path.join(workdir, "premium.json")
+    rows = [{k: e[k] for k in ("date", "category", "description", "amount")} for e in data["expenses"]]
+    with open(src, "w", encoding="utf-8") as f:
+        json.dump({"expenses": rows, "budget": data.get("budget", 0.0)}, f, indent=2, ensure_ascii=False)
+    del rows
+    return lambda: migrate(src, os.path.join(workdir, "migrated.json"))
+
+
+def _dashboard(query, category):
+    # mirrors ExpenseApp.refresh_dashboard minus the Treeview calls
+    def setup(data, workdir):
+        expenses = data["expenses"]
+
+        def run():
+            filtered = filter_expenses(expenses, query, category)
+            total_spent(expenses)
+            return filtered[:200]
+        return run
+    return setup
+
+
+def _reports_monthly(data, workdir):
+    expenses = data["expenses"]
+
+    def run():
+        monthly = monthly_totals(expenses)
+        return [monthly.get(k, 0.0) for k in last_n_months(datetime.now(), 12)]
+    return run
+
+
+def _export_csv(data, workdir):
+    path = os.path.join(workdir, "export.csv")
+
+    def run():
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            write_csv(f, data["expenses"])
+    return run
+
+
+def _import_csv(data, workdir):
+    path = os.path.join(workdir, "import.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        write_csv(f, data["expenses"])
+
+    def run():
+        with open(path, newline="", encoding="utf-8") as f:
+            return sum(1 for _ in read_csv(f))
+    return run
+
+
+def _export_columnar(ext):
+    def setup(data, workdir):
+        path = os.path.join(workdir, "export" + ext)
+        return lambda: columnar.write(path, data["expenses"])
+    return setup
+
+
+def _import_columnar(ext):
+    def setup(data, workdir):
+        path = os.path.join(workdir, "import" + ext)
+        columnar.write(path, data["expenses"])
+        return lambda: sum(1 for _ in columnar.read_expenses(path))
+    return setup
+
+
+def _export_report_txt(data, workdir):
+    path = os.path.join(workdir, "report.txt")
+
+    def run():
+        with open(path, "w", encoding="utf-8") as f:
+            write_report_txt(f, data)
+    return run
+
+
+def _export_report_fx(precomputed):
+    # as the app exports: converted totals, on demand vs. from the idle-time
+    # per-month cache with one month changed since it was last refreshed
+    def setup(data, workdir):
+        path = os.path.join(workdir, "report.txt")
+        fx = Converter(RateTable.from_json(data.get("fx_rates")), "NGN")
+        cache = None
+        if precomputed:
+            cache = ReportCache(fx)
+            for _ in cache.build_steps(data["expenses"]):
+                pass
+            cache.refresh()
+        last = data["expenses"][-1]
+
+        def run():
+            summary = None
+            if cache is not None:
+                cache.remove(last)
+                cache.add(last)
+                summary = cache.summary()
+            with open(path, "w", encoding="utf-8") as f:
+                write_report_txt(f, data, fx=fx, summary=summary)
+        return run
+    return setup
+
+
+def _format_money(cached):
+    # every amount cell a full refresh/export renders: f-string per row vs. the
+    # per-value cache (warm after the first pass, as it is in the app)
+    def setup(data, workdir):
+        amounts = [e["amount"] for e in data["expenses"]]
+        if not cached:
+            return lambda: [f"₦{a:,.2f}" for a in amounts]
+        money = MoneyFormat().money
+        return lambda: [money(a) for a in amounts]
+    return setup
+
+
+def _fx_total(data, workdir):
+    # converted ledger total with one row in 20 in USD/EUR: one rate lookup
+    # per (currency, day) instead of per row
+    expenses = [dict(e, currency=("USD", "EUR")[i % 40 // 20]) if i % 20 == 0 else e
+                for i, e in enumerate(data["expenses"])]
+    days = sorted({e["date"][:10] for e in expenses})
+    table = RateTable("NGN", {"USD": {d: 1500.0 for d in days[::7]}, "EUR": {d: 1600.0 for d in days[::7]}})
+
+    def run():
+        return Converter(table, "NGN").total(expenses)  # cold rate cache each time
+    return run
+
+
+def _sorted_page(use_index):
+    # top 200 by amount: maintained index slice vs. sorting the ledger per view
+    def setup(data, workdir):
+        expenses = [dict(e, id=i) for i, e in enumerate(data["expenses"], 1)]
+        if not use_index:
+            return lambda: sorted(expenses, key=lambda e: e["amount"], reverse=True)[:200]
+        index = SortIndex()
+        index.rebuild(expenses)
+        index.top("amount", 1)  # build the column outside the timing
+        return lambda: index.top("amount", 200)
+    return setup
+
+
+def _rules_rerun(data, workdir):
+    # work on copies so the other benchmarks see the generated categories
+    expenses = [dict(e) for e in data["expenses"]]
+
+    def run():
+        # a fresh engine each time: includes compiling and a cold cache
+        RulesEngine().apply(expenses, overwrite=True)
+    return run
+
+
+def _analytics_build(data, workdir):
+    def run():
+        a = SpendAnalytics()
+        for _ in a.build_steps(data["expenses"]):
+            pass
+    return run
+
+
+def _analytics_distribution(data, workdir):
+    # all-time per-category median/p90/p99 from the per-month sketches
+    a = SpendAnalytics()
+    for _ in a.build_steps(data["expenses"]):
+        pass
+    return lambda: a.distribution()
+
+
+def _forecast_month_end(data, workdir):
+    # what a Reports redraw costs once the forecast is built: one fit per category
+    fc = SpendForecast()
+    for _ in fc.build_steps(data["expenses"]):
+        pass
+
+    def run():
+        fc.advance()
+        return {c: fc.month_end(c) for c in fc.categories()}
+    return run
+
+
+def _reports_timeline(data, workdir):
+    # timeline redraw: levels from the cube's daily totals, then one view
+    fc = SpendForecast()
+    for _ in fc.build_steps(data["expenses"]):
+        pass
+
+    def run():
+        timeline = Timeline({d: sum(c.values()) for d, c in fc.cube.cells.items()})
+        return timeline.view(width=800)
+    return run
+
+
+def _reports_cube_charts(data, workdir):
+    # heatmap + donut + stacked area after a change (memo cold), from the cube
+    fc = SpendForecast()
+    for _ in fc.build_steps(data["expenses"]):
+        pass
+    cube = fc.cube
+    months = last_n_months(datetime.now(), 12)
+
+    def run():
+        cube.version += 1  # as if a row had just changed
+        cube.calendar(date.today().toordinal())
+        cube.category_totals()
+        return cube.monthly_by_category(months)
+    return run
+
+
+def _autocomplete_build(data, workdir):
+    def run():
+        ac = Autocomplete()
+        for _ in ac.build_steps(data["expenses"]):
+            pass
+        return ac
+    return run
+
+
+def _autocomplete_suggest(data, workdir):
+    # one lookup per keystroke while typing each of 200 descriptions
+    ac = _autocomplete_build(data, workdir)()
+    typed = [e["description"] for e in data["expenses"][:200]]
+
+    def run():
+        for desc in typed:
+            for n in range(1, len(desc) + 1):
+                ac.suggest(desc[:n])
+    return run
+
+
+def _dedupe_scan(data, workdir):
+    # exact + near duplicates over the ledger with 1% of rows re-entered
+    expenses = list(data["expenses"])
+    for e in expenses[::100]:
+        copy = dict(e)
+        copy["description"] = copy["description"].upper()
+        expenses.append(copy)
+    return lambda: DuplicateFinder().run(expenses)
+
+
+BENCHMARKS = [
+    ("storage.save", _storage_save),
+    ("storage.load", _storage_load),
+    ("migrate.premium", _migrate_premium),
+    ("dashboard.filter.all", _dashboard("", "All")),
+    ("dashboard.filter.search", _dashboard("uber", "All")),
+    ("dashboard.filter.category", _dashboard("", "Food")),
+    ("dashboard.sort.full_sort", _sorted_page(False)),
+    ("dashboard.sort.index_page", _sorted_page(True)),
+    ("reports.monthly", _reports_monthly),
+    ("format.money.fstring", _format_money(False)),
+    ("format.money.cached", _format_money(True)),
+    ("fx.total", _fx_total),
+    ("export.csv", _export_csv),
+    ("export.report_txt", _export_report_txt),
+    ("export.report_txt.fx", _export_report_fx(False)),
+    ("export.report_txt.precomputed", _export_report_fx(True)),
+    ("import.csv", _import_csv),
+    ("rules.rerun", _rules_rerun),
+    ("analytics.build", _analytics_build),
+    ("autocomplete.build", _autocomplete_build),
+    ("autocomplete.suggest", _autocomplete_suggest),
+    ("dedupe.scan", _dedupe_scan),
+    ("analytics.distribution", _analytics_distribution),
+    ("forecast.month_end", _forecast_month_end),
+    ("reports.timeline", _reports_timeline),
+    ("reports.cube_charts", _reports_cube_charts),
+]
+
+if columnar.available():
+    BENCHMARKS += [
+        ("export.parquet", _export_columnar(".parquet")),
+        ("import.parquet", _import_columnar(".parquet")),
+        ("export.arrow", _export_columnar(".arrow")),
+        ("import.arrow", _import_columnar(".arrow")),
+    ]
+
+if encryption.available():
+    BENCHMARKS[2:2] = [
+        ("storage.save.encrypted", _storage_save_encrypted),
+        ("storage.load.encrypted", _storage_load_encrypted),
+    ]
+
+
+# ---------- Runner ----------
+def time_callable(fn, repeat):
+    fn()  # warm-up: page cache, lazy imports, allocator
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def run_suite(sizes, repeat=5, seed=2024, only=None, out=sys.stdout):
+    results = []
+    for n in sizes:
+        data = generate_ledger(n, seed=seed)
+        # keep the biggest ledgers affordable: a single timed pass is plenty
+        reps = repeat if n < 1_000_000 else 1
+        with tempfile.TemporaryDirectory(prefix="emeka-bench-") as workdir:
+            for name, setup in BENCHMARKS:
+                if only and not any(name.startswith(o) for o in only):
+                    continue
+                samples = time_callable(setup(data, workdir), reps)
+                row = {
+                    "bench": name,
+                    "size": n,
+                    "repeat": reps,
+                    "min_s": min(samples),
+                    "median_s": statistics.median(samples),
+                    "mean_s": statistics.fmean(samples),
+                    "per_row_us": statistics.median(samples) / n * 1e6,
+                }
+                results.append(row)
+                print(f"{name:<28} n={n:>10,}  median {row['median_s'] * 1000:10.2f} ms"
+                      f"  ({row['per_row_us']:.3f} µs/row)", file=out)
+        del data
+    return results
+
+
+def compare(results, baseline, threshold):
+    """List of (bench, size, ratio) that regressed more than ``threshold``."""
+    base = {(r["bench"], r["size"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        b = base.get((r["bench"], r["size"]))
+        if not b or b["median_s"] <= 0:
+            continue
+        ratio = r["median_s"] / b["median_s"]
+        if ratio > 1.0 + threshold:
+            regressions.append((r["bench"], r["size"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the expense tracker hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="ledger sizes to generate (up to 10,000,000)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose name starts with these prefixes")
+    parser.add_argument("-o", "--output", default=os.path.join(BENCH_DIR, "results", "latest.json"))
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="allowed slowdown before a result counts as a regression (default 15%%)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, repeat=args.repeat, seed=args.seed, only=args.only)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "sizes": args.sizes,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for bench, size, ratio in regressions:
+                print(f"  REGRESSION {bench} n={size:,}: {ratio:.2f}x slower")
+            return 1
+        print(f"No regressions against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
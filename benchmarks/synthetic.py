@@ -0,0 +1,121 @@
+#  EMEKA EXPENSE — synthetic ledger generator
+#
+# Seeded, reproducible ledgers shaped like real household spending: a skewed
+# category mix, log-normal amounts per category, bills clustered at the start
+# of the month, more shopping/entertainment at weekends and daytime-heavy
+# timestamps. Used by the benchmarks; can also write a data file for manual
+# testing of the app:
+#
+#     python benchmarks/synthetic.py 100000 -o expenses_modern.json
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import DATE_FORMAT  # noqa: E402
+
+# category -> (weight, median amount in ₦, log-normal sigma, merchants)
+CATEGORY_PROFILES = {
+    "Food": (0.34, 3500.0, 0.7, ["Chicken Republic", "Shoprite", "Mama Put", "Bukka Hut", "Domino's Pizza",
+                                 "Market groceries", "Kilimanjaro", "Sweet Sensation", "Bread", "Suya spot"]),
+    "Transport": (0.22, 2000.0, 0.6, ["Uber", "Bolt", "Danfo", "Keke", "Fuel - Total", "Fuel - Mobil",
+                                      "BRT card top-up", "Okada", "Parking"]),
+    "Bills": (0.10, 18000.0, 0.8, ["Ikeja Electric", "DSTV subscription", "MTN data", "Airtel airtime",
+                                   "Water bill", "Internet - Spectranet", "Rent contribution"]),
+    "Shopping": (0.13, 12000.0, 1.0, ["Jumia order", "Konga order", "Balogun market", "Shoes", "Clothes",
+                                      "Phone accessories", "Household items"]),
+    "Health": (0.05, 8000.0, 0.9, ["Pharmacy", "Clinic visit", "Lab test", "HMO premium", "Gym membership"]),
+    "Entertainment": (0.09, 6000.0, 0.8, ["Cinema - Filmhouse", "Netflix", "Spotify", "Bar", "Game centre",
+                                          "Concert ticket"]),
+    "Other": (0.07, 5000.0, 1.2, ["Gift", "Church offering", "Donation", "Haircut", "Laundry", "Misc"]),
+}
+
+# Relative likelihood of spending at each hour of the day.
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 7, 8, 7, 6, 7, 9, 8, 6, 6, 7, 9, 10, 9, 7, 5, 3, 2]
+WEEKEND_BOOST = {"Shopping": 1.8, "Entertainment": 2.2, "Food": 1.2}
+
+
+def iter_expenses(n, seed=2024, end=None, months=24):
+    """Yield ``n`` expense dicts in (roughly) chronological order.
+
+    The ledger spans ``months`` months ending at ``end`` (today by default) so
+    that the last-12-months report always has data to aggregate.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(hour=23, minute=59, second=59, microsecond=0)
+    span_days = max(1, int(months * 30.44))
+    start = end - timedelta(days=span_days)
+
+    names = list(CATEGORY_PROFILES)
+    weights = [CATEGORY_PROFILES[c][0] for c in names]
+    cum_weights = []
+    acc = 0.0
+    for w in weights:
+        acc += w
+        cum_weights.append(acc)
+    hours = list(range(24))
+    cum_hours = []
+    acc = 0
+    for w in HOUR_WEIGHTS:
+        acc += w
+        cum_hours.append(acc)
+    boosted = list(WEEKEND_BOOST)
+
+    # Spread rows evenly over the span; sorting n random offsets would cost
+    # O(n log n) memory-resident work for 10M rows, so walk forward instead.
+    step = span_days * 86400 / max(n, 1)
+    for i in range(n):
+        day_offset = int(i * step // 86400)
+        day = start + timedelta(days=day_offset)
+        cat = rng.choices(names, cum_weights=cum_weights)[0]
+        weekend = day.weekday() >= 5
+        if weekend and cat not in WEEKEND_BOOST and rng.random() < 0.35:
+            cat = rng.choice(boosted)
+        if cat == "Bills" and day.day > 7 and rng.random() < 0.6:
+            # most bills land in the first week of the month
+            day = day.replace(day=rng.randint(1, 7))
+        _, median, sigma, merchants = CATEGORY_PROFILES[cat]
+        amount = round(rng.lognormvariate(math.log(median), sigma), 2)
+        if weekend:
+            amount = round(amount * WEEKEND_BOOST.get(cat, 1.0), 2)
+        hour = rng.choices(hours, cum_weights=cum_hours)[0]
+        ts = day.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60))
+        yield {
+            "amount": amount,
+            "category": cat,
+            "description": rng.choice(merchants),
+            "date": ts.strftime(DATE_FORMAT),
+        }
+
+
+def generate_ledger(n, seed=2024, budget=None, **kwargs):
+    """A full data dict in the format ``Storage.save`` writes."""
+    expenses = list(iter_expenses(n, seed=seed, **kwargs))
+    if budget is None:
+        # roughly one month of spending, so budget warnings are exercised
+        budget = round(sum(e["amount"] for e in expenses[-max(1, n // 24):]), 2)
+    return {"expenses": expenses, "budget": budget}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic expense ledger.")
+    parser.add_argument("count", type=int, help="number of expenses to generate")
+    parser.add_argument("-o", "--output", default="synthetic_expenses.json")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--months", type=int, default=24)
+    args = parser.parse_args(argv)
+
+    data = generate_ledger(args.count, seed=args.seed, months=args.months)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {args.count:,} expenses to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#  EMEKA EXPENSE — Parquet / Arrow IPC export and import
+#
+# For analysis outside the app (pandas, polars, DuckDB): typed columns
+# instead of CSV text, so nothing has to re-parse dates and amounts.
+#
+#   id           int64
+#   date         timestamp[s]       unparseable dates are null
+#   category     dictionary<int32, string>
+#   description  string
+#   amount       float64
+#   currency     dictionary<int32, string>, null for the ledger's own
+#
+# Rows are written ROW_GROUP at a time (one Parquet row group / one IPC
+# record batch each), so an export never holds a second copy of the whole
+# ledger. The category and currency dictionaries are collected up front so
+# every batch shares them, which the IPC file format requires.
+#
+# Reading back streams record batches too, optionally only some columns
+# and/or a date range; Parquet row groups outside the range are skipped
+# using their min/max statistics without being decoded.
+#
+#     python columnar.py expenses_modern.json out.parquet
+#     python columnar.py out.parquet --columns date amount --start 2024-01-01
+#
+# Needs pyarrow (pip install pyarrow); everything else in the app works
+# without it.
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from formatting import DATE_FORMAT
+
+ROW_GROUP = 128 * 1024
+FORMATS = {".parquet": "parquet", ".pq": "parquet", ".arrow": "ipc", ".feather": "ipc", ".ipc": "ipc"}
+
+
+def available():
+    return pa is not None
+
+
+def _require():
+    if pa is None:
+        raise RuntimeError("Parquet/Arrow files need pyarrow: pip install pyarrow")
+
+
+def file_format(path):
+    """"parquet" or "ipc" from the extension, or None for anything else."""
+    return FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def schema():
+    _require()
+    dict_str = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("id", pa.int64()),
+        ("date", pa.timestamp("s")),
+        ("category", dict_str),
+        ("description", pa.string()),
+        ("amount", pa.float64()),
+        ("currency", dict_str),
+    ])
+
+
+# ---------- Export ----------
+def _dictionary(values):
+    values = sorted(values)
+    return {v: i for i, v in enumerate(values)}, pa.array(values, pa.string())
+
+
+def _batch(rows, sch, cats, currencies):
+    cat_index, cat_values = cats
+    cur_index, cur_values = currencies
+    dates = pc.strptime(pa.array([e.get("date", "") for e in rows], pa.string()), format=DATE_FORMAT, unit="s",
+                        error_is_null=True)
+    category = pa.DictionaryArray.from_arrays(
+        pa.array([cat_index[e.get("category", "")] for e in rows], pa.int32()), cat_values)
+    currency = pa.DictionaryArray.from_arrays(
+        pa.array([cur_index.get(e.get("currency")) for e in rows], pa.int32()), cur_values)
+    return pa.RecordBatch.from_arrays([
+        pa.array([e.get("id") for e in rows], pa.int64()),
+        dates,
+        category,
+        pa.array([e.get("description", "") for e in rows], pa.string()),
+        pa.array([e["amount"] for e in rows], pa.float64()),
+        currency,
+    ], schema=sch)
+
+
+def iter_batches(expenses, row_group=ROW_GROUP):
+    """Record batches of ``expenses``, ``row_group`` rows each."""
+    _require()
+    sch = schema()
+    cats = _dictionary({e.get("category", "") for e in expenses})
+    currencies = _dictionary({e["currency"] for e in expenses if e.get("currency")})
+    for start in range(0, len(expenses), row_group):
+        yield _batch(expenses[start:start + row_group], sch, cats, currencies)
+
+
+def write(path, expenses, fmt=None, row_group=ROW_GROUP, compression="zstd"):
+    """Write ``expenses`` as Parquet or Arrow IPC (by extension unless ``fmt``
+    is given). Returns the number of rows written."""
+    _require()
+    fmt = fmt or file_format(path)
+    sch = schema()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(path, sch, compression=compression, use_dictionary=["category", "currency"])
+        write_batch = lambda b: writer.write_batch(b, row_group_size=row_group)  # noqa: E731
+    elif fmt == "ipc":
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        writer = pa.ipc.new_file(path, sch, options=options)
+        write_batch = writer.write_batch
+    else:
+        raise ValueError(f"not a Parquet or Arrow file name: {path}")
+    with writer:
+        for batch in iter_batches(expenses, row_group):
+            write_batch(batch)
+    return len(expenses)
+
+
+# ---------- Import ----------
+def _scan(path, start, end, fmt):
+    _require()
+    fmt = fmt or file_format(path)
+    if fmt not in ("parquet", "ipc"):
+        raise ValueError(f"not a Parquet or Arrow file name: {path}")
+    expr = None
+    for bound, is_start in ((start, True), (end, False)):
+        if bound is None:
+            continue
+        if isinstance(bound, str):
+            bound = datetime.fromisoformat(bound)
+        value = pa.scalar(bound, pa.timestamp("s"))
+        cond = ds.field("date") >= value if is_start else ds.field("date") < value
+        expr = cond if expr is None else expr & cond
+    return ds.dataset(path, format=fmt), expr
+
+
+def read_batches(path, columns=None, start=None, end=None, fmt=None, batch_size=ROW_GROUP):
+    """Stream record batches from a file written by ``write``.
+
+    ``columns`` picks columns (default all); ``start``/``end`` ("YYYY-MM-DD"
+    or datetimes, end exclusive) keep only rows dated in that range. Other
+    columns are never read from disk.
+    """
+    dataset, expr = _scan(path, start, end, fmt)
+    return dataset.to_batches(columns=columns, filter=expr, batch_size=batch_size)
+
+
+def read_table(path, columns=None, start=None, end=None, fmt=None):
+    dataset, expr = _scan(path, start, end, fmt)
+    return dataset.to_table(columns=columns, filter=expr)
+
+
+def read_expenses(path, start=None, end=None, skipped=None):
+    """Yield expense dicts like ``ledger.read_csv`` (no ids; the caller
+    numbers them). Rows without an amount are skipped and their row numbers
+    appended to ``skipped`` when a list is given."""
+    row = 0
+    for batch in read_batches(path, ["date", "category", "description", "amount", "currency"], start, end):
+        # dates back to the stored text layout in one vectorized call
+        dates = pc.strftime(batch.column("date"), format=DATE_FORMAT).to_pylist()
+        cols = [batch.column(n).to_pylist() for n in ("category", "description", "amount", "currency")]
+        for date, cat, desc, amount, cur in zip(dates, *cols):
+            row += 1
+            if amount is None:
+                if skipped is not None:
+                    skipped.append(row)
+                continue
+            e = {"amount": amount, "category": cat or "", "description": desc or "-", "date": date or ""}
+            if cur:
+                e["currency"] = cur
+            yield e
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Convert a ledger to Parquet/Arrow, or inspect such a file.")
+    p.add_argument("source", help="ledger .json to export, or a .parquet/.arrow file to read")
+    p.add_argument("target", nargs="?", help="output .parquet or .arrow (export mode)")
+    p.add_argument("--columns", nargs="+", help="read mode: only these columns")
+    p.add_argument("--start", help="read mode: first day (YYYY-MM-DD)")
+    p.add_argument("--end", help="read mode: day after the last one")
+    args = p.parse_args(argv)
+    if not available():
+        sys.exit("pyarrow is not installed: pip install pyarrow")
+    t0 = time.perf_counter()
+    if args.target:
+        from ledger import Storage
+        expenses = Storage(args.source, create=False).load().get("expenses", [])
+        n = write(args.target, expenses)
+        print(f"{n:,} rows -> {args.target} ({os.path.getsize(args.target) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - t0:.2f} s")
+        return
+    table = read_table(args.source, args.columns, args.start, args.end)
+    print(table.schema)
+    print(f"{table.num_rows:,} rows in {time.perf_counter() - t0:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#  EMEKA EXPENSE — consolidated reports across ledger files
+#
+# One data file per household member or cost center; this reports on all of
+# them together. Each file is parsed and reduced to small per-month and
+# per-category partial totals in its own worker process, and the parent only
+# merges those partials, so N ledgers take about as long as the largest one
+# (given N cores). Files are submitted largest first so the long poles start
+# early.
+#
+# Reads both data file formats: expenses_premium.json (expense_tracker.py,
+# expense_2.0) and expenses_modern.json (ids, rules, plus a journal that is
+# replayed like the app does).
+#
+# Ledgers may keep different base currencies and hold rows in several.
+# Each worker converts its own ledger into the one reporting currency with
+# that ledger's rates; rows it has no rate for are left out and counted.
+#
+#     python consolidate.py alice.json bob.json office/*.json -o combined.txt --currency USD
+
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from formatting import money, set_money_format
+from fx import DEFAULT_BASE, Converter, currency_symbol, reporting_currency
+from ledger import Storage, month_key
+
+
+def ledger_partial(path, currency=DEFAULT_BASE):
+    """Totals for one ledger file in ``currency``; runs in a worker process."""
+    t0 = time.perf_counter()
+    out = {"path": path, "count": 0, "total": 0.0, "budget": 0.0, "monthly": {}, "categories": {},
+           "missing": {}, "schema": None, "error": None}
+    if not os.path.exists(path):
+        out["error"] = "file not found"
+        return out
+    storage = Storage(path, create=False)  # never create files we were only asked to read
+    data = storage.load()
+    if storage.last_error is not None or not isinstance(data, dict):
+        out["error"] = f"unreadable: {storage.last_error or 'not a ledger'}"
+        return out
+    expenses = data.get("expenses", [])
+    modern = any(k in data for k in ("next_id", "rules", "recurring")) or (expenses and "id" in expenses[0])
+    out["schema"] = "modern" if modern else "premium"
+    fx = Converter.for_ledger(data, currency)
+    missing = defaultdict(int)  # currency -> rows with no rate into ``currency``
+    # the budget is in the ledger's own reporting currency, at the latest rate
+    f = fx.factor(reporting_currency(data))
+    out["budget"] = float(data.get("budget", 0.0) or 0.0) * f if f is not None else None
+    monthly = defaultdict(float)
+    categories = defaultdict(float)
+    total = 0.0
+    for e in expenses:
+        try:
+            amount = float(e["amount"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        cur, day = fx.key(e)
+        f = fx.factor(cur, day)
+        if f is None:
+            missing[cur or fx.base] += 1
+            continue
+        amount *= f
+        total += amount
+        categories[e.get("category") or "Other"] += amount
+        key = month_key(str(e.get("date", "")))
+        if key:
+            monthly[key] += amount
+    out.update(count=len(expenses), total=total, monthly=dict(monthly), categories=dict(categories),
+               missing=dict(missing))
+    out["seconds"] = time.perf_counter() - t0
+    return out
+
+
+def submit_all(executor, paths, currency=DEFAULT_BASE):
+    """Futures for every path, largest file first."""
+    def size(p):
+        try:
+            return os.path.getsize(p)
+        except OSError:
+            return 0
+    return [executor.submit(ledger_partial, p, currency) for p in sorted(paths, key=size, reverse=True)]
+
+
+def merge(partials, currency=DEFAULT_BASE):
+    combined = {"ledgers": [], "currency": currency, "count": 0, "total": 0.0, "budget": 0.0,
+                "monthly": defaultdict(float), "categories": defaultdict(float)}
+    for part in sorted(partials, key=lambda p: p["path"]):
+        combined["ledgers"].append({k: part.get(k) for k in ("path", "schema", "count", "total", "budget",
+                                                              "missing", "error", "seconds")})
+        if part["error"]:
+            continue
+        combined["count"] += part["count"]
+        combined["total"] += part["total"]
+        combined["budget"] += part["budget"] or 0.0
+        for k, v in part["monthly"].items():
+            combined["monthly"][k] += v
+        for k, v in part["categories"].items():
+            combined["categories"][k] += v
+    return combined
+
+
+def consolidate(paths, workers=None, currency=DEFAULT_BASE):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge((f.result() for f in submit_all(executor, paths, currency)), currency)
+
+
+def write_consolidated_txt(f, combined, generated=None):
+    f.write("EMEKA Consolidated Expense Report\n")
+    f.write(f"Generated: {generated or datetime.now()}\n\n")
+    f.write(f"Ledgers: {len(combined['ledgers'])}  ·  Expenses: {combined['count']:,}"
+            f"  ·  Amounts in {combined['currency']}\n")
+    f.write(f"Total Spent: {money(combined['total'])}\n")
+    f.write(f"Combined Monthly Budget: {money(combined['budget'])}\n\n")
+    f.write("By Ledger:\n")
+    for led in combined["ledgers"]:
+        if led["error"]:
+            f.write(f" - {led['path']}: skipped ({led['error']})\n")
+        else:
+            f.write(f" - {led['path']} [{led['schema']}]: {led['count']:,} expenses, {money(led['total'])}")
+            if led["missing"]:
+                f.write(f" (excl. {sum(led['missing'].values()):,} {'/'.join(sorted(led['missing']))}"
+                        f" row(s): no rate)")
+            if led["budget"] is None:
+                f.write(" (budget left out: no rate)")
+            f.write("\n")
+    f.write("\nBy Month:\n")
+    for k, v in sorted(combined["monthly"].items()):
+        f.write(f" - {k}: {money(v)}\n")
+    f.write("\nBy Category:\n")
+    for c, a in sorted(combined["categories"].items(), key=lambda x: x[1], reverse=True):
+        f.write(f" - {c}: {money(a)}\n")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Report on several expense ledger files at once.")
+    p.add_argument("files", nargs="+")
+    p.add_argument("-o", "--output", help="write the report here instead of stdout")
+    p.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    p.add_argument("--currency", default=DEFAULT_BASE, type=str.upper,
+                   help="report every ledger in this currency (default: %(default)s)")
+    p.add_argument("--locale", default="en_NG", help="amount layout, e.g. en_US or de_DE (default: %(default)s)")
+    p.add_argument("--symbol", help="currency symbol (default: the currency's)")
+    args = p.parse_args(argv)
+    try:
+        set_money_format(args.locale, args.symbol or currency_symbol(args.currency))
+    except ValueError as exc:
+        p.error(str(exc))
+    t0 = time.perf_counter()
+    combined = consolidate(args.files, args.workers, args.currency)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            write_consolidated_txt(f, combined)
+    else:
+        write_consolidated_txt(sys.stdout, combined)
+    slowest = max((led.get("seconds") or 0.0 for led in combined["ledgers"]), default=0.0)
+    print(f"\n{len(args.files)} ledger(s) in {time.perf_counter() - t0:.2f} s "
+          f"(slowest single ledger {slowest:.2f} s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
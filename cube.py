@@ -0,0 +1,126 @@
+#  EMEKA EXPENSE — day x category spending cube
+#
+# One aggregate the Reports charts, the forecast and the timeline all read:
+# spend per (day, category), held as day ordinal -> {category: amount}.
+# It is built once in scheduler slices and then updated per added/removed
+# row, so no chart rescans the ledger. Derived views (daily totals, category
+# totals, category-by-month series, the calendar grid) are memoized against
+# a version number that every change bumps; flipping between chart types
+# redraws from the memo without recomputing anything.
+
+from collections import defaultdict
+from datetime import date
+
+
+def day_ordinal(date_str):
+    try:
+        return date.fromisoformat(date_str[:10]).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def month_of(day):
+    d = date.fromordinal(day)
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+class SpendCube:
+    """Spend per (day, category), maintained incrementally.
+
+    Like SpendAnalytics: ``build_steps`` builds it, and until ``ready``
+    ``add`` is ignored (the build reads rows appended meanwhile) while
+    ``remove`` restarts the build.
+    """
+
+    def __init__(self):
+        self.cells = defaultdict(lambda: defaultdict(float))
+        self.ready = False
+        self._restart = False
+        self.version = 0
+        self._memo = {}
+
+    def build_steps(self, expenses, chunk=5000):
+        while True:
+            self.cells.clear()
+            self._restart = False
+            i = 0
+            while i < len(expenses) and not self._restart:
+                for e in expenses[i:i + chunk]:
+                    self._change(e, 1)
+                i += chunk
+                yield
+            if not self._restart:
+                break
+        self.ready = True
+        self.version += 1
+
+    def _change(self, e, sign):
+        """Day ordinal the row landed on, or None if it has no usable date."""
+        day = day_ordinal(e.get("date", ""))
+        if day is None:
+            return None
+        self.cells[day][e.get("category", "")] += sign * e["amount"]
+        self.version += 1
+        return day
+
+    def add(self, e):
+        return self._change(e, 1) if self.ready else None
+
+    def remove(self, e):
+        if not self.ready:
+            self._restart = True  # the build may already have counted it
+            return None
+        return self._change(e, -1)
+
+    # ---- memoized views ----
+    def memo(self, key, compute):
+        """``compute()``, reused until the cube next changes."""
+        hit = self._memo.get(key)
+        if hit is not None and hit[0] == self.version:
+            return hit[1]
+        value = compute()
+        self._memo[key] = (self.version, value)
+        return value
+
+    def daily_totals(self):
+        return self.memo("daily", lambda: {d: sum(c.values()) for d, c in self.cells.items()})
+
+    def category_totals(self, first=None, last=None):
+        """{category: amount} over days ``first``..``last`` (ordinals, inclusive)."""
+        def compute():
+            totals = defaultdict(float)
+            for day, cats in self.cells.items():
+                if (first is None or day >= first) and (last is None or day <= last):
+                    for cat, amount in cats.items():
+                        totals[cat] += amount
+            return {c: a for c, a in totals.items() if a > 0.005}
+        return self.memo(("categories", first, last), compute)
+
+    def monthly_by_category(self, months):
+        """{category: [amount per month]} for the "YYYY-MM" keys in ``months``."""
+        months = tuple(months)
+
+        def compute():
+            index = {m: i for i, m in enumerate(months)}
+            series = defaultdict(lambda: [0.0] * len(months))
+            for day, cats in self.cells.items():
+                i = index.get(month_of(day))
+                if i is None:
+                    continue
+                for cat, amount in cats.items():
+                    series[cat][i] += amount
+            return {c: v for c, v in series.items() if any(x > 0.005 for x in v)}
+        return self.memo(("monthly", months), compute)
+
+    def calendar(self, last, weeks=53):
+        """(first monday, grid) for the ``weeks`` weeks ending with day ``last``:
+        grid[weekday][week] is the day's total (Monday = row 0)."""
+        def compute():
+            first = last - (last - 1) % 7 - 7 * (weeks - 1)  # ordinal 1 was a Monday
+            grid = [[0.0] * weeks for _ in range(7)]
+            for day in range(first, last + 1):
+                cats = self.cells.get(day)
+                if cats:
+                    grid[(day - 1) % 7][(day - first) // 7] = sum(cats.values())
+            return first, grid
+        return self.memo(("calendar", last, weeks), compute)
@@ -0,0 +1,182 @@
+#  EMEKA EXPENSE — duplicate detection
+#
+# Two kinds of duplicate, both found in one pass plus a sort per block:
+#
+#   exact  same timestamp, amount, currency and description (case and
+#          spacing ignored); found by hashing that content key into a dict,
+#          whatever the category, so a row imported twice is caught even
+#          after the rules re-filed one copy.
+#   near   same amount and currency, within WINDOW_HOURS of each other and
+#          with similar descriptions (Jaccard overlap of their words,
+#          ignoring pure numbers like card or reference digits). Rows are
+#          blocked by (currency, amount in cents) and each block sorted by
+#          time, so only rows already sharing an amount and a time window
+#          are ever compared, at most MAX_COMPARISONS per row. Pairs are
+#          joined into groups with union-find.
+#
+# Over a million rows that's O(n log n) for the sorts and O(n) otherwise.
+# Nothing is deleted here: the UI shows the groups and merges the ones the
+# user picks (keeping one row of each) as a single undoable command.
+
+import re
+from datetime import date
+
+WINDOW_HOURS = 24
+THRESHOLD = 0.6
+MAX_COMPARISONS = 32
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(desc):
+    return " ".join(str(desc or "").casefold().split())
+
+
+def content_key(e):
+    return (e.get("date", ""), round(e["amount"] * 100), e.get("currency") or None, normalize(e.get("description")))
+
+
+def words(desc):
+    return frozenset(w for w in _WORD.findall(normalize(desc)) if not w.isdigit())
+
+
+def similarity(a, b):
+    """Word overlap of two word sets, 0..1. Two blank descriptions count as
+    the same; a blank and a non-blank one as half alike."""
+    if not a or not b:
+        return 1.0 if not a and not b else 0.5
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def _day_seconds(date_str):
+    try:
+        return date.fromisoformat(date_str[:10]).toordinal() * 86400
+    except (TypeError, ValueError):
+        return None
+
+
+def _time_seconds(date_str):
+    if len(date_str) < 19:
+        return 0
+    try:
+        return int(date_str[11:13]) * 3600 + int(date_str[14:16]) * 60 + int(date_str[17:19])
+    except ValueError:
+        return 0
+
+
+def seconds(date_str):
+    """Seconds since day 1 for a stored date, or None. Avoids strptime: this
+    runs once per row over the whole ledger."""
+    day = _day_seconds(date_str)
+    return None if day is None else day + _time_seconds(date_str)
+
+
+class Match:
+    __slots__ = ("kind", "rows", "score")
+
+    def __init__(self, kind, rows, score):
+        self.kind = kind  # "exact" or "near"
+        self.rows = rows  # in ledger order; merging keeps one
+        self.score = score  # 1.0 for exact, else the weakest link's similarity
+
+
+class DuplicateFinder:
+    """Run ``steps(expenses)`` on the scheduler; the groups land in ``matches``
+    (exact ones first, then near ones by score) once ``done`` is set."""
+
+    def __init__(self, window_hours=WINDOW_HOURS, threshold=THRESHOLD):
+        self.window = window_hours * 3600
+        self.threshold = threshold
+        self.matches = []
+        self.done = False
+
+    def steps(self, expenses, chunk=20000):
+        # positions below index this snapshot: the ledger may gain or lose
+        # rows while the scan yields, and groups must still be the rows compared
+        expenses = list(expenses)
+        first = {}  # content key -> position of its first row
+        exact = {}  # that position -> positions of all its copies
+        blocks = {}
+        # descriptions and days repeat a lot: normalize / parse each once
+        norms = {}
+        days = {}
+        for start in range(0, len(expenses), chunk):
+            for pos in range(start, min(start + chunk, len(expenses))):
+                e = expenses[pos]
+                d = e.get("date", "")
+                desc = e.get("description")
+                norm = norms.get(desc)
+                if norm is None:
+                    norm = norms[desc] = normalize(desc)
+                key = (d, round(e["amount"] * 100), e.get("currency") or None, norm)
+                p = first.setdefault(key, pos)
+                if p != pos:
+                    exact.setdefault(p, [p]).append(pos)
+                    continue
+                # only the first of an exact group takes part in near matching
+                day = days.get(d[:10], False)
+                if day is False:
+                    day = days[d[:10]] = _day_seconds(d)
+                if day is not None:
+                    blocks.setdefault((key[2], key[1]), []).append((day + _time_seconds(d), pos))
+            yield
+        del first, norms, days
+
+        matches = [Match("exact", [expenses[p] for p in g], 1.0) for g in exact.values()]
+        del exact
+
+        parent = {}
+        score = {}
+
+        def find(p):
+            root = p
+            while parent[root] != root:
+                root = parent[root]
+            while p != root:
+                parent[p], p = root, parent[p]
+            return root
+
+        word_sets = {}
+        compared = 0
+        for block in blocks.values():
+            if len(block) < 2:
+                continue
+            block.sort()
+            for i, (t, p) in enumerate(block):
+                a = word_sets.get(p)
+                if a is None:
+                    a = word_sets[p] = words(expenses[p].get("description"))
+                for t2, q in block[i + 1:i + 1 + MAX_COMPARISONS]:
+                    if t2 - t >= self.window:
+                        break
+                    b = word_sets.get(q)
+                    if b is None:
+                        b = word_sets[q] = words(expenses[q].get("description"))
+                    s = similarity(a, b)
+                    if s < self.threshold:
+                        continue
+                    parent.setdefault(p, p)
+                    parent.setdefault(q, q)
+                    rp, rq = find(p), find(q)
+                    if rp != rq:
+                        parent[rq] = rp
+                        score[rp] = min(score.get(rp, 1.0), score.pop(rq, 1.0), s)
+                    else:
+                        score[rp] = min(score.get(rp, 1.0), s)
+                compared += 1
+                if compared >= chunk:
+                    compared = 0
+                    yield
+        groups = {}
+        for p in parent:
+            groups.setdefault(find(p), []).append(p)
+        near = [Match("near", [expenses[p] for p in sorted(g)], score.get(root, 1.0)) for root, g in groups.items()]
+        near.sort(key=lambda m: -m.score)
+        self.matches = matches + near
+        self.done = True
+
+    def run(self, expenses):
+        for _ in self.steps(expenses):
+            pass
+        return self.matches
@@ -0,0 +1,210 @@
+#  EMEKA EXPENSE — encryption at rest
+#
+# Optional: with a passphrase set, Storage writes the ledger and its journal
+# encrypted with AES-256-GCM under a key derived by scrypt. Needs the
+# cryptography package (pip install cryptography); plain JSON ledgers work
+# without it.
+#
+# Ledger file layout:
+#
+#     header   MAGIC | salt (16) | log2 N, r, p (1 byte each) | chunk size (4) | nonce prefix (7)
+#     chunks   ciphertext length (4) | ciphertext + 16-byte tag ...
+#
+# The JSON is encrypted CHUNK bytes at a time as it is serialized, so saving
+# builds no whole-ledger buffer just for the crypto. Loading decrypts a chunk
+# at a time but joins the plaintext for json.loads, the one whole-file buffer
+# that json.load of a plain ledger reads as well. Chunk i's nonce is the file's
+# random prefix, i as 4 bytes and a final-chunk flag (the STREAM
+# construction): chunks can't be reordered, dropped or the file cut short
+# without decryption failing. The header is the associated data of every
+# chunk, so its parameters can't be swapped either.
+#
+# Journal lines are "enc:" + base64(random nonce | ciphertext), one per
+# delta, under the same key. Their associated data is the header of the
+# ledger file they follow plus the line's number in the journal, so a line
+# can't be moved, repeated, dropped from the middle or carried over from an
+# older journal without failing to decrypt. (Cutting whole lines off the end
+# looks like lines never written; nothing short of a counter kept elsewhere
+# could tell the two apart.)
+#
+# scrypt takes ~0.1 s by design. The derived key is cached per (salt,
+# parameters) for the life of the Vault, and saves reuse the salt of the file
+# that was loaded, so reloads and saves in a session derive it once.
+
+import base64
+import json
+import os
+import struct
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+except ImportError:
+    AESGCM = None
+
+MAGIC = b"EMEKAENC"
+CHUNK = 1 << 16
+LOG2_N, R, P = 15, 8, 1
+_HEADER = struct.Struct(">8s16sBBBI7s")
+_LENGTH = struct.Struct(">I")
+JOURNAL_PREFIX = "enc:"
+
+
+def available():
+    return AESGCM is not None
+
+
+def _require():
+    if AESGCM is None:
+        raise RuntimeError("Encrypted ledgers need cryptography: pip install cryptography")
+
+
+def is_encrypted(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class DecryptionError(ValueError):
+    """Wrong passphrase, or the file was damaged or tampered with."""
+
+
+class Vault:
+    def __init__(self, passphrase, log2_n=LOG2_N, r=R, p=P, chunk=CHUNK):
+        _require()
+        self._passphrase = passphrase.encode("utf-8")
+        self.params = (log2_n, r, p)
+        self.chunk = chunk
+        self.salt = os.urandom(16)  # replaced by the loaded file's salt
+        self.header = None  # of the ledger last written or read; binds the journal to it
+        self._keys = {}
+
+    def key(self, salt=None, params=None):
+        salt, params = salt or self.salt, params or self.params
+        cache_key = (salt, params)
+        key = self._keys.get(cache_key)
+        if key is None:
+            log2_n, r, p = params
+            key = Scrypt(salt=salt, length=32, n=1 << log2_n, r=r, p=p).derive(self._passphrase)
+            self._keys[cache_key] = key
+        return key
+
+    # ---------- Ledger file ----------
+    def dump(self, data, f, **json_kwargs):
+        """``json.dump(data)`` to binary file ``f``, encrypted."""
+        header = _HEADER.pack(MAGIC, self.salt, *self.params, self.chunk, os.urandom(7))
+        f.write(header)
+        self.header = header
+        writer = _EncryptingWriter(f, AESGCM(self.key()), header, self.chunk)
+        json.dump(data, writer, **json_kwargs)
+        writer.close()
+
+    def _chunks(self, f):
+        """Decrypted chunks of a file written by ``dump``, in order."""
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise DecryptionError("truncated header")
+        magic, salt, log2_n, r, p, chunk, prefix = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise DecryptionError("not an encrypted ledger")
+        aes = AESGCM(self.key(salt, (log2_n, r, p)))
+        counter = 0
+        length = f.read(_LENGTH.size)
+        while length:
+            if len(length) < _LENGTH.size:
+                raise DecryptionError("truncated chunk")
+            ct = f.read(_LENGTH.unpack(length)[0])
+            length = f.read(_LENGTH.size)
+            try:
+                yield aes.decrypt(_nonce(prefix, counter, not length), ct, header)
+            except InvalidTag:
+                raise DecryptionError("wrong passphrase, or the file is damaged") from None
+            if counter == 0:
+                # later saves keep this salt, so they reuse the key just derived
+                self.salt, self.params = salt, (log2_n, r, p)
+                self.header = header
+            counter += 1
+        if not counter:
+            raise DecryptionError("no data")
+
+    def load(self, f):
+        """Decrypt and parse a ledger written by ``dump``."""
+        return json.loads(b"".join(self._chunks(f)))
+
+    def check(self, path):
+        """Raise DecryptionError unless this passphrase opens ``path``. Only
+        the first chunk is decrypted."""
+        with open(path, "rb") as f:
+            next(self._chunks(f), None)
+
+    # ---------- Journal lines ----------
+    def _line_aad(self, index):
+        if self.header is None:
+            raise RuntimeError("journal lines follow an encrypted ledger; save or load one first")
+        return self.header + struct.pack(">Q", index)
+
+    def seal_line(self, text, index):
+        """Encrypt journal line number ``index`` (from 0) of the current ledger."""
+        nonce = os.urandom(12)
+        ct = AESGCM(self.key()).encrypt(nonce, text.encode("utf-8"), self._line_aad(index))
+        return JOURNAL_PREFIX + base64.b64encode(nonce + ct).decode("ascii")
+
+    def open_line(self, line, index):
+        try:
+            blob = base64.b64decode(line[len(JOURNAL_PREFIX):].rstrip("\n"), validate=True)
+            return AESGCM(self.key()).decrypt(blob[:12], blob[12:], self._line_aad(index)).decode("utf-8")
+        except (InvalidTag, ValueError):
+            raise DecryptionError(f"journal line {index + 1} does not decrypt: damaged, moved or "
+                                  f"from another journal") from None
+
+
+def _nonce(prefix, counter, last):
+    return prefix + struct.pack(">IB", counter, 1 if last else 0)
+
+
+class _EncryptingWriter:
+    """Text sink for json.dump: joins the small pieces it writes into
+    ``chunk``-sized blocks and encrypts each as it fills. A block is only
+    sealed once more text follows it, so ``close`` can flag the last one."""
+
+    def __init__(self, f, aes, header, chunk):
+        self.f = f
+        self.aes = aes
+        self.header = header
+        self.prefix = header[-7:]
+        self.chunk = chunk
+        self.pieces = []
+        self.size = 0
+        self.pending = bytearray()
+        self.counter = 0
+
+    def write(self, s):
+        self.pieces.append(s)
+        self.size += len(s)
+        if self.size >= self.chunk:
+            self._flush_text()
+            while len(self.pending) > self.chunk:
+                self._seal(bytes(self.pending[:self.chunk]), False)
+                del self.pending[:self.chunk]
+
+    def _flush_text(self):
+        self.pending += "".join(self.pieces).encode("utf-8")
+        self.pieces.clear()
+        self.size = 0
+
+    def _seal(self, block, last):
+        ct = self.aes.encrypt(_nonce(self.prefix, self.counter, last), block, self.header)
+        self.f.write(_LENGTH.pack(len(ct)))
+        self.f.write(ct)
+        self.counter += 1
+
+    def close(self):
+        self._flush_text()
+        while len(self.pending) > self.chunk:
+            self._seal(bytes(self.pending[:self.chunk]), False)
+            del self.pending[:self.chunk]
+        self._seal(bytes(self.pending), True)
+        self.pending.clear()
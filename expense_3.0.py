@@ -1,41 +1,66 @@
 #  EMEKA EXPENSE 3.0
 
-import json
 import os
-from datetime import datetime
-import csv
+import re
+import shutil
+import tempfile
+import time
+import webbrowser
+from datetime import date, datetime, timedelta
 import tkinter as tk
+from concurrent.futures import ProcessPoolExecutor
 from tkinter import ttk, messagebox, filedialog
-from collections import defaultdict
-import math
 
 # Matplotlib for embedded charts
+import matplotlib.dates as mdates
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-DATA_FILE = "expenses_modern.json"
-
-
-# ---------- Storage Layer ----------
-class Storage:
-    def __init__(self, filename=DATA_FILE):
-        self.filename = filename
-        self._ensure_file()
-
-    def _ensure_file(self):
-        if not os.path.exists(self.filename):
-            self.save({"expenses": [], "budget": 0.0})
-
-    def load(self):
-        try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {"expenses": [], "budget": 0.0}
-
-    def save(self, data):
-        with open(self.filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+
+from ledger import (Storage, filter_expenses, expense_matcher, last_n_months,
+                    write_report_txt, write_csv, read_csv, ensure_ids, new_id, apply_delta)
+from instrumentation import metrics, timed
+from tk_watchdog import Watchdog
+from scheduler import TaskScheduler, PRIORITY_INPUT, PRIORITY_VISIBLE, PRIORITY_BACKGROUND
+from rules import DEFAULT_RULES, RulesEngine, parse_rules_text, format_rules_text
+from sort_index import SortIndex
+from analytics import SpendAnalytics, top_categories
+from forecast import SpendForecast, month_bounds
+from cube import SpendCube
+from anomaly import AnomalyDetector
+import encryption
+from attachments import AttachmentStore, store_dir, refs, thumbnails_available
+from dedupe import DuplicateFinder, content_key
+from autocomplete import Autocomplete
+from precompute import IdleWorker, ReportCache, convert_months
+from consolidate import submit_all, merge, write_consolidated_txt
+from history import (History, add_rows, edit_row, delete_row, delete_rows, set_budget, clear_ledger, recategorize,
+                     set_recurring)
+from recurring import RULES, new_template, due, project
+from formatting import LOCALES, money, whole, symbol, money_format, set_money_format, normalize_date
+import columnar
+from fx import (COMMON_CURRENCIES, Converter, FxTotals, RateTable, base_currency, currency_symbol, read_rates_csv,
+                reporting_currency)
+from timeseries import Timeline
+
+# Rows scanned / rows date-parsed / Treeview rows / widgets re-themed per
+# scheduler step. Each step must stay well inside the scheduler's 8 ms slice.
+SCAN_CHUNK = 10000
+AGGREGATE_CHUNK = 5000
+TREE_CHUNK = 50
+WIDGET_CHUNK = 40
+DASHBOARD_ROWS = 200
+RECURRING_CHECK_MS = 60_000  # how often due recurring expenses are materialized
+PROJECTED_MONTHS = 3  # upcoming months shown on the chart when there are recurring expenses
+CHART_MODES = ["Last 12 months", "Timeline", "Calendar heatmap", "Categories (donut)", "Categories by month"]
+DUPLICATE_GROUPS_SHOWN = 500  # groups listed in Settings; merging all exact ones covers the rest
+SUGGESTIONS = 6  # description suggestions shown under the Add form's entry
+BATCH_ROWS = 8  # empty rows in the batch-entry grid; tabbing past the last adds another
+BATCH_FIELDS = ("date", "amount", "category", "description")
+CHART_CATEGORIES = 7  # named slices/bands in category charts; the rest are lumped together
+# day ordinal -> matplotlib date number, whatever epoch matplotlib is set to
+DATE_OFFSET = mdates.date2num(date(1970, 1, 1)) - date(1970, 1, 1).toordinal()
+DATA_FILETYPES = [("CSV files", "*.csv"), ("Parquet files", "*.parquet"), ("Arrow IPC files", "*.arrow"),
+                  ("All files", "*.*")]
 
 
 # ---------- Theme Definitions ----------
@@ -81,19 +106,43 @@ class ExpenseApp(tk.Tk):
 
         # Data
         self.storage = Storage()
+        self.attachments = AttachmentStore(store_dir(self.storage.filename))
+        if encryption.is_encrypted(self.storage.filename) and not self._unlock():
+            self.destroy()
+            raise SystemExit(1)
         self.data = self.storage.load()
+        if self.storage.last_error is not None:
+            # starting empty would let the next save overwrite the file
+            messagebox.showerror("Can't open ledger", f"{self.storage.filename} could not be read:\n\n"
+                                                      f"{self.storage.last_error}\n\nFix or move it and start again.")
+            self.destroy()
+            raise SystemExit(1)
         if "expenses" not in self.data:
             self.data = {"expenses": [], "budget": 0.0}
+        self.rules = RulesEngine(self.data.get("rules"))
+        self.sort_index = SortIndex()
+        self.scheduler = TaskScheduler(self)
+        self.history = History()
+        self.idle = IdleWorker(self, busy=self.scheduler.pending)
+        self._symbol_labels = []  # (label, template) to re-render when the currency changes
+        self._data_replaced()
 
         # UI state
         self.theme = Theme.DARK
         self.style = ttk.Style(self)
         self.style.theme_use("clam")
+        self._diag_job = None
+        self.current_page = None
+        self.sort_col = None  # None: newest first (insertion order)
+        self.sort_desc = False
+        self.page_start = 0
+        self._reports_stale = True  # Reports page not drawn since the data/theme last changed
 
         # UI variables
         self.search_var = tk.StringVar()
+        self.period_var = tk.StringVar(value="All time")
         self.category_filter_var = tk.StringVar(value="All")
-        self.budget_var = tk.StringVar(value=str(self.data.get("budget", 0.0)))
+        self.budget_var = tk.StringVar(value=money_format().editable(self.data.get("budget", 0.0)))
 
         # Preset categories
         self.default_categories = ["Food", "Transport", "Bills", "Shopping", "Health", "Entertainment", "Other"]
@@ -103,6 +152,17 @@ class ExpenseApp(tk.Tk):
         self._apply_theme()
         self.show_frame("dashboard")
         self.refresh_all()
+        self._recurring_tick()
+        self.idle.jobs += [self._precompute_report, self._prerender_reports]
+
+        # Diagnostics stay hidden until Ctrl+Shift+D (Tk sees the shifted "D")
+        self.bind_all("<Control-D>", lambda e: self._reveal_diagnostics())
+        self.bind_all("<Control-z>", lambda e: self._history_key(self.undo))
+        self.bind_all("<Control-y>", lambda e: self._history_key(self.redo))
+        self.bind_all("<Control-Z>", lambda e: self._history_key(self.redo))
+        # cheap enough to leave on; stalls show up on the diagnostics page
+        self.watchdog = Watchdog(self)
+        self.watchdog.start()
 
     # ---------------- UI BUILD ----------------
     def _build_ui(self):
@@ -140,13 +200,16 @@ class ExpenseApp(tk.Tk):
                           command=lambda k=key: self.show_frame(k))
             b.pack(fill="x", pady=4)
             self.navbuttons[key] = b
+        # hidden until revealed, see _reveal_diagnostics
+        self.navbuttons["diagnostics"] = tk.Button(nav_frame, text="🩺 Diagnostics", anchor="w", relief="flat",
+                                                   padx=8, command=lambda: self.show_frame("diagnostics"))
 
         # Theme toggle
         ttk.Button(self.sidebar, text="Toggle Theme", command=self.toggle_theme).pack(fill="x", padx=padx, pady=(12, 6))
 
         # Quick stats
-        self.total_lbl = tk.Label(self.sidebar, text="Total: ₦0.00", font=("Segoe UI", 10, "bold"))
-        self.budget_lbl = tk.Label(self.sidebar, text="Budget: ₦0.00")
+        self.total_lbl = tk.Label(self.sidebar, text=f"Total: {money(0)}", font=("Segoe UI", 10, "bold"))
+        self.budget_lbl = tk.Label(self.sidebar, text=f"Budget: {money(0)}")
         self.total_lbl.pack(padx=padx, pady=(10, 0), anchor="w")
         self.budget_lbl.pack(padx=padx, pady=(2, 6), anchor="w")
 
@@ -154,18 +217,18 @@ class ExpenseApp(tk.Tk):
         tk.Label(self.sidebar, text="Search", font=("Segoe UI", 9)).pack(padx=padx, anchor="w", pady=(8, 0))
         s = ttk.Entry(self.sidebar, textvariable=self.search_var)
         s.pack(fill="x", padx=padx, pady=6)
-        self.search_var.trace_add("write", lambda *a: self.refresh_dashboard())
+        self.search_var.trace_add("write", lambda *a: self._filters_changed())
 
         # Category filter
         tk.Label(self.sidebar, text="Category", font=("Segoe UI", 9)).pack(padx=padx, anchor="w", pady=(8, 0))
         cats = ["All"] + self.default_categories
         self.cat_combo = ttk.Combobox(self.sidebar, values=cats, state="readonly", textvariable=self.category_filter_var)
         self.cat_combo.pack(fill="x", padx=padx, pady=6)
-        self.cat_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh_dashboard())
+        self.cat_combo.bind("<<ComboboxSelected>>", lambda e: self._filters_changed())
 
     def _build_pages(self):
         # Create frames
-        for name in ("dashboard", "add", "reports", "settings"):
+        for name in ("dashboard", "add", "reports", "settings", "diagnostics"):
             frame = tk.Frame(self.content)
             frame.place(relx=0, rely=0, relwidth=1, relheight=1)
             self.frames[name] = frame
@@ -174,6 +237,7 @@ class ExpenseApp(tk.Tk):
         self._page_add(self.frames["add"])
         self._page_reports(self.frames["reports"])
         self._page_settings(self.frames["settings"])
+        self._page_diagnostics(self.frames["diagnostics"])
 
     # ---------------- DASHBOARD ----------------
     def _page_dashboard(self, parent):
@@ -183,6 +247,10 @@ class ExpenseApp(tk.Tk):
         header.pack(fill="x", padx=pad, pady=(18, 8))
         tk.Label(header, text="Dashboard", font=("Segoe UI", 16, "bold")).pack(side="left")
         ttk.Button(header, text="Refresh", command=self.refresh_all).pack(side="right")
+        self.redo_btn = ttk.Button(header, text="↷ Redo", command=self.redo, state="disabled")
+        self.redo_btn.pack(side="right", padx=6)
+        self.undo_btn = ttk.Button(header, text="↶ Undo", command=self.undo, state="disabled")
+        self.undo_btn.pack(side="right")
 
         # Cards
         cards = tk.Frame(parent)
@@ -199,7 +267,7 @@ class ExpenseApp(tk.Tk):
         cols = ("date", "category", "description", "amount")
         self.tree = ttk.Treeview(table_box, columns=cols, show="headings", selectmode="browse", height=12)
         for c in cols:
-            self.tree.heading(c, text=c.capitalize())
+            self.tree.heading(c, text=c.capitalize(), command=lambda c=c: self.sort_by(c))
             if c == "description":
                 self.tree.column(c, width=420, anchor="w")
             elif c == "amount":
@@ -213,44 +281,119 @@ class ExpenseApp(tk.Tk):
         actions.pack(fill="x", pady=(8, 0))
         ttk.Button(actions, text="Edit Selected", command=self.edit_selected).pack(side="left", padx=6)
         ttk.Button(actions, text="Delete Selected", command=self.delete_selected).pack(side="left", padx=6)
-        ttk.Button(actions, text="Export CSV", command=self.export_csv).pack(side="right", padx=6)
+        ttk.Button(actions, text="Receipts…", command=self.show_receipts).pack(side="left", padx=6)
+        ttk.Button(actions, text="Export…", command=self.export_csv).pack(side="right", padx=6)
+        ttk.Button(actions, text="Import…", command=self.import_csv).pack(side="right", padx=6)
+        ttk.Button(actions, text="Next ▶", command=lambda: self.turn_page(1)).pack(side="right", padx=(6, 18))
+        self.page_lbl = tk.Label(actions, text="", font=("Segoe UI", 9))
+        self.page_lbl.pack(side="right")
+        ttk.Button(actions, text="◀ Prev", command=lambda: self.turn_page(-1)).pack(side="right", padx=6)
 
     def _make_card(self, parent, title):
         card = tk.Frame(parent, bd=0, relief="ridge", padx=12, pady=12)
         card.pack(side="left", expand=True, fill="x", padx=8)
         tk.Label(card, text=title, font=("Segoe UI", 10)).pack(anchor="w")
-        val = tk.Label(card, text="₦0.00", font=("Segoe UI", 18, "bold"))
+        val = tk.Label(card, text=money(0), font=("Segoe UI", 18, "bold"))
         val.pack(anchor="w", pady=(6, 0))
         return val
 
+    def _priority(self, page):
+        return PRIORITY_VISIBLE if page == self.current_page else PRIORITY_BACKGROUND
+
     def refresh_dashboard(self):
-        # Filtered list based on search & category
-        q = self.search_var.get().strip().lower()
-        cat_filter = self.category_filter_var.get()
+        # a newer keystroke / filter change supersedes a refresh still in flight
+        self.scheduler.submit("ui.refresh_dashboard", self._dashboard_steps(), self._priority("dashboard"))
+
+    def _filters_changed(self):
+        self.page_start = 0
+        self.refresh_dashboard()
+
+    def sort_by(self, col):
+        # each click: natural direction -> reversed -> back to newest first
+        natural_desc = col in ("date", "amount")
+        if self.sort_col != col:
+            self.sort_col, self.sort_desc = col, natural_desc
+        elif self.sort_desc == natural_desc:
+            self.sort_desc = not natural_desc
+        else:
+            self.sort_col = None
+        for c in ("date", "category", "description", "amount"):
+            arrow = (" ▼" if self.sort_desc else " ▲") if c == self.sort_col else ""
+            self.tree.heading(c, text=c.capitalize() + arrow)
+        self._filters_changed()
+
+    def turn_page(self, direction):
+        start = max(0, self.page_start + direction * DASHBOARD_ROWS)
+        if direction > 0 and len(self.tree.get_children()) < DASHBOARD_ROWS:
+            return  # already on the last page
+        if start != self.page_start:
+            self.page_start = start
+            self.refresh_dashboard()
+
+    def _dashboard_steps(self):
+        # Filtered list based on search & category, newest first unless a
+        # column is sorted. Only one page of matches is shown, so stop there.
         expenses = self.data.get("expenses", [])
-        filtered = []
-        for e in reversed(expenses):
-            matches_q = q == "" or q in e.get("description", "").lower() or q in e.get("category", "").lower()
-            matches_cat = (cat_filter == "All") or (e.get("category", "") == cat_filter)
-            if matches_q and matches_cat:
-                filtered.append(e)
-
-        total = sum(e["amount"] for e in expenses)
-        budget = float(self.data.get("budget", 0.0))
-        remaining = budget - total
+        matches = expense_matcher(self.search_var.get(), self.category_filter_var.get())
+        start, stop = self.page_start, self.page_start + DASHBOARD_ROWS
+        if self.sort_col is not None and matches is None:
+            # O(log n + k) slice of the maintained index
+            rows = [self.by_id[i] for i in self.sort_index.ids(self.sort_col, self.sort_desc, start, stop)]
+        elif self.sort_col is not None:
+            rows = []
+            for n, rid in enumerate(self.sort_index.iter_ids(self.sort_col, self.sort_desc), 1):
+                e = self.by_id[rid]
+                if matches(e):
+                    rows.append(e)
+                    if len(rows) >= stop:
+                        break
+                if n % SCAN_CHUNK == 0:
+                    yield
+            rows = rows[start:stop]
+        else:
+            rows = []
+            for end in range(len(expenses), 0, -SCAN_CHUNK):
+                with metrics.timer("dashboard.filter"):
+                    rows.extend(filter_expenses(expenses[max(0, end - SCAN_CHUNK):end],
+                                                self.search_var.get(), self.category_filter_var.get()))
+                if len(rows) >= stop:
+                    break
+                yield
+            rows = rows[start:stop]
 
-        self.card_total.config(text=f"₦{total:,.2f}")
-        self.card_budget.config(text=f"₦{budget:,.2f}")
-        self.card_remaining.config(text=f"₦{remaining:,.2f}")
+        # in the reporting currency; the maintained totals once they're built
+        if self.fx_totals.ready:
+            total = self.fx_totals.total
+        else:
+            total = 0.0
+            for begin in range(0, len(expenses), SCAN_CHUNK):
+                total += self.fx.total(expenses[begin:begin + SCAN_CHUNK])
+                yield
+        missing = +self.fx_totals.missing if self.fx_totals.ready else None
 
-        self.total_lbl.config(text=f"Total: ₦{total:,.2f}")
-        self.budget_lbl.config(text=f"Budget: ₦{budget:,.2f}")
+        budget = float(self.data.get("budget", 0.0))
+        remaining = budget - total
 
-        # Update tree
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        for e in filtered[:200]:
-            self.tree.insert("", "end", values=(e["date"], e["category"], e["description"], f"₦{e['amount']:,.2f}"))
+        self.card_total.config(text=money(total))
+        self.card_budget.config(text=money(budget))
+        self.card_remaining.config(text=money(remaining))
+
+        self.total_lbl.config(text=f"Total: {money(total)}" + (
+            f"\n(excl. {sum(missing.values()):,} {'/'.join(sorted(missing))} row(s): no rate)" if missing else ""))
+        self.budget_lbl.config(text=f"Budget: {money(budget)}")
+
+        # Update tree; row iid is the expense id
+        self.tree.delete(*self.tree.get_children())
+        self.page_lbl.config(text=f"{start + 1:,}–{start + len(rows):,}" if rows else "no matches")
+        fmt = money_format()
+        for begin in range(0, len(rows), TREE_CHUNK):
+            yield
+            with metrics.timer("dashboard.tree_insert"):
+                for e in rows[begin:begin + TREE_CHUNK]:
+                    self.tree.insert("", "end", iid=str(e["id"]),
+                                     values=(e["date"], e["category"],
+                                             e["description"] + (" 📎" if e.get("attachments") else ""),
+                                             self.fx.label(e, fmt)))
 
     # ---------------- ADD / EDIT ----------------
     def _page_add(self, parent):
@@ -264,16 +407,20 @@ class ExpenseApp(tk.Tk):
 
         # Form fields
         self.amount_var = tk.StringVar()
+        self.currency_var = tk.StringVar(value=self.fx.base)
         self.category_var = tk.StringVar()
         self.desc_var = tk.StringVar()
-        self.edit_index = None  # None when adding, otherwise index in list
+        self.edit_id = None  # None when adding, otherwise id of the expense being edited
 
         form = tk.Frame(self.add_form)
         form.pack(fill="x")
 
         # Amount
-        tk.Label(form, text="Amount (₦)").grid(row=0, column=0, sticky="w")
+        self._symbol_label(form, "Amount ({symbol})").grid(row=0, column=0, sticky="w")
         ttk.Entry(form, textvariable=self.amount_var).grid(row=0, column=1, sticky="we", padx=6, pady=6)
+        # other currencies are converted for totals with the rates from Settings
+        self.currency_combo = ttk.Combobox(form, textvariable=self.currency_var, width=6)
+        self.currency_combo.grid(row=0, column=2, sticky="w", pady=6)
         # Category (combo with presets)
         tk.Label(form, text="Category").grid(row=1, column=0, sticky="w")
         cats = self.default_categories + ["Custom..."]
@@ -282,7 +429,23 @@ class ExpenseApp(tk.Tk):
         self.cat_combo_add.bind("<<ComboboxSelected>>", self._cat_preset_selected)
         # Description
         tk.Label(form, text="Description").grid(row=2, column=0, sticky="w")
-        ttk.Entry(form, textvariable=self.desc_var).grid(row=2, column=1, sticky="we", padx=6, pady=6)
+        self.desc_entry = ttk.Entry(form, textvariable=self.desc_var)
+        self.desc_entry.grid(row=2, column=1, sticky="we", padx=6, pady=6)
+        # inline warning for amounts far outside the category's usual range
+        self.anomaly_lbl = tk.Label(form, text="", font=("Segoe UI", 9), anchor="w")
+        self.anomaly_lbl.grid(row=3, column=1, sticky="we", padx=6)
+        # Receipts: copied into the attachment store as soon as they're picked
+        tk.Label(form, text="Receipts").grid(row=4, column=0, sticky="w")
+        self.attach_lbl = tk.Label(form, text="—", font=("Segoe UI", 9), anchor="w")
+        self.attach_lbl.grid(row=4, column=1, sticky="we", padx=6)
+        attach_btns = tk.Frame(form)
+        attach_btns.grid(row=4, column=2, sticky="w", pady=6)
+        ttk.Button(attach_btns, text="Attach…", command=self.attach_receipt).pack(side="left")
+        ttk.Button(attach_btns, text="✕", width=3, command=self._detach_receipts).pack(side="left", padx=(4, 0))
+        self.pending_attachments = []  # references saved with the expense
+        self._attaching = 0  # copies still running
+        for var in (self.amount_var, self.category_var, self.desc_var):
+            var.trace_add("write", lambda *a: self._check_anomaly())
 
         # Buttons
         buttons = tk.Frame(self.add_form)
@@ -293,6 +456,21 @@ class ExpenseApp(tk.Tk):
         # Make columns expand nicely
         form.columnconfigure(1, weight=1)
 
+        self._batch_section(parent, pad)
+
+        # Past descriptions as you type; created last so it drops down over the widgets below
+        self.suggest_box = tk.Listbox(parent, height=SUGGESTIONS, activestyle="dotbox", exportselection=False)
+        self.suggest_box.bind("<ButtonRelease-1>", lambda e: self._accept_suggestion())
+        self.desc_var.trace_add("write", lambda *a: self._suggest_descriptions())
+        self.desc_entry.bind("<Down>", lambda e: self._move_suggestion(1))
+        self.desc_entry.bind("<Up>", lambda e: self._move_suggestion(-1))
+        self.desc_entry.bind("<Return>", lambda e: self._accept_suggestion())
+        self.desc_entry.bind("<Tab>", lambda e: self._accept_suggestion())
+        self.desc_entry.bind("<Escape>", lambda e: self._hide_suggestions())
+        # after a beat, so a click on the list lands before it goes away
+        self.desc_entry.bind("<FocusOut>", lambda e: self.after(200, self._hide_suggestions))
+        self._suggestions = []
+
     def _cat_preset_selected(self, event):
         val = self.category_var.get()
         if val == "Custom...":
@@ -308,18 +486,107 @@ class ExpenseApp(tk.Tk):
                         self.cat_combo.config(values=["All"] + self.default_categories)
                         self.cat_combo_add.config(values=self.default_categories + ["Custom..."])
 
+    @timed("add.suggest")
+    def _suggest_descriptions(self):
+        # only while typing: the form being filled in for an edit shouldn't pop it up
+        if self.focus_get() is not self.desc_entry:
+            return
+        self._suggestions = self.autocomplete.suggest(self.desc_var.get(), SUGGESTIONS)
+        text = " ".join(self.desc_var.get().split()).casefold()
+        if not self._suggestions or [d.casefold() for d, _ in self._suggestions] == [text]:
+            self._hide_suggestions()
+            return
+        box = self.suggest_box
+        box.delete(0, "end")
+        for desc, cat in self._suggestions:
+            box.insert("end", f"{desc}  ·  {cat}" if cat else desc)
+        box.config(height=len(self._suggestions), bg=self.theme["card"], fg=self.theme["fg"],
+                   selectbackground=self.theme["accent"])
+        box.place(in_=self.desc_entry, x=0, rely=1.0, relwidth=1.0)
+        box.lift()
+
+    def _hide_suggestions(self):
+        self.suggest_box.place_forget()
+        self._suggestions = []
+
+    def _move_suggestion(self, step):
+        if not self._suggestions:
+            return None
+        box = self.suggest_box
+        cur = box.curselection()
+        i = min(max((cur[0] + step) if cur else (0 if step > 0 else len(self._suggestions) - 1), 0),
+                len(self._suggestions) - 1)
+        box.selection_clear(0, "end")
+        box.selection_set(i)
+        box.activate(i)
+        return "break"
+
+    def _accept_suggestion(self):
+        cur = self.suggest_box.curselection()
+        if not self._suggestions or not cur:
+            self._hide_suggestions()
+            return None
+        desc, cat = self._suggestions[cur[0]]
+        self.desc_var.set(desc)
+        self.desc_entry.icursor("end")
+        self._hide_suggestions()  # setting the text asked for suggestions again
+        # pre-fill the category it was last filed under, unless one is already chosen
+        if cat and not self.category_var.get().strip():
+            self.category_var.set(cat)
+        return "break"
+
+    def attach_receipt(self):
+        paths = filedialog.askopenfilenames(title="Attach receipts", filetypes=[
+            ("Receipts", "*.jpg *.jpeg *.png *.gif *.bmp *.webp *.tif *.tiff *.pdf"), ("All files", "*.*")])
+        for path in paths:
+            self._attaching += 1
+            # streamed a chunk per scheduler step, so a big scan doesn't freeze the form
+            self.scheduler.submit(f"attachments.put:{path}", self.attachments.put_steps(path, self.pending_attachments),
+                                  PRIORITY_INPUT, on_done=self._attached)
+        self._show_pending_attachments()
+
+    def _detach_receipts(self):
+        # only unlinks them from this expense; the files stay until a gc
+        self.pending_attachments = []
+        self._show_pending_attachments()
+
+    def _attached(self):
+        self._attaching -= 1
+        self._show_pending_attachments()
+
+    def _show_pending_attachments(self):
+        names = [r["name"] for r in self.pending_attachments]
+        text = ", ".join(names) if names else "—"
+        if self._attaching:
+            text += f" (copying {self._attaching}…)"
+        self.attach_lbl.config(text=text)
+
+    def _draft_entry(self):
+        try:
+            amt = money_format().parse(self.amount_var.get())
+        except ValueError:
+            return None
+        desc = self.desc_var.get().strip() or "-"
+        cat = self.category_var.get().strip() or self.rules.categorize(desc, amt, default="Other")
+        return {"amount": amt, "category": cat.title(), "description": desc}
+
+    def _check_anomaly(self):
+        draft = self._draft_entry()
+        warning = self.anomaly.check(draft) if draft else None
+        self.anomaly_lbl.config(text=f"⚠ {warning}" if warning else "", fg=self.theme["danger"])
+
     def save_expense(self):
         # Validate amount
-        amt_str = self.amount_var.get().strip()
         try:
-            # allow comma separators
-            amt = float(amt_str.replace(",", ""))
+            # allow thousands separators and the currency symbol
+            amt = money_format().parse(self.amount_var.get())
         except Exception:
             messagebox.showerror("Invalid", "Amount must be a number (e.g., 1200.50)")
             return
 
-        cat = self.category_var.get().strip() or "Other"
         desc = self.desc_var.get().strip() or "-"
+        # no category picked: let the rules decide
+        cat = self.category_var.get().strip() or self.rules.categorize(desc, amt, default="Other")
 
         entry = {
             "amount": round(float(amt), 2),
@@ -327,62 +594,249 @@ class ExpenseApp(tk.Tk):
             "description": desc,
             "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         }
+        currency = self.currency_var.get().strip().upper()
+        if currency and currency != self.fx.base:
+            entry["currency"] = currency
+        if self._attaching:
+            messagebox.showwarning("Attaching", "Receipts are still being copied; save again in a moment.")
+            return
+        if self.pending_attachments:
+            entry["attachments"] = list(self.pending_attachments)
+        warning = self.anomaly.check(entry)
+        if warning and not messagebox.askyesno("Unusual amount", f"{warning}\n\nSave it anyway?"):
+            return
 
-        if self.edit_index is None:
+        if self.edit_id is None:
             # append
-            self.data.setdefault("expenses", []).append(entry)
+            entry["id"] = new_id(self.data)
+            self._execute(add_rows([entry]))
+            # only new rows teach the baseline and the suggestions: an edit
+            # can't un-observe the row it replaces, and would count it twice
+            self.anomaly.observe(entry)
+            self.autocomplete.add(entry)
             messagebox.showinfo("Added", "Expense added successfully.")
         else:
             # editing: replace the item
-            idx = self.edit_index
-            try:
-                self.data["expenses"][idx] = entry
+            old = self.by_id.get(self.edit_id)
+            idx = self._position(old)
+            if idx is None:
+                messagebox.showerror("Error", "Could not update (expense no longer exists).")
+            else:
+                entry["id"] = old["id"]
+                self._execute(edit_row(idx, old, entry))
                 messagebox.showinfo("Updated", "Expense updated.")
-            except Exception:
-                messagebox.showerror("Error", "Could not update (index error).")
-            self.edit_index = None
+            self.edit_id = None
 
-        self.storage.save(self.data)
         self.clear_add_form()
-        self.refresh_all()
         # auto switch to dashboard for quick feedback
         self.show_frame("dashboard")
 
+    # ---------------- BATCH ENTRY ----------------
+    def _batch_section(self, parent, pad):
+        box = tk.Frame(parent)
+        box.pack(fill="x", padx=pad, pady=(18, 0))
+        head = tk.Frame(box)
+        head.pack(fill="x")
+        tk.Label(head, text="Batch Entry", font=("Segoe UI", 12, "bold")).pack(side="left")
+        tk.Label(head, text="Tab between cells, past the last row for another · Ctrl+Enter saves all",
+                 font=("Segoe UI", 9)).pack(side="left", padx=10)
+        ttk.Button(head, text="Save All", command=self.save_batch).pack(side="right")
+        ttk.Button(head, text="Clear", command=self.clear_batch).pack(side="right", padx=6)
+
+        self.batch_grid = tk.Frame(box)
+        self.batch_grid.pack(fill="x", pady=6)
+        for col, text in enumerate(("Date (blank = now)", "Amount", "Category (blank = rules)", "Description")):
+            tk.Label(self.batch_grid, text=text, font=("Segoe UI", 9)).grid(row=0, column=col, sticky="w", padx=2)
+        self.batch_grid.columnconfigure(3, weight=1)
+        self.batch_status = tk.Label(box, text="", font=("Segoe UI", 9), anchor="w")
+        self.batch_status.pack(fill="x")
+        self.batch_rows = []
+        self._batch_started = None  # perf_counter of the first keystroke of this batch
+        for _ in range(BATCH_ROWS):
+            self._add_batch_row()
+
+    def _add_batch_row(self):
+        grid = self.batch_grid
+        r = len(self.batch_rows) + 1
+        row = {k: tk.StringVar() for k in BATCH_FIELDS}
+        row["cells"] = [
+            ttk.Entry(grid, textvariable=row["date"], width=12),
+            ttk.Entry(grid, textvariable=row["amount"], width=12),
+            ttk.Combobox(grid, textvariable=row["category"], values=self.default_categories, width=16),
+            ttk.Entry(grid, textvariable=row["description"]),
+        ]
+        for col, cell in enumerate(row["cells"]):
+            cell.grid(row=r, column=col, sticky="we", padx=2, pady=1)
+            # checked when leaving a cell, not per keystroke: "12/0" is just unfinished
+            cell.bind("<FocusOut>", lambda e, row=row: self._check_batch_row(row))
+            cell.bind("<Control-Return>", lambda e: self.save_batch() or "break")
+        row["status"] = tk.Label(grid, text="", font=("Segoe UI", 9), width=16, anchor="w")
+        row["status"].grid(row=r, column=4, sticky="w", padx=(6, 0))
+        row["cells"][-1].bind("<Tab>", lambda e, row=row: self._batch_tab(row))
+        for k in BATCH_FIELDS:
+            row[k].trace_add("write", lambda *a: self._batch_edited())
+        self.batch_rows.append(row)
+        return row
+
+    def _batch_edited(self):
+        if self._batch_started is None:
+            self._batch_started = time.perf_counter()
+
+    def _batch_tab(self, row):
+        if row is not self.batch_rows[-1]:
+            return None
+        self._add_batch_row()["cells"][0].focus_set()
+        return "break"
+
+    def _parse_batch_row(self, row):
+        """(entry, None) for a valid row, (None, error) for a bad one, (None, None) if blank."""
+        date_text, amount_text, cat, desc = (row[k].get().strip() for k in BATCH_FIELDS)
+        if not (date_text or amount_text or desc):
+            return None, None
+        try:
+            amt = money_format().parse(amount_text)
+        except ValueError:
+            return None, "amount?"
+        if date_text:
+            stamp = normalize_date(date_text)
+            if stamp is None:
+                return None, "date?"
+        else:
+            stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        desc = desc or "-"
+        cat = cat or self.rules.categorize(desc, amt, default="Other")
+        return {"amount": round(float(amt), 2), "category": cat.title(), "description": desc, "date": stamp}, None
+
+    def _check_batch_row(self, row):
+        entry, error = self._parse_batch_row(row)
+        if error:
+            row["status"].config(text=f"⚠ {error}", fg=self.theme["danger"])
+        else:
+            row["status"].config(text="✓" if entry else "", fg=self.theme["success"])
+        return entry, error
+
+    @timed("add.save_batch")
+    def save_batch(self):
+        rows, bad = [], None
+        for row in self.batch_rows:
+            entry, error = self._check_batch_row(row)
+            if error and bad is None:
+                bad = row
+            elif entry:
+                rows.append(entry)
+        if bad is not None:
+            self.batch_status.config(text="Fix the marked rows, then save again.", fg=self.theme["danger"])
+            bad["cells"][0].focus_set()
+            return
+        if not rows:
+            self.batch_status.config(text="Nothing to save yet.", fg=self.theme["muted"])
+            return
+        elapsed = time.perf_counter() - (self._batch_started or time.perf_counter())
+        for e in rows:
+            e["id"] = new_id(self.data)
+        unusual = list(self.anomaly.scan(rows))
+        for e in rows:
+            self.autocomplete.add(e)
+        # one command: one journal write, one refresh, one undo step
+        self._execute(add_rows(rows, label=f"Add {len(rows):,} expenses"))
+        metrics.count("add.batch_rows", len(rows))
+        metrics.count("add.batch_seconds", elapsed)
+        metrics.record("add.batch_entry", elapsed)
+        msg = f"Saved {len(rows):,} expense(s)"
+        if elapsed > 0:
+            msg += f" · {len(rows) * 60 / elapsed:,.0f} rows/min"
+        if unusual:
+            msg += f" · {len(unusual)} unusual, e.g. {unusual[0][1]['description']}: {unusual[0][2]}"
+        self.clear_batch()
+        self.batch_status.config(text=msg, fg=self.theme["success"])
+
+    def clear_batch(self):
+        for row in self.batch_rows[BATCH_ROWS:]:
+            for w in row["cells"] + [row["status"]]:
+                w.destroy()
+        del self.batch_rows[BATCH_ROWS:]
+        for row in self.batch_rows:
+            for k in BATCH_FIELDS:
+                row[k].set("")
+            row["status"].config(text="")
+        self.batch_status.config(text="")
+        self._batch_started = None
+        self.batch_rows[0]["cells"][0].focus_set()
+
     def clear_add_form(self):
         self.amount_var.set("")
+        self.currency_var.set(self.fx.base)
         self.category_var.set("")
         self.desc_var.set("")
-        self.edit_index = None
+        self.edit_id = None
+        self.pending_attachments = []
+        self._show_pending_attachments()
 
-    def edit_selected(self):
+    def _selected_expense(self):
         sel = self.tree.selection()
-        if not sel:
+        return self.by_id.get(int(sel[0])) if sel else None
+
+    def _position(self, expense):
+        # identity, not equality: two identical rows are still different expenses
+        if expense is not None:
+            for i, e in enumerate(self.data.get("expenses", [])):
+                if e is expense:
+                    return i
+        return None
+
+    def edit_selected(self):
+        if not self.tree.selection():
             messagebox.showwarning("Select", "Please select an expense to edit.")
             return
-        vals = self.tree.item(sel[0])["values"]
-        # Find the expense in dataset by matching date & amount & category & description (first match)
-        target_date, target_cat, target_desc, target_amt = vals
-        # strip currency symbol
-        target_amt_val = float(str(target_amt).replace("₦", "").replace(",", ""))
-        idx = None
-        for i, e in enumerate(self.data.get("expenses", [])):
-            try:
-                if e["date"] == target_date and e["category"] == target_cat and e["description"] == target_desc and math.isclose(e["amount"], target_amt_val, rel_tol=1e-6):
-                    idx = i
-                    break
-            except Exception:
-                continue
-        if idx is None:
+        e = self._selected_expense()
+        if e is None:
             messagebox.showerror("Not found", "Could not locate the selected expense in storage.")
             return
         # populate add form
-        e = self.data["expenses"][idx]
-        self.amount_var.set(f"{e['amount']:.2f}")
+        self.amount_var.set(money_format().editable(e["amount"]))
+        self.currency_var.set(e.get("currency") or self.fx.base)
         self.category_var.set(e["category"])
         self.desc_var.set(e["description"])
-        self.edit_index = idx
+        self.edit_id = e["id"]
+        self.pending_attachments = list(refs(e))
+        self._show_pending_attachments()
         self.show_frame("add")
 
+    def show_receipts(self):
+        e = self._selected_expense()
+        if e is None or not refs(e):
+            messagebox.showinfo("Receipts", "Select an expense with receipts (marked 📎).")
+            return
+        win = tk.Toplevel(self)
+        win.title(f"Receipts — {e['description']}")
+        win.configure(bg=self.theme["bg"])
+        win.images = []  # PhotoImages live as long as the window
+        for col, ref in enumerate(refs(e)):
+            cell = tk.Frame(win, bg=self.theme["bg"])
+            cell.grid(row=0, column=col, padx=10, pady=10, sticky="n")
+            thumb = self.attachments.thumbnail(ref)
+            if thumb:
+                win.images.append(tk.PhotoImage(file=thumb))
+                tk.Label(cell, image=win.images[-1], bg=self.theme["bg"]).pack()
+            else:
+                tk.Label(cell, text="🖼" if thumbnails_available() else "📄", font=("Segoe UI", 40),
+                         bg=self.theme["bg"], fg=self.theme["fg"]).pack()
+            tk.Label(cell, text=f"{ref['name']}\n{ref.get('size', 0) / 1024:,.0f} KB", font=("Segoe UI", 9),
+                     bg=self.theme["bg"], fg=self.theme["fg"]).pack()
+            ttk.Button(cell, text="Open", command=lambda r=ref: self.open_receipt(r)).pack(pady=(4, 0))
+
+    def open_receipt(self, ref):
+        if not self.attachments.exists(ref["sha256"]):
+            messagebox.showerror("Missing", f"{ref['name']} is no longer in the attachment store.")
+            return
+        # blobs have no extension; give the viewer a copy under the original name
+        out_dir = os.path.join(tempfile.gettempdir(), "emeka_receipts", ref["sha256"][:12])
+        out = os.path.join(out_dir, os.path.basename(ref["name"]))
+        if not os.path.exists(out):
+            os.makedirs(out_dir, exist_ok=True)
+            shutil.copyfile(self.attachments.path(ref["sha256"]), out)
+        webbrowser.open(f"file://{os.path.abspath(out)}")
+
     def delete_selected(self):
         sel = self.tree.selection()
         if not sel:
@@ -390,24 +844,13 @@ class ExpenseApp(tk.Tk):
             return
         if not messagebox.askyesno("Confirm", "Delete selected expense?"):
             return
-        vals = self.tree.item(sel[0])["values"]
-        target_date, target_cat, target_desc, target_amt = vals
-        target_amt_val = float(str(target_amt).replace("₦", "").replace(",", ""))
-        idx = None
-        for i, e in enumerate(self.data.get("expenses", [])):
-            try:
-                if e["date"] == target_date and e["category"] == target_cat and e["description"] == target_desc and math.isclose(e["amount"], target_amt_val, rel_tol=1e-6):
-                    idx = i
-                    break
-            except Exception:
-                continue
+        e = self._selected_expense()
+        idx = self._position(e)
         if idx is None:
             messagebox.showerror("Not found", "Could not locate the selected expense in storage.")
             return
-        self.data["expenses"].pop(idx)
-        self.storage.save(self.data)
-        self.refresh_all()
-        messagebox.showinfo("Deleted", "Expense removed.")
+        self._execute(delete_row(idx, e))
+        messagebox.showinfo("Deleted", "Expense removed (Ctrl+Z to undo).")
 
     # ---------------- REPORTS ----------------
     def _page_reports(self, parent):
@@ -416,89 +859,451 @@ class ExpenseApp(tk.Tk):
         header.pack(fill="x", padx=pad, pady=(18, 8))
         tk.Label(header, text="Reports", font=("Segoe UI", 16, "bold")).pack(side="left")
         ttk.Button(header, text="Refresh Chart", command=self.refresh_reports).pack(side="right")
+        self.chart_var = tk.StringVar(value=CHART_MODES[0])
+        chart_combo = ttk.Combobox(header, values=CHART_MODES, textvariable=self.chart_var, state="readonly",
+                                   width=18)
+        chart_combo.pack(side="right", padx=6)
+        chart_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh_reports())
+
+        self.forecast_lbl = tk.Label(parent, text="", font=("Segoe UI", 10), anchor="w")
+        self.forecast_lbl.pack(fill="x", padx=pad)
 
         # Chart area
         chart_box = tk.Frame(parent)
-        chart_box.pack(fill="both", expand=True, padx=pad, pady=(6, 18))
+        chart_box.pack(fill="both", expand=True, padx=pad, pady=(6, 12))
 
         self.fig = Figure(figsize=(6, 3.5), dpi=100)
         self.ax = self.fig.add_subplot(111)
         self.canvas = FigureCanvasTkAgg(self.fig, master=chart_box)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        # zoom/pan for the timeline; packed only while it's showing
+        self.toolbar = NavigationToolbar2Tk(self.canvas, chart_box, pack_toolbar=False)
+        self._xlim_cid = None
+        self._timeline = None
+        self._timeline_job = None
+
+        # Distribution and largest expenses
+        stats_box = tk.Frame(parent)
+        stats_box.pack(fill="x", padx=pad, pady=(0, 8))
+        period_row = tk.Frame(stats_box)
+        period_row.pack(fill="x")
+        tk.Label(period_row, text="Spending Distribution", font=("Segoe UI", 12, "bold")).pack(side="left")
+        self.period_combo = ttk.Combobox(period_row, values=["All time"], state="readonly", width=12,
+                                         textvariable=self.period_var)
+        self.period_combo.pack(side="right")
+        self.period_combo.bind("<<ComboboxSelected>>", lambda e: self._period_changed())
+        tk.Label(period_row, text="Period", font=("Segoe UI", 9)).pack(side="right", padx=6)
+
+        tables = tk.Frame(stats_box)
+        tables.pack(fill="x", pady=(6, 0))
+        dist_cols = ("category", "count", "total", "median", "p90", "p99", "forecast")
+        self.dist_tree = ttk.Treeview(tables, columns=dist_cols, show="headings", selectmode="none", height=6)
+        for c in dist_cols:
+            self.dist_tree.heading(c, text=c if c in ("p90", "p99") else
+                                   "Month-end fcst" if c == "forecast" else c.title())
+            self.dist_tree.column(c, width=110 if c == "category" else 80, anchor="w" if c == "category" else "e")
+        self.dist_tree.pack(side="left", fill="x", expand=True)
+        top_cols = ("date", "description", "amount")
+        self.top_tree = ttk.Treeview(tables, columns=top_cols, show="headings", selectmode="none", height=6)
+        for c, w in zip(top_cols, (90, 160, 90)):
+            self.top_tree.heading(c, text="Largest Expenses" if c == "description" else c.title())
+            self.top_tree.column(c, width=w, anchor="e" if c == "amount" else "w")
+        self.top_tree.pack(side="left", fill="x", expand=True, padx=(8, 0))
 
         # Report text area
         text_box = tk.Frame(parent)
         text_box.pack(fill="x", padx=pad, pady=(0, 12))
         ttk.Button(text_box, text="Export Report (.txt)", command=self.export_report_txt).pack(side="right")
+        self.consolidate_btn = ttk.Button(text_box, text="Consolidated Report…", command=self.consolidated_report)
+        self.consolidate_btn.pack(side="right", padx=6)
 
     def refresh_reports(self):
+        if self.current_page != "reports":
+            # drawn when the user is idle, see _prerender_reports
+            self._reports_stale = True
+            self.idle.poke()
+            return
+        self._reports_stale = False
+        self.scheduler.submit("ui.refresh_reports", self._reports_steps(), PRIORITY_VISIBLE)
+
+    def _prerender_reports(self):
+        # idle job: draw the hidden page so opening it shows a finished chart
+        if not self._reports_stale or self.current_page == "reports":
+            return False
+        self._reports_stale = False
+        self.scheduler.submit("ui.refresh_reports", self._reports_steps(), PRIORITY_BACKGROUND)
+        return True
+
+    def _precompute_report(self):
+        # idle job: reconvert the months whose rows changed, off the Tk thread
+        cache = self.report_cache
+        if not cache.ready or not cache.dirty:
+            return False
+        jobs, converter = cache.pending(), cache.converter
+        self.idle.submit(lambda: convert_months(jobs, converter), cache.store)
+        return True
+
+    def _style_chart(self):
+        t = self.theme
+        self.fig.set_facecolor(t["bg"])
+        self.ax.set_facecolor(t["card"])
+        self.ax.tick_params(colors=t["fg"], which="both")
+        for spine in self.ax.spines.values():
+            spine.set_color(t["border"])
+        for text in (self.ax.title, self.ax.xaxis.label, self.ax.yaxis.label, *self.ax.texts):
+            text.set_color(t["fg"])
+
+    def _clear_chart(self):
+        if self._xlim_cid is not None:
+            self.ax.callbacks.disconnect(self._xlim_cid)
+            self._xlim_cid = None
+        self.ax.clear()
+
+    def _period_changed(self):
+        if self.chart_var.get() == "Categories (donut)":
+            self.refresh_reports()  # the donut follows the period too
+        else:
+            self.refresh_analytics()
+
+    def _reports_steps(self):
+        mode = self.chart_var.get()
+        if mode == "Timeline":
+            self.toolbar.pack(side="bottom", fill="x")
+        else:
+            self.toolbar.pack_forget()
+        if mode != CHART_MODES[0]:
+            # drawn from the shared cube; its memo makes flipping between these free
+            draw = {"Timeline": self._draw_timeline, "Calendar heatmap": self._draw_calendar,
+                    "Categories (donut)": self._draw_donut, "Categories by month": self._draw_stacked}[mode]
+            self._clear_chart()
+            if not self.cube.ready:
+                self.ax.set_title(f"{mode} — computing…")
+                self.forecast_lbl.config(text="")
+            else:
+                draw()
+            with metrics.timer("reports.draw"):
+                self._style_chart()
+                self.fig.tight_layout()
+                self.canvas.draw()
+            if mode == "Timeline":
+                self.toolbar.update()  # this view becomes the toolbar's "home"
+            yield
+            self.refresh_analytics()
+            return
         # Build monthly totals for the last 12 months
+        expenses = self.data.get("expenses", [])
+        monthly = {}
+        if self.fx_totals.ready:
+            monthly = self.fx_totals.monthly
+        else:
+            for start in range(0, len(expenses), AGGREGATE_CHUNK):
+                with metrics.timer("reports.aggregate"):
+                    for key, amount in self.fx.monthly(expenses[start:start + AGGREGATE_CHUNK]).items():
+                        monthly[key] = monthly.get(key, 0.0) + amount
+                yield
+
+        # Get sorted last 12 months, plus upcoming ones when something recurs
         now = datetime.now()
-        monthly = defaultdict(float)
-        for e in self.data.get("expenses", []):
-            try:
-                dt = datetime.strptime(e["date"], "%Y-%m-%d %H:%M:%S")
-            except Exception:
-                continue
-            key = dt.strftime("%Y-%m")
-            monthly[key] += e["amount"]
-
-        # Get sorted last 12 months
-        months = []
-        vals = []
-        for i in range(11, -1, -1):
-            m = (now.month - i - 1) % 12 + 1
-            y = now.year + ((now.month - i - 1) // 12)
-            key = f"{y:04d}-{m:02d}"
-            months.append(key)
-            vals.append(monthly.get(key, 0.0))
+        templates = self.data.get("recurring", [])
+        months = last_n_months(now, 12, PROJECTED_MONTHS if templates else 0)
+        vals = [monthly.get(key, 0.0) for key in months]
+        # future occurrences are projected here, never stored
+        projected = {}
+        until = (datetime.strptime(months[-1] + "-01", "%Y-%m-%d") + timedelta(days=32)).replace(day=1)
+        for e in project(templates, now, until - timedelta(seconds=1)):
+            projected[e["date"][:7]] = projected.get(e["date"][:7], 0.0) + e["amount"]
+        proj = [projected.get(key, 0.0) for key in months]
 
         # Plot
-        self.ax.clear()
-        bars = self.ax.bar(months, vals)
-        self.ax.set_title("Monthly Spending (last 12 months)")
-        self.ax.set_ylabel("₦")
+        self._clear_chart()
+        self.ax.bar(months, vals)
+        if projected:
+            self.ax.bar(months, proj, bottom=vals, alpha=0.35, hatch="//", label="Projected (recurring)")
+            self.ax.set_title("Monthly Spending (last 12 months + projected)")
+        else:
+            self.ax.set_title("Monthly Spending (last 12 months)")
+        self.ax.set_ylabel(symbol())
         self.ax.tick_params(axis='x', rotation=45)
         # neat labels for bars
-        for rect, v in zip(bars, vals):
-            height = rect.get_height()
+        for i, (v, p) in enumerate(zip(vals, proj)):
+            height = v + p
             if height > 0:
-                self.ax.annotate(f"₦{height:,.0f}", xy=(rect.get_x() + rect.get_width() / 2, height),
+                self.ax.annotate(whole(height), xy=(i, height),
                                  xytext=(0, 3), textcoords="offset points", ha="center", fontsize=8)
-        self.fig.tight_layout()
-        self.canvas.draw()
+        self._draw_forecast(months, now)
+        with metrics.timer("reports.draw"):
+            self._style_chart()
+            self.fig.tight_layout()
+            self.canvas.draw()
+        yield
+        self.refresh_analytics()
+
+    def _draw_timeline(self):
+        # whole history as one line, only ~plot-width points of it drawn
+        with metrics.timer("reports.timeline_levels"):
+            self._timeline = self.cube.memo("timeline", lambda: Timeline(self.cube.daily_totals()))
+        bounds = self._timeline.bounds()
+        if bounds is None:
+            self.ax.set_title("Daily spending — no dated expenses yet")
+            return
+        self._timeline_line, = self.ax.plot([], [], linewidth=1)
+        self.ax.set_xlim(bounds[0] + DATE_OFFSET, bounds[1] + 1 + DATE_OFFSET)
+        self._update_timeline()
+        self.ax.relim()
+        self.ax.autoscale_view(scalex=False)
+        self.ax.set_ylim(bottom=0)
+        locator = mdates.AutoDateLocator()
+        self.ax.xaxis.set_major_locator(locator)
+        self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        self.ax.set_ylabel(f"{symbol()} per day")
+        self._xlim_cid = self.ax.callbacks.connect("xlim_changed", self._timeline_zoomed)
+        self.forecast_lbl.config(text="Zoom or pan with the toolbar below the chart; detail follows the zoom.",
+                                 fg=self.theme["muted"])
+
+    def _draw_calendar(self):
+        today = date.today().toordinal()
+        first, grid = self.cube.calendar(today)
+        spent = sorted(v for row in grid for v in row if v > 0)
+        # scale to the 95th percentile so one rent payment doesn't wash out every other day
+        vmax = spent[int(0.95 * (len(spent) - 1))] if spent else 1.0
+        self.ax.imshow(grid, aspect="auto", cmap="YlOrRd", interpolation="nearest", vmin=0, vmax=vmax)
+        self.ax.set_yticks(range(7))
+        self.ax.set_yticklabels(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], fontsize=8)
+        ticks = [w for w in range(len(grid[0])) if date.fromordinal(first + 7 * w).day <= 7]
+        self.ax.set_xticks(ticks)
+        self.ax.set_xticklabels([f"{date.fromordinal(first + 7 * w):%b}" for w in ticks], fontsize=8)
+        self.ax.set_title("Daily spending, last 12 months")
+        self.forecast_lbl.config(text=f"Darkest: {whole(vmax)}+ per day · {len(spent):,} days with spending",
+                                 fg=self.theme["muted"])
+
+    @staticmethod
+    def _top_categories(totals):
+        """(named, lumped): biggest first; past CHART_CATEGORIES they go in "Others"."""
+        # heap selection: only the named slices need ordering
+        top = [c for c, _ in top_categories(totals, CHART_CATEGORIES + 1)]
+        if len(totals) <= CHART_CATEGORIES + 1:
+            return top, []
+        named = top[:CHART_CATEGORIES]
+        return named, [c for c in totals if c not in named]
+
+    def _draw_donut(self):
+        month = self.period_var.get()
+        if month == "All time":
+            first = last = None
+        else:
+            first, last = month_bounds(date(int(month[:4]), int(month[5:7]), 1).toordinal())
+        totals = self.cube.category_totals(first, last)
+        named, lumped = self._top_categories(totals)
+        slices = [(c, totals[c]) for c in named] + ([("Others", sum(totals[c] for c in lumped))] if lumped else [])
+        if not slices:
+            self.ax.set_title(f"Categories — nothing spent ({month})")
+            return
+        self.ax.pie([a for _, a in slices], labels=[c for c, _ in slices], startangle=90, counterclock=False,
+                    autopct=lambda p: f"{p:.0f}%" if p >= 4 else "", pctdistance=0.8,
+                    wedgeprops={"width": 0.4}, textprops={"fontsize": 8})
+        self.ax.text(0, 0, whole(sum(a for _, a in slices)), ha="center", va="center", fontsize=11, weight="bold")
+        self.ax.set_aspect("equal")
+        self.ax.set_title(f"Spending by category ({month})")
+        self.forecast_lbl.config(text="Pick the period under Spending Distribution.", fg=self.theme["muted"])
+
+    def _draw_stacked(self):
+        months = last_n_months(datetime.now(), 12)
+        series = self.cube.monthly_by_category(months)
+        named, lumped = self._top_categories({c: sum(v) for c, v in series.items()})
+        bands = [(c, series[c]) for c in named]
+        if lumped:
+            bands.append(("Others", [sum(v) for v in zip(*(series[c] for c in lumped))]))
+        if not bands:
+            self.ax.set_title("Categories by month — nothing spent in the last 12 months")
+            return
+        self.ax.stackplot(range(len(months)), *(vals for _, vals in bands), labels=[c for c, _ in bands],
+                          alpha=0.85)
+        self.ax.set_xticks(range(len(months)))
+        self.ax.set_xticklabels(months, rotation=45, fontsize=8)
+        self.ax.set_xlim(0, len(months) - 1)
+        self.ax.set_ylabel(symbol())
+        self.ax.set_title("Spending by category, last 12 months")
+        self.ax.legend(loc="upper left", fontsize=8)
+        self.forecast_lbl.config(text="")
+
+    def _update_timeline(self):
+        lo, hi = self.ax.get_xlim()
+        with metrics.timer("reports.timeline_view"):
+            level, xs, ys = self._timeline.view(int(lo - DATE_OFFSET), int(hi - DATE_OFFSET) + 1,
+                                                self.ax.get_window_extent().width)
+        self._timeline_line.set_data([x + DATE_OFFSET for x in xs], ys)
+        self.ax.set_title({"day": "Daily spending", "week": "Daily spending (weekly average)",
+                           "month": "Daily spending (monthly average)"}[level])
+
+    def _timeline_zoomed(self, ax):
+        # a toolbar drag fires this per mouse move; resample once per idle
+        if self._timeline_job is None:
+            self._timeline_job = self.after_idle(self._resample_timeline)
+
+    def _resample_timeline(self):
+        self._timeline_job = None
+        if self._timeline is not None and self._xlim_cid is not None:
+            self._update_timeline()
+            self.canvas.draw_idle()
+
+    def _draw_forecast(self, months, now):
+        # projected-vs-budget overlay; the forecast keeps its own running
+        # fit, so this reads a handful of sums instead of the ledger
+        budget = float(self.data.get("budget", 0.0))
+        if budget > 0:
+            self.ax.axhline(budget, linestyle="--", linewidth=1, color="tab:red", label="Monthly budget")
+        fc = self.forecast
+        if not fc.ready:
+            self.forecast_lbl.config(text="Forecast: computing…", fg=self.theme["muted"])
+        else:
+            fc.advance(now.toordinal())
+            current = months.index(now.strftime("%Y-%m"))
+            xs = list(range(current, len(months)))
+            ys = [fc.month_end(day=date(int(m[:4]), int(m[5:]), 1).toordinal())[1] for m in months[current:]]
+            self.ax.plot(xs, ys, "o--", color="tab:orange", label="Forecast")
+            spent, total = fc.month_end()
+            text = (f"This month: {whole(spent)} spent · forecast {whole(total)} by month end · "
+                    f"burn rate {whole(fc.daily_rate())}/day")
+            color = self.theme["fg"]
+            if budget > 0:
+                text += f" · {total / budget:.0%} of budget"
+                runs_out = fc.budget_runs_out(budget)
+                if runs_out is not None:
+                    text += f" · budget reached around {date.fromordinal(runs_out):%d %b}"
+                    color = self.theme["danger"]
+            self.forecast_lbl.config(text=text, fg=color)
+        if self.ax.get_legend_handles_labels()[0]:
+            self.ax.legend(loc="upper left", fontsize=8)
+
+    @timed("reports.analytics")
+    def refresh_analytics(self):
+        a = self.analytics
+        self.dist_tree.delete(*self.dist_tree.get_children())
+        self.top_tree.delete(*self.top_tree.get_children())
+        if not a.ready:
+            self.dist_tree.insert("", "end", values=("computing…",))
+            return
+        months = a.months()
+        self.period_combo.config(values=["All time"] + months)
+        month = self.period_var.get()
+        if month not in months:
+            self.period_var.set("All time")
+            month = None
+            # the amount index answers this without touching the ledger
+            top = [self.by_id[i] for i in self.sort_index.top("amount", 10)]
+        else:
+            top = a.top_expenses(10, month)
+        # month-end forecasts only make sense next to this month or all time
+        show_forecast = self.forecast.ready and month in (None, datetime.now().strftime("%Y-%m"))
+        for d in a.distribution(month):
+            fcst = whole(self.forecast.month_end(d["category"])[1]) if show_forecast else "—"
+            self.dist_tree.insert("", "end", values=(
+                d["category"], f"{d['count']:,}", money(d["total"]),
+                *(whole(d[k]) for k in ("median", "p90", "p99")), fcst))
+        for e in top:
+            self.top_tree.insert("", "end", values=(e["date"][:10], e["description"], money(e["amount"])))
 
     def export_report_txt(self):
         path = filedialog.asksaveasfilename(defaultextension=".txt")
         if not path:
             return
-        total = sum(e["amount"] for e in self.data.get("expenses", []))
-        with open(path, "w", encoding="utf-8") as f:
-            f.write("EMEKA Expense Report\n")
-            f.write(f"Generated: {datetime.now()}\n\n")
-            f.write(f"Total Spent: ₦{total:,.2f}\n\n")
-            f.write("By Category:\n")
-            by_cat = defaultdict(float)
-            for e in self.data.get("expenses", []):
-                by_cat[e["category"]] += e["amount"]
-            for c, a in sorted(by_cat.items(), key=lambda x: x[1], reverse=True):
-                f.write(f" - {c}: ₦{a:,.2f}\n")
-            f.write("\nDetails:\n")
-            for e in self.data.get("expenses", []):
-                f.write(f"{e['date']} | {e['category']} | {e['description']} | ₦{e['amount']:,.2f}\n")
+        # the category summary is kept warm by the idle pass; only months
+        # changed since then are reconverted here
+        summary = self.report_cache.summary() if self.report_cache.ready else None
+        with metrics.timer("export.report_txt"), open(path, "w", encoding="utf-8") as f:
+            write_report_txt(f, self.data, fx=self.fx, summary=summary)
         messagebox.showinfo("Saved", "Report exported.")
 
+    def consolidated_report(self):
+        paths = filedialog.askopenfilenames(title="Ledgers to combine",
+                                            filetypes=[("Expense ledgers", "*.json"), ("All files", "*.*")])
+        if not paths:
+            return
+        out = filedialog.asksaveasfilename(defaultextension=".txt", initialfile="consolidated_report.txt")
+        if not out:
+            return
+        # workers parse the files; poll for them so the window stays live
+        executor = ProcessPoolExecutor()
+        futures = submit_all(executor, paths, self.fx.reporting)  # in the currency our totals use
+        self.consolidate_btn.config(state="disabled", text="Combining…")
+
+        def poll():
+            if not all(f.done() for f in futures):
+                self.after(100, poll)
+                return
+            executor.shutdown(wait=False)
+            self.consolidate_btn.config(state="normal", text="Consolidated Report…")
+            try:
+                combined = merge((f.result() for f in futures), self.fx.reporting)
+            except Exception as exc:
+                messagebox.showerror("Error", f"Could not combine ledgers: {exc}")
+                return
+            with open(out, "w", encoding="utf-8") as f:
+                write_consolidated_txt(f, combined)
+            skipped = sum(1 for led in combined["ledgers"] if led["error"])
+            messagebox.showinfo("Saved", f"{len(paths) - skipped} ledger(s) combined, "
+                                         f"{combined['count']:,} expenses." + (f"\n{skipped} skipped." if skipped else ""))
+        poll()
+
     def export_csv(self):
-        path = filedialog.asksaveasfilename(defaultextension=".csv")
+        # .parquet / .arrow go through pyarrow, anything else is CSV
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=DATA_FILETYPES)
         if not path:
             return
-        with open(path, "w", newline="", encoding="utf-8") as csvf:
-            writer = csv.writer(csvf)
-            writer.writerow(["date", "category", "description", "amount"])
-            for e in self.data.get("expenses", []):
-                writer.writerow([e["date"], e["category"], e["description"], f"{e['amount']:.2f}"])
+        if columnar.file_format(path):
+            if not self._columnar_available():
+                return
+            with metrics.timer("export.columnar"):
+                columnar.write(path, self.data.get("expenses", []))
+            messagebox.showinfo("Saved", f"{os.path.basename(path)} exported.")
+            return
+        with metrics.timer("export.csv"), open(path, "w", newline="", encoding="utf-8") as csvf:
+            write_csv(csvf, self.data.get("expenses", []))
         messagebox.showinfo("Saved", "CSV exported.")
 
+    def _columnar_available(self):
+        if not columnar.available():
+            messagebox.showerror("Not available", "Parquet and Arrow files need pyarrow:\n\npip install pyarrow")
+        return columnar.available()
+
+    def import_csv(self):
+        path = filedialog.askopenfilename(filetypes=DATA_FILETYPES)
+        if not path:
+            return
+        skipped = []
+        if columnar.file_format(path):
+            if not self._columnar_available():
+                return
+            with metrics.timer("import.columnar"):
+                rows = list(columnar.read_expenses(path, skipped=skipped))
+        else:
+            with metrics.timer("import.csv"), open(path, "r", newline="", encoding="utf-8-sig") as csvf:
+                rows = list(read_csv(csvf, skipped))
+        categorized = self.rules.apply(rows)
+        for e in rows:
+            e["category"] = e["category"] or "Other"
+            e["id"] = new_id(self.data)
+        with metrics.timer("import.duplicate_check"):
+            known = {content_key(e) for e in self.data["expenses"]}
+            repeated = sum(1 for e in rows if content_key(e) in known)
+        # one pass, each row judged against the ledger and the rows before it
+        with metrics.timer("import.anomaly_scan"):
+            unusual = list(self.anomaly.scan(rows))
+        for e in rows:
+            self.autocomplete.add(e)
+        if rows:
+            self._execute(add_rows(rows))
+        msg = f"{len(rows):,} expense(s) imported, {categorized:,} categorized by rules."
+        if skipped:
+            msg += f"\n{len(skipped)} row(s) skipped (bad amount), e.g. row {skipped[0]}."
+        if repeated:
+            msg += f"\n{repeated:,} row(s) were already in the ledger: Settings → Duplicates merges them."
+        if unusual:
+            msg += f"\n{len(unusual):,} unusual amount(s) worth a look, e.g.:"
+            for _, e, warning in unusual[:3]:
+                msg += f"\n • {e['date'][:10]} {e['description']}: {warning}"
+        messagebox.showinfo("Imported", msg)
+
     # ---------------- SETTINGS ----------------
     def _page_settings(self, parent):
         pad = 20
@@ -508,10 +1313,116 @@ class ExpenseApp(tk.Tk):
 
         form = tk.Frame(parent)
         form.pack(fill="x", padx=pad, pady=8)
-        tk.Label(form, text="Monthly Budget (₦)").grid(row=0, column=0, sticky="w")
+        self._symbol_label(form, "Monthly Budget ({symbol})").grid(row=0, column=0, sticky="w")
         ttk.Entry(form, textvariable=self.budget_var).grid(row=0, column=1, padx=8, sticky="we")
         ttk.Button(form, text="Save Budget", command=self.save_budget).grid(row=0, column=2, padx=8)
 
+        # Currency: separators/placement from the locale; totals in the
+        # reporting currency, shown with its symbol
+        fmt = money_format()
+        self.locale_var = tk.StringVar(value=fmt.locale)
+        self.symbol_var = tk.StringVar(value=fmt.symbol)
+        self.reporting_var = tk.StringVar(value=reporting_currency(self.data))
+        tk.Label(form, text="Currency").grid(row=1, column=0, sticky="w", pady=(8, 0))
+        cur = tk.Frame(form)
+        cur.grid(row=1, column=1, padx=8, sticky="we", pady=(8, 0))
+        locale_combo = ttk.Combobox(cur, values=list(LOCALES), textvariable=self.locale_var, state="readonly",
+                                    width=8)
+        locale_combo.pack(side="left")
+        tk.Label(cur, text="Totals in", font=("Segoe UI", 9)).pack(side="left", padx=(10, 4))
+        self.reporting_combo = ttk.Combobox(cur, textvariable=self.reporting_var, width=6)
+        self.reporting_combo.pack(side="left")
+        self.reporting_combo.bind("<<ComboboxSelected>>",
+                                  lambda e: self.symbol_var.set(currency_symbol(self.reporting_var.get())))
+        tk.Label(cur, text="Symbol", font=("Segoe UI", 9)).pack(side="left", padx=(10, 4))
+        ttk.Entry(cur, textvariable=self.symbol_var, width=6).pack(side="left")
+        ttk.Button(form, text="Save Currency", command=self.save_currency).grid(row=1, column=2, padx=8, pady=(8, 0))
+        tk.Label(form, text="Exchange Rates").grid(row=2, column=0, sticky="w", pady=(8, 0))
+        self.rates_lbl = tk.Label(form, text="", font=("Segoe UI", 9), anchor="w")
+        self.rates_lbl.grid(row=2, column=1, padx=8, sticky="we", pady=(8, 0))
+        ttk.Button(form, text="Load Rates CSV…", command=self.load_rates).grid(row=2, column=2, padx=8, pady=(8, 0))
+        # Encryption at rest (ledger and journal; receipts are not encrypted)
+        tk.Label(form, text="Encryption").grid(row=3, column=0, sticky="w", pady=(8, 0))
+        self.encrypt_lbl = tk.Label(form, text="", font=("Segoe UI", 9), anchor="w")
+        self.encrypt_lbl.grid(row=3, column=1, padx=8, sticky="we", pady=(8, 0))
+        enc_btns = tk.Frame(form)
+        enc_btns.grid(row=3, column=2, padx=8, pady=(8, 0), sticky="w")
+        ttk.Button(enc_btns, text="Set Passphrase…", command=self.set_passphrase).pack(side="left")
+        ttk.Button(enc_btns, text="Remove", command=self.remove_encryption).pack(side="left", padx=(4, 0))
+        self._show_encryption()
+
+        # Categorization rules
+        rules_box = tk.Frame(parent)
+        rules_box.pack(fill="x", padx=pad, pady=(16, 0))
+        tk.Label(rules_box, text="Categorization Rules", font=("Segoe UI", 12, "bold")).pack(anchor="w")
+        tk.Label(rules_box, text="One per line — Category: keyword, keyword, re:<regex>, amount:<min>-<max>",
+                 font=("Segoe UI", 9)).pack(anchor="w")
+        self.rules_text = tk.Text(rules_box, height=7, wrap="none", bd=0)
+        self.rules_text.pack(fill="x", pady=6)
+        self.rules_text.insert("1.0", format_rules_text(self.rules.rules))
+        rule_btns = tk.Frame(rules_box)
+        rule_btns.pack(fill="x")
+        ttk.Button(rule_btns, text="Save Rules", command=self.save_rules).pack(side="left")
+        ttk.Button(rule_btns, text="Re-run Rules on All Expenses", command=self.rerun_rules).pack(side="left", padx=8)
+
+        # Recurring expenses
+        rec_box = tk.Frame(parent)
+        rec_box.pack(fill="x", padx=pad, pady=(16, 0))
+        tk.Label(rec_box, text="Recurring Expenses", font=("Segoe UI", 12, "bold")).pack(anchor="w")
+        tk.Label(rec_box, text="Repeat: daily, weekly, monthly, yearly or cron (minute hour day month weekday)",
+                 font=("Segoe UI", 9)).pack(anchor="w")
+        rec_form = tk.Frame(rec_box)
+        rec_form.pack(fill="x", pady=6)
+        self.rec_desc_var = tk.StringVar()
+        self.rec_amount_var = tk.StringVar()
+        self.rec_cat_var = tk.StringVar(value="Bills")
+        self.rec_rule_var = tk.StringVar(value="monthly")
+        self.rec_start_var = tk.StringVar(value=datetime.now().strftime("%Y-%m-%d"))
+        fields = (("Description", ttk.Entry(rec_form, textvariable=self.rec_desc_var, width=18)),
+                  ("Amount ({symbol})", ttk.Entry(rec_form, textvariable=self.rec_amount_var, width=10)),
+                  ("Category", ttk.Combobox(rec_form, values=self.default_categories, textvariable=self.rec_cat_var,
+                                            width=12)),
+                  ("Repeat", ttk.Combobox(rec_form, values=RULES, textvariable=self.rec_rule_var, width=14)),
+                  ("Start", ttk.Entry(rec_form, textvariable=self.rec_start_var, width=16)))
+        for col, (label, widget) in enumerate(fields):
+            self._symbol_label(rec_form, label, font=("Segoe UI", 9)).grid(row=0, column=col, sticky="w", padx=(0, 6))
+            widget.grid(row=1, column=col, sticky="we", padx=(0, 6))
+        ttk.Button(rec_form, text="Add Recurring", command=self.add_recurring).grid(row=1, column=len(fields))
+        rec_cols = ("description", "amount", "category", "repeat", "next")
+        self.rec_tree = ttk.Treeview(rec_box, columns=rec_cols, show="headings", selectmode="browse", height=4)
+        for c, w in zip(rec_cols, (200, 100, 110, 130, 150)):
+            self.rec_tree.heading(c, text=c.title())
+            self.rec_tree.column(c, width=w, anchor="e" if c == "amount" else "w")
+        self.rec_tree.pack(fill="x")
+        ttk.Button(rec_box, text="Remove Selected", command=self.remove_recurring).pack(anchor="w", pady=(6, 0))
+
+        # Duplicates: groups to review, merged into one row each
+        dup_box = tk.Frame(parent)
+        dup_box.pack(fill="x", padx=pad, pady=(16, 0))
+        dup_head = tk.Frame(dup_box)
+        dup_head.pack(fill="x")
+        tk.Label(dup_head, text="Duplicates", font=("Segoe UI", 12, "bold")).pack(side="left")
+        self.dup_lbl = tk.Label(dup_head, text="", font=("Segoe UI", 9))
+        self.dup_lbl.pack(side="left", padx=10)
+        self.dup_btn = ttk.Button(dup_head, text="Find Duplicates", command=self.find_duplicates)
+        self.dup_btn.pack(side="right")
+        dup_cols = ("date", "category", "description", "amount")
+        self.dup_tree = ttk.Treeview(dup_box, columns=dup_cols, show="tree headings", selectmode="extended", height=6)
+        self.dup_tree.heading("#0", text="Group")
+        self.dup_tree.column("#0", width=130)
+        for c, w in zip(dup_cols, (150, 110, 220, 100)):
+            self.dup_tree.heading(c, text=c.title())
+            self.dup_tree.column(c, width=w, anchor="e" if c == "amount" else "w")
+        self.dup_tree.pack(fill="x", pady=6)
+        dup_btns = tk.Frame(dup_box)
+        dup_btns.pack(fill="x")
+        ttk.Button(dup_btns, text="Merge Selected", command=self.merge_selected_duplicates).pack(side="left")
+        ttk.Button(dup_btns, text="Merge All Exact", command=lambda: self.merge_duplicates(
+            [m for m in self.dup_matches if m.kind == "exact"])).pack(side="left", padx=8)
+        tk.Label(dup_btns, text="Keeps the first row of a group, or the row you select in it",
+                 font=("Segoe UI", 9)).pack(side="left")
+        self.dup_matches = []
+
         # Danger zone
         danger_box = tk.Frame(parent)
         danger_box.pack(fill="x", padx=pad, pady=(16, 8))
@@ -522,25 +1433,475 @@ class ExpenseApp(tk.Tk):
 
     def save_budget(self):
         try:
-            b = float(self.budget_var.get().strip().replace(",", ""))
+            b = money_format().parse(self.budget_var.get())
         except Exception:
             messagebox.showerror("Invalid", "Budget must be a number.")
             return
-        self.data["budget"] = round(b, 2)
+        self._execute(set_budget(self.data.get("budget", 0.0), round(b, 2)))
+        messagebox.showinfo("Saved", "Budget saved.")
+
+    def save_rules(self):
+        try:
+            rules = parse_rules_text(self.rules_text.get("1.0", "end"))
+            self.rules.compile(rules)
+        except (ValueError, re.error) as exc:
+            # back to the rules still in effect; compile may have stopped halfway
+            saved = self.data.get("rules")
+            self.rules.compile(DEFAULT_RULES if saved is None else saved)
+            messagebox.showerror("Invalid rule", str(exc))
+            return
+        self.data["rules"] = rules
+        self.storage.save(self.data)
+        messagebox.showinfo("Saved", f"{len(rules)} rule(s) saved.")
+
+    def save_currency(self):
+        locale = self.locale_var.get()
+        code = self.reporting_var.get().strip().upper()
+        if not (len(code) == 3 and code.isalpha()):
+            messagebox.showerror("Currency", "Totals need a three-letter currency code, e.g. NGN or USD.")
+            return
+        if not self.data["expenses"]:
+            # nothing recorded yet: new rows will be in this currency too
+            self.data["base_currency"] = code
+        self.data["reporting_currency"] = code
+        # the symbol belongs to the code it was chosen for
+        self.data["currency"] = {"locale": locale, "symbol": self.symbol_var.get().strip() or currency_symbol(code),
+                                 "code": code}
+        self._apply_currency()
+        self._rebase_fx()
         self.storage.save(self.data)
         self.refresh_all()
-        messagebox.showinfo("Saved", "Budget saved.")
+        messagebox.showinfo("Saved", f"Amounts now look like {money(1234.5)}.")
 
-    def clear_all_data(self):
-        if not messagebox.askyesno("Confirm", "Clear ALL data? This cannot be undone."):
+    def load_rates(self):
+        path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
             return
-        self.data = {"expenses": [], "budget": 0.0}
+        try:
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                rates = read_rates_csv(f)
+        except (OSError, ValueError) as exc:
+            messagebox.showerror("Rates", f"Could not load rates:\n{exc}")
+            return
+        # the file is read as rates into the ledger's base currency; a table
+        # kept against another base can't be merged with it
+        table = RateTable.from_json(self.data.get("fx_rates"))
+        if table.base != self.fx.base:
+            table = RateTable(self.fx.base)
+        for cur, by_day in rates.items():
+            table.merge(cur, by_day)
+        self.data["fx_rates"] = table.to_json()
+        self._rebase_fx()
         self.storage.save(self.data)
         self.refresh_all()
+        messagebox.showinfo("Rates", f"{sum(len(d) for d in rates.values()):,} rate(s) loaded for "
+                                     f"{', '.join(sorted(rates))}.")
+
+    def _unlock(self):
+        """Ask for the passphrase of an encrypted ledger; False if the user gives up."""
+        if not encryption.available():
+            messagebox.showerror("Encrypted ledger", "This ledger is encrypted. Opening it needs the cryptography "
+                                                     "package:\n\npip install cryptography")
+            return False
+        prompt = "Passphrase for this ledger:"
+        while True:
+            passphrase = tk.simpledialog.askstring("Encrypted ledger", prompt, show="*", parent=self)
+            if not passphrase:
+                return False
+            vault = encryption.Vault(passphrase)
+            try:
+                vault.check(self.storage.filename)
+            except (OSError, encryption.DecryptionError) as exc:
+                prompt = f"{exc}\n\nPassphrase for this ledger:"
+                continue
+            # the derived key is cached in the vault: loads and reloads don't pay for scrypt again
+            self.storage.vault = vault
+            return True
+
+    def _show_encryption(self):
+        on = self.storage.vault is not None
+        self.encrypt_lbl.config(text="On: AES-256-GCM, scrypt key" if on else "Off: stored as plain JSON")
+
+    def set_passphrase(self):
+        if not encryption.available():
+            messagebox.showerror("Not available", "Encryption needs the cryptography package:\n\n"
+                                                  "pip install cryptography")
+            return
+        first = tk.simpledialog.askstring("Set passphrase", "New passphrase:", show="*", parent=self)
+        if not first:
+            return
+        if tk.simpledialog.askstring("Set passphrase", "Repeat it:", show="*", parent=self) != first:
+            messagebox.showerror("Set passphrase", "The passphrases didn't match; nothing changed.")
+            return
+        self.storage.vault = encryption.Vault(first)
+        with metrics.timer("storage.encrypt"):
+            self.storage.save(self.data)
+        self._show_encryption()
+        messagebox.showinfo("Encrypted", "The ledger is now encrypted. Without the passphrase it can't be recovered.")
+
+    def remove_encryption(self):
+        if self.storage.vault is None:
+            return
+        if not messagebox.askyesno("Remove encryption", "Store the ledger as plain JSON again?"):
+            return
+        self.storage.vault = None
+        self.storage.save(self.data)
+        self._show_encryption()
+
+    def _rebase_fx(self):
+        # new rates or reporting currency: totals reconvert per (currency, day)
+        self.fx = Converter.for_ledger(self.data)
+        self.fx_totals.rebase(self.fx)
+        self.report_cache.rebase(self.fx)
+        self.idle.poke()
+
+    def refresh_rates(self):
+        table = self.fx.table
+        known = sorted(set(table.currencies()) | set(COMMON_CURRENCIES) | {self.fx.base, self.fx.reporting})
+        self.currency_combo.config(values=known)
+        self.reporting_combo.config(values=known)
+        if len(table):
+            self.rates_lbl.config(text=f"{len(table):,} rate(s) in {table.base} for "
+                                       f"{', '.join(c for c in table.currencies() if c != table.base)}"
+                                       f" · latest {table.latest()}")
+        else:
+            self.rates_lbl.config(text="None loaded — CSV with date,currency,rate columns")
+
+    def _apply_currency(self):
+        cur = self.data.get("currency") or {}
+        # money() shows reporting-currency amounts; a symbol saved for
+        # another code (or before codes were saved) doesn't apply
+        code = reporting_currency(self.data)
+        sym = cur.get("symbol") if cur.get("code") == code else currency_symbol(code)
+        try:
+            set_money_format(cur.get("locale") or "en_NG", sym)
+        except ValueError:  # a locale this version doesn't know
+            set_money_format(symbol=sym)
+        for lbl, template in self._symbol_labels:
+            lbl.config(text=template.format(symbol=symbol()))
+
+    def _symbol_label(self, parent, template, **kw):
+        lbl = tk.Label(parent, text=template.format(symbol=symbol()), **kw)
+        self._symbol_labels.append((lbl, template))
+        return lbl
+
+    def rerun_rules(self):
+        overwrite = messagebox.askyesnocancel(
+            "Re-run Rules", "Also overwrite categories that were chosen by hand?\n\n"
+            "Yes: re-categorize every expense\nNo: only uncategorized / \"Other\" expenses")
+        if overwrite is None:
+            return
+        with metrics.timer("rules.rerun"):
+            changes = self.rules.changes(self.data.get("expenses", []), overwrite=overwrite)
+        if changes:
+            self._execute(recategorize(changes))
+        messagebox.showinfo("Done", f"{len(changes):,} expense(s) re-categorized.")
+
+    def add_recurring(self):
+        try:
+            amount = money_format().parse(self.rec_amount_var.get())
+        except ValueError:
+            messagebox.showerror("Invalid", "Amount must be a number.")
+            return
+        start_text = self.rec_start_var.get().strip()
+        for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
+            try:
+                start = datetime.strptime(start_text, fmt)
+                break
+            except ValueError:
+                pass
+        else:
+            messagebox.showerror("Invalid", "Start must look like 2024-01-31 or 2024-01-31 09:00.")
+            return
+        desc = self.rec_desc_var.get().strip() or "-"
+        cat = self.rec_cat_var.get().strip().title() or self.rules.categorize(desc, amount, default="Other")
+        try:
+            tpl = new_template(new_id(self.data), desc, cat, amount, self.rec_rule_var.get(), start)
+        except ValueError as exc:
+            messagebox.showerror("Invalid repeat rule", str(exc))
+            return
+        old = self.data.get("recurring", [])
+        # a start date in the past catches up right away, in the same undo step
+        rows, templates = due(old + [tpl], datetime.now())
+        self._execute(set_recurring(old, templates, self._number_rows(rows), "Add recurring expense"))
+        self.rec_desc_var.set("")
+        self.rec_amount_var.set("")
+        msg = f"Next on {tpl['next']}." if tpl["next"] else "This rule never fires."
+        if rows:
+            msg = f"{len(rows):,} past occurrence(s) added. " + msg
+        messagebox.showinfo("Recurring", msg)
+
+    def remove_recurring(self):
+        sel = self.rec_tree.selection()
+        if not sel:
+            messagebox.showwarning("Select", "Please select a recurring expense to remove.")
+            return
+        old = self.data.get("recurring", [])
+        # expenses it already generated stay in the ledger
+        self._execute(set_recurring(old, [t for t in old if t["id"] != int(sel[0])],
+                                    label="Remove recurring expense"))
+
+    @timed("recurring.materialize")
+    def materialize_recurring(self):
+        """Add every due occurrence as one batch with one storage commit."""
+        old = self.data.get("recurring")
+        if not old:
+            return 0
+        rows, templates = due(old, datetime.now())
+        if rows:
+            self._execute(set_recurring(old, templates, self._number_rows(rows),
+                                        f"Add {len(rows):,} recurring expense(s)"))
+        return len(rows)
+
+    def _number_rows(self, rows):
+        for e in rows:
+            e["id"] = new_id(self.data)
+            e["category"] = e["category"] or self.rules.categorize(e["description"], e["amount"], default="Other")
+        return rows
+
+    def _recurring_tick(self):
+        self.materialize_recurring()
+        self.after(RECURRING_CHECK_MS, self._recurring_tick)
+
+    def refresh_recurring(self):
+        self.rec_tree.delete(*self.rec_tree.get_children())
+        for t in self.data.get("recurring", []):
+            self.rec_tree.insert("", "end", iid=str(t["id"]), values=(
+                t["description"], money(t["amount"]), t["category"], t["rule"], t.get("next") or "never"))
+
+    def find_duplicates(self):
+        finder = DuplicateFinder()
+        self.dup_btn.config(state="disabled")
+        self.dup_lbl.config(text="Scanning…")
+
+        def done():
+            self.dup_btn.config(state="normal")
+            self._show_duplicates(finder.matches)
+        self.scheduler.submit("dedupe.scan", finder.steps(self.data["expenses"]), PRIORITY_BACKGROUND, on_done=done)
+
+    def _show_duplicates(self, matches):
+        # groups whose rows have since been deleted or edited don't apply any more
+        matches = [m for m in matches if all(self.by_id.get(e["id"]) is e for e in m.rows)]
+        self.dup_matches = matches
+        self.dup_tree.delete(*self.dup_tree.get_children())
+        fmt = money_format()
+        for g, m in enumerate(matches[:DUPLICATE_GROUPS_SHOWN]):
+            label = f"Exact ×{len(m.rows)}" if m.kind == "exact" else f"Similar {m.score:.0%} ×{len(m.rows)}"
+            self.dup_tree.insert("", "end", iid=f"g{g}", text=label, open=True)
+            for e in m.rows:
+                self.dup_tree.insert(f"g{g}", "end", iid=f"g{g}:{e['id']}", values=(
+                    e["date"], e["category"], e["description"], self.fx.label(e, fmt)))
+        exact = sum(1 for m in matches if m.kind == "exact")
+        text = f"{exact:,} exact and {len(matches) - exact:,} near-duplicate group(s)" if matches else "None found"
+        if len(matches) > DUPLICATE_GROUPS_SHOWN:
+            text += f" · first {DUPLICATE_GROUPS_SHOWN:,} shown"
+        self.dup_lbl.config(text=text)
+
+    def merge_selected_duplicates(self):
+        keep = {}  # group number -> id of the row to keep
+        for iid in self.dup_tree.selection():
+            g, _, rid = iid[1:].partition(":")
+            if rid or int(g) not in keep:
+                keep[int(g)] = int(rid) if rid else None
+        if not keep:
+            messagebox.showwarning("Select", "Select the groups (or the row to keep in each) to merge.")
+            return
+        self.merge_duplicates([self.dup_matches[g] for g in sorted(keep)], [keep[g] for g in sorted(keep)])
+
+    def merge_duplicates(self, matches, keep_ids=None):
+        """Delete all but one row of each group in ``matches``, as one command."""
+        keep_ids = keep_ids or [None] * len(matches)
+        drop = []
+        for m, keep in zip(matches, keep_ids):
+            if keep is None:
+                keep = m.rows[0]["id"]
+            drop.extend(e for e in m.rows if e["id"] != keep and self.by_id.get(e["id"]) is e)
+        if not drop:
+            return
+        if not messagebox.askyesno("Merge duplicates", f"Delete {len(drop):,} duplicate row(s)? (Undo restores them)"):
+            return
+        # positions for the undo, in one pass rather than one scan per row
+        position = {id(e): i for i, e in enumerate(self.data["expenses"])}
+        with metrics.timer("dedupe.merge"):
+            self._execute(delete_rows([(position[id(e)], e) for e in drop],
+                                      label=f"Merge {len(matches):,} duplicate group(s)"))
+        merged = {id(m) for m in matches}
+        self._show_duplicates([m for m in self.dup_matches if id(m) not in merged])
+
+    def clear_all_data(self):
+        if not messagebox.askyesno("Confirm", "Clear ALL data? You can still undo this with Ctrl+Z."):
+            return
+        # rules are configuration, not ledger data, and stay
+        self._execute(clear_ledger(self.data))
         messagebox.showinfo("Done", "All data cleared.")
 
+    # ---------------- DIAGNOSTICS ----------------
+    def _page_diagnostics(self, parent):
+        pad = 18
+        header = tk.Frame(parent)
+        header.pack(fill="x", padx=pad, pady=(18, 8))
+        tk.Label(header, text="Diagnostics", font=("Segoe UI", 16, "bold")).pack(side="left")
+        ttk.Button(header, text="Reset", command=self._reset_diagnostics).pack(side="right")
+        ttk.Button(header, text="Dump Trace…", command=self.dump_trace).pack(side="right", padx=6)
+        ttk.Button(header, text="Export Stall Log…", command=self.export_stall_log).pack(side="right")
+        self.profile_btn = ttk.Button(header, text="Start cProfile", command=self.toggle_profiling)
+        self.profile_btn.pack(side="right")
+
+        self.diag_summary = tk.Label(parent, text="", font=("Segoe UI", 10), justify="left")
+        self.diag_summary.pack(fill="x", padx=pad, anchor="w")
+
+        table_box = tk.Frame(parent)
+        table_box.pack(fill="both", expand=True, padx=pad, pady=(8, 18))
+        cols = ("metric", "calls", "last", "p50", "p95", "max")
+        self.diag_tree = ttk.Treeview(table_box, columns=cols, show="headings", selectmode="none")
+        for c in cols:
+            self.diag_tree.heading(c, text=c if c in ("metric", "calls") else f"{c} (ms)")
+            self.diag_tree.column(c, width=260 if c == "metric" else 90, anchor="w" if c == "metric" else "e")
+        self.diag_tree.pack(fill="both", expand=True)
+
+        tk.Label(table_box, text="Recent UI stalls", font=("Segoe UI", 12, "bold")).pack(anchor="w", pady=(12, 0))
+        stall_cols = ("at", "duration", "callback")
+        self.stall_tree = ttk.Treeview(table_box, columns=stall_cols, show="headings", selectmode="none", height=6)
+        for c, w in zip(stall_cols, (200, 100, 420)):
+            self.stall_tree.heading(c, text="duration (ms)" if c == "duration" else c)
+            self.stall_tree.column(c, width=w, anchor="e" if c == "duration" else "w")
+        self.stall_tree.pack(fill="x", pady=(8, 0))
+
+    def _reveal_diagnostics(self):
+        b = self.navbuttons["diagnostics"]
+        if not b.winfo_ismapped():
+            b.pack(fill="x", pady=4)
+        self.show_frame("diagnostics")
+
+    def refresh_diagnostics(self):
+        if self._diag_job is not None:
+            self.after_cancel(self._diag_job)
+            self._diag_job = None
+        lag = metrics.stats("tk.loop_lag")
+        stall = metrics.stats("tk.stall")
+        mem = metrics.memory_mb()
+        lines = [
+            f"Event loop lag: p50 {lag['p50'] * 1000:.1f} ms · p95 {lag['p95'] * 1000:.1f} ms · "
+            f"worst {lag['max'] * 1000:.1f} ms",
+            f"Stalls >{self.watchdog.threshold * 1000:.0f} ms: {metrics.counters['tk.stalls']} · "
+            f"p50 {stall['p50'] * 1000:.0f} ms · p95 {stall['p95'] * 1000:.0f} ms",
+            f"Peak memory: {mem:,.1f} MB" if mem is not None else "Peak memory: n/a on this platform",
+            f"Rows loaded: {metrics.counters['storage.rows_loaded']:,} · "
+            f"rows saved: {metrics.counters['storage.rows_saved']:,}",
+        ]
+        batch_rows, batch_seconds = metrics.counters["add.batch_rows"], metrics.counters["add.batch_seconds"]
+        if batch_rows and batch_seconds:
+            lines.append(f"Batch entry: {batch_rows:,} rows at {batch_rows * 60 / batch_seconds:,.0f} rows/min")
+        if metrics.profiling:
+            lines.append("cProfile capture running…")
+        self.diag_summary.config(text="\n".join(lines))
+
+        self.diag_tree.delete(*self.diag_tree.get_children())
+        for st in metrics.summary():
+            self.diag_tree.insert("", "end", values=(
+                st["name"], st["calls"],
+                *(f"{st[k] * 1000:.2f}" for k in ("last", "p50", "p95", "max"))))
+        self.stall_tree.delete(*self.stall_tree.get_children())
+        for st in self.watchdog.recent(20):
+            self.stall_tree.insert("", "end", values=(st["at"], f"{st['duration_ms']:,.0f}", st["callback"]))
+        # keep live while the page is visible
+        if self.frames["diagnostics"].winfo_ismapped():
+            self._diag_job = self.after(1000, self.refresh_diagnostics)
+
+    def _reset_diagnostics(self):
+        metrics.reset()
+        self.watchdog.stalls.clear()
+        self.refresh_diagnostics()
+
+    def toggle_profiling(self):
+        if not metrics.profiling:
+            metrics.start_profile()
+            self.profile_btn.config(text="Stop cProfile")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".prof", filetypes=[("cProfile stats", "*.prof")])
+        metrics.stop_profile(path or None)
+        self.profile_btn.config(text="Start cProfile")
+        if path:
+            messagebox.showinfo("Saved", f"Profile written to {path}\n(open with snakeviz or pstats).")
+
+    def dump_trace(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Chrome trace", "*.json")])
+        if not path:
+            return
+        n = metrics.dump_trace(path)
+        messagebox.showinfo("Saved", f"{n:,} trace events written.\nOpen in chrome://tracing or ui.perfetto.dev.")
+
+    def export_stall_log(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        n = self.watchdog.export(path)
+        messagebox.showinfo("Saved", f"{n} stall(s) exported.")
+
+    # ---------------- UNDO / REDO ----------------
+    def _execute(self, command):
+        self._apply_deltas(command.forward)
+        self.history.push(command)
+        self._committed(command.forward)
+
+    def undo(self):
+        command = self.history.undo()
+        if command is not None:
+            self._apply_deltas(command.inverse)
+            self._committed(command.inverse)
+
+    def redo(self):
+        command = self.history.redo()
+        if command is not None:
+            self._apply_deltas(command.forward)
+            self._committed(command.forward)
+
+    def _history_key(self, action):
+        # the rules editor is a Text widget; leave its keys alone
+        if not isinstance(self.focus_get(), tk.Text):
+            action()
+
+    def _committed(self, deltas):
+        self.storage.commit(self.data, deltas)
+        self.refresh_all()
+        self.idle.poke()
+
+    def _apply_deltas(self, deltas):
+        # keep by_id, the sort indexes and analytics in step with each delta
+        replaced = False
+        for d in deltas:
+            changed = apply_delta(self.data, d, self.by_id.get)
+            if changed is None:
+                replaced = True
+                continue
+            removed, added = changed
+            for e in removed:
+                self.by_id.pop(e["id"], None)
+                self.sort_index.remove(e)
+                self.analytics.remove(e)
+                self.forecast.remove(e)
+                self.fx_totals.remove(e)
+                self.report_cache.remove(e)
+            for e in added:
+                self.by_id[e["id"]] = e
+                self.analytics.add(e)
+                self.forecast.add(e)
+                self.fx_totals.add(e)
+                self.report_cache.add(e)
+            if len(added) > 1000:
+                self.sort_index.rebuild(self.data["expenses"])
+            else:
+                for e in added:
+                    self.sort_index.add(e)
+        if replaced:
+            self._data_replaced()
+
     # ---------------- Theme & Utilities ----------------
     def _apply_theme(self):
+        for _ in self._theme_steps():
+            pass
+
+    def _theme_steps(self):
         t = self.theme
         # root / background
         self.configure(bg=t["bg"])
@@ -563,9 +1924,12 @@ class ExpenseApp(tk.Tk):
         self.style.configure("Treeview", background=t["table_bg"], fieldbackground=t["table_bg"], foreground=t["fg"], rowheight=26)
         self.style.configure("Treeview.Heading", background=t["panel"], foreground=t["fg"])
 
-        # apply to frames and widgets inside content
-        for frame in self.frames.values():
-            for w in frame.winfo_children():
+        # apply to frames and widgets inside content, visible page first
+        pages = sorted(self.frames, key=lambda k: k != self.current_page)
+        widgets = [w for k in pages for w in self.frames[k].winfo_children()]
+        for start in range(0, len(widgets), WIDGET_CHUNK):
+            yield
+            for w in widgets[start:start + WIDGET_CHUNK]:
                 try:
                     if isinstance(w, tk.Frame):
                         w.configure(bg=t["bg"])
@@ -578,10 +1942,11 @@ class ExpenseApp(tk.Tk):
 
     def toggle_theme(self):
         self.theme = Theme.LIGHT if self.theme == Theme.DARK else Theme.DARK
-        self._apply_theme()
+        self.scheduler.submit("ui.apply_theme", self._theme_steps(), PRIORITY_INPUT)
         self.refresh_all()
 
     def show_frame(self, name):
+        self.current_page = name
         for k, f in self.frames.items():
             f.place_forget()
             # change nav button relief
@@ -590,22 +1955,90 @@ class ExpenseApp(tk.Tk):
         # refresh logic
         if name == "dashboard":
             self.refresh_dashboard()
-        elif name == "reports":
-            self.refresh_reports()
-
+        elif name == "reports" and (self._reports_stale or self.scheduler.pending("ui.refresh_reports")):
+            self.refresh_reports()  # otherwise already drawn while the user was idle
+        elif name == "diagnostics":
+            self.refresh_diagnostics()
+
+    def _data_replaced(self):
+        # self.data was loaded or reset: rebuild id lookups; the sort
+        # indexes rebuild lazily on the next sorted view
+        ensure_ids(self.data)
+        # pin what rows without a currency are in; written by the next save
+        self.data.setdefault("base_currency", base_currency(self.data))
+        self._apply_currency()
+        self.by_id = {e["id"]: e for e in self.data["expenses"]}
+        self.sort_index.rebuild(self.data["expenses"])
+        self._rebuild_analytics()
+
+    def _rebuild_analytics(self):
+        self.fx = Converter.for_ledger(self.data)
+        self.fx_totals = FxTotals(self.fx)
+        self.scheduler.submit("fx.build", self.fx_totals.build_steps(self.data["expenses"]),
+                              PRIORITY_BACKGROUND, on_done=self.refresh_dashboard)
+        # per-month category totals for the text report, refreshed when idle
+        self.report_cache = ReportCache(self.fx)
+        self.scheduler.submit("reports.precompute", self.report_cache.build_steps(self.data["expenses"]),
+                              PRIORITY_BACKGROUND, on_done=self.idle.poke)
+        # sketches and daily totals are keyed by category, so recategorizing
+        # means starting over
+        self.analytics = SpendAnalytics()
+        self.scheduler.submit("analytics.build", self.analytics.build_steps(self.data["expenses"]),
+                              PRIORITY_BACKGROUND, on_done=self.refresh_analytics)
+        # the forecast builds and updates the day x category cube the charts share
+        self.cube = SpendCube()
+        self.forecast = SpendForecast(cube=self.cube)
+        self.scheduler.submit("forecast.build", self.forecast.build_steps(self.data["expenses"]),
+                              PRIORITY_BACKGROUND, on_done=self.refresh_reports)
+        # only learns from the ledger and from rows as they're entered or
+        # imported, so undo/redo and deletes don't feed it
+        self.anomaly = AnomalyDetector()
+        self.scheduler.submit("anomaly.build", self.anomaly.build_steps(self.data["expenses"]), PRIORITY_BACKGROUND)
+        # same for description suggestions on the Add page
+        self.autocomplete = Autocomplete()
+        self.scheduler.submit("autocomplete.build", self.autocomplete.build_steps(self.data["expenses"]),
+                              PRIORITY_BACKGROUND)
+
+    @timed("ui.refresh_all")
     def refresh_all(self):
-        # reload storage (in case external modification)
-        self.data = self.storage.load()
-        self.budget_var.set(str(self.data.get("budget", 0.0)))
+        # reload storage only if it was modified outside this app; our own
+        # mutations already keep self.data and the indexes current
+        if self.storage.is_stale():
+            data = self.storage.load()
+            if self.storage.last_error is not None:
+                # keep what's on screen; the file is reread once it changes again
+                messagebox.showerror("Can't reload ledger", f"{self.storage.filename} changed on disk but could "
+                                                            f"not be read:\n\n{self.storage.last_error}")
+            else:
+                self.data = data if "expenses" in data else {"expenses": [], "budget": 0.0}
+                self._data_replaced()
+                self.history.clear()  # its commands point at rows of the old data
+                self.rules.ensure(self.data.get("rules"))
+        self.budget_var.set(money_format().editable(self.data.get("budget", 0.0)))
+        self.undo_btn.config(state="normal" if self.history.undo_label else "disabled")
+        self.redo_btn.config(state="normal" if self.history.redo_label else "disabled")
+        self.refresh_recurring()
+        self.refresh_rates()
+        # page refreshes first; the category scan only feeds the comboboxes
+        self.refresh_dashboard()
+        self.refresh_reports()
+        self.scheduler.submit("ui.scan_categories", self._category_steps(), PRIORITY_BACKGROUND)
+
+    def _category_steps(self):
         # ensure categories list includes current categories
-        for e in self.data.get("expenses", []):
-            c = e.get("category")
-            if c and c not in self.default_categories:
-                self.default_categories.append(c)
+        expenses = self.data.get("expenses", [])
+        known = set(self.default_categories)
+        for start in range(0, len(expenses), SCAN_CHUNK):
+            for e in expenses[start:start + SCAN_CHUNK]:
+                c = e.get("category")
+                if c and c not in known:
+                    known.add(c)
+                    self.default_categories.append(c)
+            yield
         self.cat_combo.config(values=["All"] + self.default_categories)
         self.cat_combo_add.config(values=self.default_categories + ["Custom..."])
-        self.refresh_dashboard()
-        self.refresh_reports()
+        for row in self.batch_rows:
+            row["cells"][2].config(values=self.default_categories)
 
 # ---------------- Run ----------------
 if __name__ == "__main__":
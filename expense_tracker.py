@@ -1,3 +1,4 @@
+import heapq
 import json
 import os
 from datetime import datetime
@@ -359,7 +360,7 @@ class ExpenseApp(tk.Tk):
         for e in self.data.get("expenses", []):
             by_cat[e["category"]] = by_cat.get(e["category"], 0.0) + e["amount"]
         lines = [f"Total: ₦{total:.2f}", "", "Top Categories:"]
-        top = sorted(by_cat.items(), key=lambda x: x[1], reverse=True)[:5]
+        top = heapq.nlargest(5, by_cat.items(), key=lambda x: x[1])
         for c, a in top:
             lines.append(f"{c}: ₦{a:.2f}")
         self.stats_text.config(text="\n".join(lines))
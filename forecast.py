@@ -0,0 +1,141 @@
+#  EMEKA EXPENSE — spending forecast
+#
+# Daily totals per category come from a SpendCube (day -> {category: amount}),
+# which the forecast builds and updates and the Reports charts share. A
+# straight line is fitted to the last ``window`` days of each category
+# (days with no spending count as zero) by ordinary least squares. The fit
+# only needs sum(y) and sum(x*y) over the window; sum(x) and sum(x*x) are
+# fixed for a fixed window. Both sums are updated as expenses come and go,
+# and as days slide out of the window, so a forecast never rereads the
+# ledger and is O(categories) to fit.
+#
+# Projected spend for a day is the fitted line at that day, floored at zero.
+
+import calendar
+from collections import defaultdict
+from datetime import date
+
+from cube import SpendCube
+
+TOTAL = None  # category key for "all categories"
+
+
+def month_bounds(day):
+    """First and last ordinal of the month containing ordinal ``day``."""
+    d = date.fromordinal(day)
+    first = d.replace(day=1).toordinal()
+    return first, first + calendar.monthrange(d.year, d.month)[1] - 1
+
+
+class SpendForecast:
+    def __init__(self, window=90, today=None, cube=None):
+        self.window = window
+        self.cube = cube if cube is not None else SpendCube()
+        self.days = self.cube.cells
+        self.ready = False
+        self._reset_window(today or date.today().toordinal())
+
+    def _reset_window(self, today):
+        # x runs 0..window-1 over [first, today]
+        self.today = today
+        self.first = today - self.window + 1
+        self.sums = defaultdict(lambda: [0.0, 0.0])  # category -> [sum y, sum x*y]
+        for day in range(self.first, today + 1):
+            for cat, amount in self.days.get(day, {}).items():
+                self._account(day, cat, amount)
+
+    def _account(self, day, category, amount):
+        x = day - self.first
+        for key in (category, TOTAL):
+            s = self.sums[key]
+            s[0] += amount
+            s[1] += amount * x
+
+    # ---- building / updates ----
+    def build_steps(self, expenses, chunk=5000):
+        """Generator for the UI scheduler (builds the cube too); sets ``ready`` when done."""
+        yield from self.cube.build_steps(expenses, chunk)
+        self._reset_window(self.today)
+        self.ready = True
+
+    def _accounted(self, e, sign, day):
+        if day is not None and self.ready and self.first <= day <= self.today:
+            self._account(day, e.get("category", ""), sign * e["amount"])
+
+    def add(self, e):
+        self._accounted(e, 1, self.cube.add(e))
+
+    def remove(self, e):
+        self._accounted(e, -1, self.cube.remove(e))
+
+    def advance(self, today=None):
+        """Slide the window so it ends at ``today`` (an ordinal)."""
+        today = today or date.today().toordinal()
+        if today == self.today:
+            return
+        if today < self.today or today - self.today >= self.window:
+            self._reset_window(today)
+            return
+        # moving the origin shifts every x down by ``step``: sum(x*y) -= step * sum(y)
+        step = today - self.today
+        for day in range(self.first, self.first + step):
+            for cat, amount in self.days.get(day, {}).items():
+                self._account(day, cat, -amount)
+        for s in self.sums.values():
+            s[1] -= step * s[0]
+        self.first += step
+        old_today, self.today = self.today, today
+        for day in range(old_today + 1, today + 1):
+            for cat, amount in self.days.get(day, {}).items():
+                self._account(day, cat, amount)
+
+    # ---- queries ----
+    def categories(self):
+        return [c for c, s in self.sums.items() if c is not TOTAL and s[0] > 0]
+
+    def trend(self, category=TOTAL):
+        """(a, b): fitted daily spend is a + b * (day - window start)."""
+        n = self.window
+        sy, sxy = self.sums[category] if category in self.sums else (0.0, 0.0)
+        sx = n * (n - 1) / 2
+        sxx = (n - 1) * n * (2 * n - 1) / 6
+        denom = n * sxx - sx * sx
+        b = (n * sxy - sx * sy) / denom if denom else 0.0
+        return (sy - b * sx) / n, b
+
+    def daily_rate(self, category=TOTAL):
+        """Fitted spend per day as of today."""
+        a, b = self.trend(category)
+        return max(0.0, a + b * (self.today - self.first))
+
+    def projected(self, start, end, category=TOTAL):
+        """Fitted spend over the days ``start``..``end`` (ordinals, inclusive)."""
+        a, b = self.trend(category)
+        return sum(max(0.0, a + b * (d - self.first)) for d in range(max(start, self.today + 1), end + 1))
+
+    def spent(self, start, end, category=TOTAL):
+        total = 0.0
+        for day in range(start, end + 1):
+            cats = self.days.get(day)
+            if cats:
+                total += sum(cats.values()) if category is TOTAL else cats.get(category, 0.0)
+        return total
+
+    def month_end(self, category=TOTAL, day=None):
+        """(spent so far, forecast total) for the month containing ``day``."""
+        first, last = month_bounds(day or self.today)
+        spent = self.spent(first, min(last, self.today), category)
+        return spent, spent + self.projected(first, last, category)
+
+    def budget_runs_out(self, budget, category=TOTAL):
+        """Ordinal of the day this month's spend is forecast to pass ``budget``, or None."""
+        first, last = month_bounds(self.today)
+        total = self.spent(first, self.today, category)
+        if total >= budget:
+            return self.today
+        a, b = self.trend(category)
+        for d in range(self.today + 1, last + 1):
+            total += max(0.0, a + b * (d - self.first))
+            if total >= budget:
+                return d
+        return None
@@ -0,0 +1,156 @@
+#  EMEKA EXPENSE — money and date formatting
+#
+# Amount strings are built once per distinct value and served from bounded
+# LRU caches afterwards: ledgers repeat the same amounts (rent, fares, data
+# bundles) and every refresh and export formats every visible row again.
+# The cache belongs to the MoneyFormat, so switching currency or locale
+# starts a fresh one instead of serving stale strings.
+#
+# Date strings are parsed through caches keyed by the string too. Records
+# stay plain JSON, so nothing is stored on them. Month keys need no parsing
+# at all (see ledger.month_key).
+
+from datetime import datetime
+from functools import lru_cache
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+CACHE_SIZE = 1 << 17
+OTHER_CACHE_SIZE = 1 << 12  # per foreign currency: far fewer rows
+
+# symbol, thousands separator, decimal separator, symbol after the number
+LOCALES = {
+    "en_NG": ("₦", ",", ".", False),
+    "en_GH": ("GH₵", ",", ".", False),
+    "en_KE": ("KSh", ",", ".", False),
+    "en_ZA": ("R", " ", ".", False),
+    "en_US": ("$", ",", ".", False),
+    "en_GB": ("£", ",", ".", False),
+    "en_IN": ("₹", ",", ".", False),
+    "de_DE": ("€", ".", ",", True),
+    "fr_FR": ("€", " ", ",", True),
+}
+DEFAULT_LOCALE = "en_NG"
+
+
+def _is_code(symbol):
+    return len(symbol) == 3 and symbol.isalpha() and symbol.isupper()
+
+
+class MoneyFormat:
+    def __init__(self, locale=DEFAULT_LOCALE, symbol=None, cache_size=CACHE_SIZE):
+        if locale not in LOCALES:
+            raise ValueError(f"unknown locale {locale!r}; choose from {', '.join(LOCALES)}")
+        default_symbol, self.group, self.decimal, self.suffix = LOCALES[locale]
+        self.locale = locale
+        self.symbol = symbol or default_symbol
+        # "USD 1,234.50", not "USD1,234.50"
+        self._lead = self.symbol + " " if _is_code(self.symbol) else self.symbol
+        self._others = {}
+        self._swap = None if (self.group, self.decimal) == (",", ".") else str.maketrans(
+            {",": self.group, ".": self.decimal})
+        # amount -> text; one cache per shape, each bounded
+        self.money = lru_cache(maxsize=cache_size)(self._money)
+        self.whole = lru_cache(maxsize=cache_size)(self._whole)
+        self.plain = lru_cache(maxsize=cache_size)(self._plain)
+
+    def _number(self, amount, decimals):
+        text = f"{abs(amount):,.{decimals}f}"
+        if self._swap is not None:
+            text = text.translate(self._swap)
+        sign = "-" if amount < 0 else ""
+        return f"{sign}{text} {self.symbol}" if self.suffix else f"{sign}{self._lead}{text}"
+
+    def _money(self, amount):
+        """"₦1,234.50" — two decimals, for tables and reports."""
+        return self._number(amount, 2)
+
+    def _whole(self, amount):
+        """"₦1,235" — for chart labels and summaries."""
+        return self._number(amount, 0)
+
+    @staticmethod
+    def _plain(amount):
+        """"1234.50" — no symbol or grouping, for CSV."""
+        return f"{amount:.2f}"
+
+    def editable(self, amount):
+        """"1234,50" — what an entry field is pre-filled with; ``parse`` reads it back."""
+        text = f"{amount:.2f}"
+        return text if self.decimal == "." else text.replace(".", self.decimal)
+
+    def parse(self, text):
+        """Amount typed in this locale ("1.234,50 €", "₦1,200"), as a float."""
+        text = str(text).replace(self.symbol, "").replace("₦", "").strip()
+        text = text.replace(self.group, "").replace(" ", "").replace(" ", "")
+        if self.decimal != ".":
+            text = text.replace(self.decimal, ".")
+        return float(text)
+
+    def for_currency(self, code):
+        """This layout with ``code`` for the symbol, for amounts in another
+        currency ("USD 1,234.50", "1.234,50 USD")."""
+        fmt = self._others.get(code)
+        if fmt is None:
+            fmt = self._others[code] = MoneyFormat(self.locale, code, cache_size=OTHER_CACHE_SIZE)
+        return fmt
+
+    def cache_info(self):
+        return {"money": self.money.cache_info(), "whole": self.whole.cache_info(),
+                "plain": self.plain.cache_info()}
+
+
+_current = MoneyFormat()
+
+
+def set_money_format(locale=DEFAULT_LOCALE, symbol=None):
+    global _current
+    _current = MoneyFormat(locale, symbol or None)
+    return _current
+
+
+def money_format():
+    return _current
+
+
+def money(amount):
+    return _current.money(amount)
+
+
+def whole(amount):
+    return _current.whole(amount)
+
+
+def plain(amount):
+    return _current.plain(amount)
+
+
+def symbol():
+    return _current.symbol
+
+
+# ---------- Dates ----------
+_INPUT_DATE_FORMATS = (DATE_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y/%m/%d",
+                       "%d/%m/%Y %H:%M:%S", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_timestamp(text):
+    """datetime of a stored date string, or None."""
+    try:
+        return datetime.strptime(text, DATE_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_date(text):
+    """A date in any common layout (ISO, "31/01/2024", "31 Jan 2024"…) as
+    DATE_FORMAT, or None if it isn't recognised. Day-first wins over
+    month-first, as on Nigerian bank statements."""
+    text = text.strip()
+    for fmt in _INPUT_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime(DATE_FORMAT)
+        except ValueError:
+            pass
+    return None
@@ -0,0 +1,287 @@
+#  EMEKA EXPENSE — multi-currency amounts
+#
+# An expense may carry a "currency" (ISO code, e.g. "USD"); rows without one
+# are in the ledger's base currency, data["base_currency"] (NGN for files
+# that predate it). Totals are shown in data["reporting_currency"], which
+# defaults to the base. Neither follows the amount layout picked in
+# Settings: switching en_NG to en_US changes separators, not what a ₦ row is
+# worth. Rates come from a local CSV, never the network:
+#
+#     date,currency,rate
+#     2024-05-01,USD,1480.50     <- one USD is worth 1480.50 of the base
+#     2024-05-01,EUR,1590
+#
+# Rates are kept against the ledger's base; other pairs go through it
+# (USD -> EUR = rate(USD) / rate(EUR)). A day without a rate uses the latest
+# earlier one.
+#
+# Conversion works on (currency, day) keys rather than rows: foreign amounts
+# are summed per key first and each key's rate is looked up once and cached;
+# rows already in the reporting currency are just added up.
+# FxTotals keeps those per-key sums (and their converted totals) up to date
+# as rows come and go, so dashboard and report refreshes don't convert at
+# all; only a rate or reporting-currency change reconverts, per key.
+
+import csv
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+from formatting import LOCALES, normalize_date
+from ledger import month_key
+
+# the currency each amount layout's symbol stands for
+LOCALE_CURRENCY = {
+    "en_NG": "NGN", "en_GH": "GHS", "en_KE": "KES", "en_ZA": "ZAR", "en_US": "USD",
+    "en_GB": "GBP", "en_IN": "INR", "de_DE": "EUR", "fr_FR": "EUR",
+}
+COMMON_CURRENCIES = ["NGN", "USD", "EUR", "GBP"]
+DEFAULT_BASE = "NGN"  # what rows were in before ledgers recorded it
+
+
+def base_currency(data):
+    """Currency of the ledger's rows that don't name one."""
+    return data.get("base_currency") or DEFAULT_BASE
+
+
+def reporting_currency(data):
+    return data.get("reporting_currency") or base_currency(data)
+
+
+def currency_symbol(code):
+    """Symbol to show ``code`` amounts with: a locale's, or the code itself."""
+    for locale, cur in LOCALE_CURRENCY.items():
+        if cur == code:
+            return LOCALES[locale][0]
+    return code
+
+
+def _day(e):
+    d = e.get("date", "")
+    return d[:10] if len(d) >= 10 and d[4] == "-" else ""
+
+
+def read_rates_csv(f):
+    """{currency: {day: rate}} from a date,currency,rate CSV.
+
+    Rows with a bad date or a non-positive rate raise ValueError naming the
+    line: a silently skipped rate would show up as a wrong total much later.
+    """
+    rates = defaultdict(dict)
+    reader = csv.DictReader(f)
+    for row in reader:
+        row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k is not None}
+        day = normalize_date(row.get("date", ""))
+        try:
+            rate = float(row.get("rate", "").replace(",", ""))
+        except ValueError:
+            rate = 0.0
+        cur = row.get("currency", "").upper()
+        if day is None or rate <= 0 or not cur:
+            raise ValueError(f"line {reader.line_num}: expected date,currency,rate with a positive rate")
+        rates[cur][day[:10]] = rate
+    return dict(rates)
+
+
+class RateTable:
+    """Rates per currency as sorted (day, rate) lists, relative to ``base``."""
+
+    def __init__(self, base=DEFAULT_BASE, rates=None):
+        self.base = base
+        self.days = {}
+        self.values = {}
+        for cur, by_day in (rates or {}).items():
+            self.merge(cur, by_day)
+
+    def merge(self, currency, by_day):
+        old = dict(zip(self.days.get(currency, []), self.values.get(currency, [])))
+        old.update(by_day)
+        days = sorted(old)
+        self.days[currency] = days
+        self.values[currency] = [old[d] for d in days]
+
+    def currencies(self):
+        return sorted(set(self.days) | {self.base})
+
+    def rate(self, currency, day=""):
+        """Units of ``base`` per unit of ``currency`` on ``day``, or None."""
+        if currency == self.base:
+            return 1.0
+        days = self.days.get(currency)
+        if not days:
+            return None
+        i = bisect_right(days, day) - 1 if day else len(days) - 1
+        return self.values[currency][max(i, 0)]  # before the first rate: use the first
+
+    def latest(self):
+        return max((d[-1] for d in self.days.values() if d), default=None)
+
+    def __len__(self):
+        return sum(len(d) for d in self.days.values())
+
+    def to_json(self):
+        return {"base": self.base,
+                "rates": {c: dict(zip(self.days[c], self.values[c])) for c in sorted(self.days)}}
+
+    @classmethod
+    def from_json(cls, obj):
+        obj = obj or {}
+        return cls(obj.get("base", DEFAULT_BASE), obj.get("rates"))
+
+
+class Converter:
+    """Amounts in ``reporting`` currency, with rates cached per (currency, day).
+    Rows without a currency are in ``base``."""
+
+    def __init__(self, table, reporting, base=DEFAULT_BASE):
+        self.table = table
+        self.reporting = reporting
+        self.base = base
+        self.factors = {}
+
+    @classmethod
+    def for_ledger(cls, data, reporting=None):
+        """Converter for ``data``'s rates and base, into ``reporting`` or the
+        ledger's own reporting currency."""
+        return cls(RateTable.from_json(data.get("fx_rates")), reporting or reporting_currency(data),
+                   base_currency(data))
+
+    def key(self, e):
+        # None: the ledger's base currency
+        return (e.get("currency") or None, _day(e))
+
+    def factor(self, currency, day=""):
+        """Reporting units per unit of ``currency`` on ``day``, or None if unknown."""
+        key = (currency, day)
+        try:
+            return self.factors[key]
+        except KeyError:
+            pass
+        currency = currency or self.base
+        if currency == self.reporting:
+            f = 1.0
+        else:
+            src, dst = self.table.rate(currency, day), self.table.rate(self.reporting, day)
+            f = src / dst if src is not None and dst is not None else None
+        self.factors[key] = f
+        return f
+
+    def amount(self, e):
+        f = self.factor(*self.key(e))
+        return e["amount"] * f if f is not None else None
+
+    def total(self, rows):
+        """Converted sum of ``rows``. Rows in the reporting currency (nearly
+        all of them, usually) are summed as they are; the rest are summed per
+        (currency, day) and converted once per key."""
+        total = 0.0
+        foreign = defaultdict(float)
+        for e in rows:
+            cur = e.get("currency") or self.base
+            if cur != self.reporting:
+                foreign[cur, _day(e)] += e["amount"]
+            else:
+                total += e["amount"]
+        for (cur, day), amount in foreign.items():
+            f = self.factor(cur, day)
+            if f is not None:
+                total += amount * f
+        return total
+
+    def monthly(self, rows):
+        monthly = defaultdict(float)
+        foreign = defaultdict(float)
+        for e in rows:
+            cur = e.get("currency") or self.base
+            if cur != self.reporting:
+                foreign[cur, _day(e)] += e["amount"]
+            else:
+                key = month_key(e["date"])
+                if key:
+                    monthly[key] += e["amount"]
+        for (cur, day), amount in foreign.items():
+            f = self.factor(cur, day)
+            if f is not None and day:
+                monthly[day[:7]] += amount * f
+        return monthly
+
+    def label(self, e, fmt):
+        """Display text for ``e``'s amount in the MoneyFormat ``fmt``; amounts
+        in other currencies keep its separators and show their code."""
+        cur = e.get("currency") or self.base
+        if cur == self.reporting:
+            return fmt.money(e["amount"])
+        return fmt.for_currency(cur).money(e["amount"])
+
+
+class FxTotals:
+    """Converted ledger total and monthly totals, maintained incrementally.
+
+    Built with ``build_steps`` like SpendAnalytics; until ``ready``, callers
+    fall back to ``Converter.total`` / ``monthly`` over the rows.
+    """
+
+    def __init__(self, converter):
+        self.converter = converter
+        self.ready = False
+        self._restart = False
+        self.sums = defaultdict(float)  # (currency, day) -> amount in that currency
+        self.counts = Counter()
+        self._convert()
+
+    def _convert(self):
+        self.total = 0.0
+        self.monthly = defaultdict(float)
+        self.missing = Counter()  # currency -> rows with no rate to convert them
+        for key, amount in self.sums.items():
+            self._account(key, amount, self.counts[key])
+
+    def _account(self, key, amount, count):
+        f = self.converter.factor(*key)
+        if f is None:
+            self.missing[key[0]] += count
+            return
+        self.total += amount * f
+        if key[1]:
+            self.monthly[key[1][:7]] += amount * f
+
+    def build_steps(self, expenses, chunk=5000):
+        key = self.converter.key
+        while True:
+            self.sums.clear()
+            self.counts.clear()
+            self._restart = False
+            i = 0
+            while i < len(expenses) and not self._restart:
+                for e in expenses[i:i + chunk]:
+                    k = key(e)
+                    self.sums[k] += e["amount"]
+                    self.counts[k] += 1
+                i += chunk
+                yield
+            if not self._restart:
+                break
+        self._convert()
+        self.ready = True
+
+    def _change(self, e, sign):
+        key = self.converter.key(e)
+        self.sums[key] += sign * e["amount"]
+        self.counts[key] += sign
+        if self.ready:
+            self._account(key, sign * e["amount"], sign)
+
+    def add(self, e):
+        if self.ready:
+            self._change(e, 1)
+
+    def remove(self, e):
+        if not self.ready:
+            self._restart = True  # the build may already have counted it
+            return
+        self._change(e, -1)
+
+    def rebase(self, converter):
+        """Switch rates or reporting currency: reconverts per key, not per row."""
+        self.converter = converter
+        if self.ready:
+            self._convert()
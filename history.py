@@ -0,0 +1,107 @@
+#  EMEKA EXPENSE — undo / redo
+#
+# Every ledger mutation is a Command: a label plus the deltas that perform
+# it and the deltas that reverse it (see apply_delta in ledger.py). Only the
+# rows a command touches are referenced, never a copy of the ledger, so
+# history memory is bounded by the number of commands kept. Clearing the
+# ledger records the old expense list itself; undoing it is a list swap,
+# however many rows there were.
+
+from collections import deque
+
+
+class Command:
+    __slots__ = ("label", "forward", "inverse")
+
+    def __init__(self, label, forward, inverse):
+        self.label = label
+        self.forward = forward
+        self.inverse = inverse
+
+
+def add_rows(rows, label=None):
+    label = label or ("Add expense" if len(rows) == 1 else f"Import {len(rows):,} expenses")
+    return Command(label, [{"op": "add", "rows": rows}], [{"op": "pop", "ids": [r["id"] for r in rows]}])
+
+
+def edit_row(index, old, new):
+    return Command("Edit expense", [{"op": "edit", "index": index, "row": new}],
+                   [{"op": "edit", "index": index, "row": old}])
+
+
+def delete_row(index, row):
+    return Command("Delete expense", [{"op": "delete", "index": index, "id": row["id"]}],
+                   [{"op": "insert", "index": index, "row": row}])
+
+
+def delete_rows(indexed, label=None):
+    """``indexed`` is a list of (index, row). Removed in one pass over the
+    ledger; undo reinserts them front to back, so each lands where it was."""
+    indexed = sorted(indexed, key=lambda p: p[0])
+    forward = [{"op": "pop", "ids": [r["id"] for _, r in indexed]}]
+    inverse = [{"op": "insert", "index": i, "row": r} for i, r in indexed]
+    return Command(label or f"Delete {len(indexed):,} expenses", forward, [{"op": "batch", "deltas": inverse}])
+
+
+def set_budget(old, new):
+    return Command("Change budget", [{"op": "budget", "value": new}], [{"op": "budget", "value": old}])
+
+
+def clear_ledger(data):
+    return Command("Clear all data", [{"op": "clear"}, {"op": "budget", "value": 0.0}],
+                   [{"op": "restore", "expenses": data["expenses"]},
+                    {"op": "budget", "value": data.get("budget", 0.0)}])
+
+
+def recategorize(changes):
+    """``changes`` is a list of (row, new_category) pairs, rows not yet modified."""
+    return Command("Re-run rules", [{"op": "recategorize", "changes": [[e["id"], c] for e, c in changes]}],
+                   [{"op": "recategorize", "changes": [[e["id"], e.get("category", "")] for e, _ in changes]}])
+
+
+def set_recurring(old, new, rows=(), label="Change recurring expenses"):
+    """Replace the recurring templates and add ``rows`` (their due occurrences)
+    as one journal line, so "next" and the rows it accounts for land together."""
+    forward = [{"op": "recurring", "value": new}]
+    inverse = [{"op": "recurring", "value": old}]
+    if rows:
+        forward.insert(0, {"op": "add", "rows": list(rows)})
+        inverse.append({"op": "pop", "ids": [r["id"] for r in rows]})
+    return Command(label, [{"op": "batch", "deltas": forward}], [{"op": "batch", "deltas": inverse}])
+
+
+class History:
+    def __init__(self, depth=100):
+        self._undo = deque(maxlen=depth)
+        self._redo = []
+
+    def push(self, command):
+        self._undo.append(command)
+        self._redo.clear()
+
+    def undo(self):
+        """The command to reverse (apply its ``inverse``), or None."""
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        self._redo.append(command)
+        return command
+
+    def redo(self):
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        self._undo.append(command)
+        return command
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+
+    @property
+    def undo_label(self):
+        return self._undo[-1].label if self._undo else None
+
+    @property
+    def redo_label(self):
+        return self._redo[-1].label if self._redo else None
@@ -0,0 +1,191 @@
+#  EMEKA EXPENSE — lightweight instrumentation
+#
+# Timers and counters for the hot paths (storage, dashboard/report refresh,
+# exports), an optional cProfile capture and a Chrome trace dump. Everything
+# records into the module level ``metrics`` object; the diagnostics page in
+# expense_3.0.py reads from it.
+#
+#     @timed("storage.load")
+#     def load(self): ...
+#
+#     with metrics.timer("dashboard.tree_insert"):
+#         ...
+
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from io import StringIO
+
+try:
+    import resource  # not available on Windows
+except ImportError:  # pragma: no cover - platform dependent
+    resource = None
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile (0-100) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Instrumentation:
+    def __init__(self, window=512, trace_events=20000):
+        self.enabled = True
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.calls = Counter()
+        self.counters = Counter()
+        self.events = deque(maxlen=trace_events)
+        self.profiler = None
+        self.active = {}  # thread id -> stack of span names currently running
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    # ---- recording ----
+    def record(self, name, seconds, start=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.samples[name].append(seconds)
+            self.calls[name] += 1
+            if start is not None:
+                self.events.append((name, start, seconds, threading.get_ident()))
+
+    def enter(self, name):
+        self.active.setdefault(threading.get_ident(), []).append(name)
+
+    def exit(self):
+        stack = self.active.get(threading.get_ident())
+        if stack:
+            stack.pop()
+
+    def running(self, thread_id):
+        """Snapshot of the spans open on ``thread_id``, outermost first."""
+        return list(self.active.get(thread_id, ()))
+
+    @contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        self.enter(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0, t0)
+            self.exit()
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.calls.clear()
+            self.counters.clear()
+            self.events.clear()
+
+    # ---- reading ----
+    def stats(self, name):
+        with self._lock:
+            recent = list(self.samples.get(name, ()))
+            calls = self.calls.get(name, 0)
+        values = sorted(recent)
+        return {
+            "name": name,
+            "calls": calls,
+            "last": recent[-1] if recent else 0.0,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": values[-1] if values else 0.0,
+        }
+
+    def summary(self):
+        with self._lock:
+            names = sorted(self.samples)
+        return [self.stats(name) for name in names]
+
+    @staticmethod
+    def memory_mb():
+        """Peak resident set size in MB, or None where it can't be read."""
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reports bytes, Linux KiB
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+    # ---- profiling ----
+    @property
+    def profiling(self):
+        return self.profiler is not None
+
+    def start_profile(self):
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profile(self, path=None, top=30):
+        """Stop the capture; write ``.prof`` to ``path`` and return a text summary."""
+        if self.profiler is None:
+            return ""
+        self.profiler.disable()
+        prof, self.profiler = self.profiler, None
+        if path:
+            prof.dump_stats(path)
+        out = StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(top)
+        return out.getvalue()
+
+    def dump_trace(self, path):
+        """Write recorded timings as a Chrome/Perfetto trace (chrome://tracing)."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        trace = [
+            {"name": name, "ph": "X", "pid": pid, "tid": tid,
+             "ts": (start - self._origin) * 1e6, "dur": dur * 1e6}
+            for name, start, dur, tid in events
+        ]
+        trace.extend(
+            {"name": name, "ph": "C", "pid": pid, "ts": (time.perf_counter() - self._origin) * 1e6,
+             "args": {"value": value}}
+            for name, value in self.counters.items()
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return len(trace)
+
+
+metrics = Instrumentation()
+
+
+def timed(name=None):
+    """Decorator recording each call's wall time under ``name``."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            metrics.enter(label)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.record(label, time.perf_counter() - t0, t0)
+                metrics.exit()
+        return wrapper
+    return decorate
@@ -0,0 +1,440 @@
+#  EMEKA EXPENSE — ledger core
+#
+# Storage and the pure data helpers used by expense_3.0.py. Nothing in here
+# touches Tk or matplotlib, so the same code paths can be driven headlessly
+# by the benchmarks and command line tools.
+
+import csv
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+
+from encryption import JOURNAL_PREFIX, DecryptionError, is_encrypted
+from formatting import DATE_FORMAT, money, money_format, normalize_date, plain, symbol
+from instrumentation import metrics, timed
+
+DATA_FILE = "expenses_modern.json"
+SCHEMA_VERSION = 2  # see migrations.py for the versions before it
+CSV_HEADER = ["date", "category", "description", "amount", "currency"]
+
+
+# ---------- Storage Layer ----------
+# Every change is appended to a JSONL journal next to the data file instead
+# of rewriting the whole file; ``load`` replays the journal, and the file is
+# rewritten (compacted) once the journal gets long. A torn last line from a
+# crash is ignored on replay.
+#
+# With a ``vault`` (encryption.Vault) the file and journal are written
+# encrypted; plain files still load, and are encrypted by the next save.
+#
+# Saves put a "schema_version" header first in the file, so readers (see
+# migrations.py) know the layout before the rows start.
+class Storage:
+    def __init__(self, filename=DATA_FILE, compact_every=500, create=True, vault=None):
+        self.filename = filename
+        self.vault = vault
+        self.journal = filename + ".journal"
+        self.compact_every = compact_every
+        self.last_error = None
+        self._journal_entries = 0
+        self._open_clears = 0
+        self._stamp = None
+        if create:
+            self._ensure_file()
+
+    def _ensure_file(self):
+        if not os.path.exists(self.filename):
+            self.save({"expenses": [], "budget": 0.0})
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        try:
+            jst = os.stat(self.journal)
+            return (st.st_mtime_ns, st.st_size, jst.st_mtime_ns, jst.st_size)
+        except OSError:
+            return (st.st_mtime_ns, st.st_size)
+
+    def is_stale(self):
+        """True if the file changed since we last loaded or saved it."""
+        return self._stamp is None or self._file_stamp() != self._stamp
+
+    @timed("storage.load")
+    def load(self):
+        try:
+            encrypted = is_encrypted(self.filename)
+            if encrypted:
+                if self.vault is None:
+                    raise PermissionError("the ledger is encrypted; a passphrase is needed")
+                with open(self.filename, "rb") as f:
+                    data = self.vault.load(f)
+            else:
+                with open(self.filename, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            if isinstance(data, dict):
+                self._replay(data, encrypted)
+            self.last_error = None
+        except Exception as exc:
+            # callers check last_error; the stamp keeps is_stale() from
+            # retrying the same broken file until it changes again
+            self.last_error = exc
+            self._stamp = self._file_stamp()
+            return {"expenses": [], "budget": 0.0}
+        if isinstance(data, dict):
+            metrics.count("storage.rows_loaded", len(data.get("expenses", [])))
+        self._stamp = self._file_stamp()
+        return data
+
+    def _replay(self, data, encrypted=False):
+        self._journal_entries = 0
+        self._open_clears = 0
+        cleared = []
+        try:
+            f = open(self.journal, "r", encoding="utf-8")
+        except OSError:
+            return
+        with f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # torn write; everything before it is good
+                if encrypted:
+                    # a line that doesn't open was tampered with, not torn:
+                    # fail the load rather than quietly drop the rest
+                    if not line.startswith(JOURNAL_PREFIX):
+                        raise DecryptionError(f"journal line {self._journal_entries + 1} is not encrypted")
+                    line = self.vault.open_line(line, self._journal_entries)
+                try:
+                    delta = json.loads(line)
+                except ValueError:
+                    break
+                data.setdefault("expenses", [])
+                apply_delta(data, delta, cleared=cleared)
+                self._journal_entries += 1
+        self._open_clears = len(cleared)
+        metrics.count("storage.journal_replayed", self._journal_entries)
+
+    @timed("storage.save")
+    def save(self, data):
+        """Rewrite the whole file and drop the journal."""
+        # header first; only the top-level dict is copied, not the rows
+        data = {"schema_version": SCHEMA_VERSION, **{k: v for k, v in data.items() if k != "schema_version"}}
+        if self.vault is not None:
+            # no indentation: nobody reads this one by eye
+            with open(self.filename, "wb") as f:
+                self.vault.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+        else:
+            with open(self.filename, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+        try:
+            os.remove(self.journal)
+        except OSError:
+            pass
+        self._journal_entries = 0
+        self._open_clears = 0
+        self._stamp = self._file_stamp()
+        metrics.count("storage.rows_saved", len(data.get("expenses", [])))
+
+    @timed("storage.commit")
+    def commit(self, data, deltas):
+        """Persist ``deltas`` (already applied to ``data``) via the journal.
+
+        Falls back to a full ``save`` when the journal is due for compaction
+        or a delta can't be replayed from what is on disk: restoring a clear
+        whose cleared rows were already compacted away.
+        """
+        restores = sum(1 for d in deltas if d["op"] == "restore")
+        clears = sum(1 for d in deltas if d["op"] == "clear")
+        if restores > self._open_clears or self._journal_entries + len(deltas) > self.compact_every:
+            self.save(data)
+            return
+        if self.vault is not None and self.vault.header is None:
+            self.save(data)  # journal lines are bound to an encrypted file; write one first
+            return
+        with open(self.journal, "a", encoding="utf-8") as f:
+            for i, d in enumerate(deltas, self._journal_entries):
+                if d["op"] == "restore":
+                    d = {"op": "restore"}  # the rows are replayed from the matching clear
+                line = json.dumps(d, ensure_ascii=False)
+                f.write((self.vault.seal_line(line, i) if self.vault is not None else line) + "\n")
+        self._journal_entries += len(deltas)
+        self._open_clears += clears - restores
+        self._stamp = self._file_stamp()
+        metrics.count("storage.journal_entries", len(deltas))
+
+
+# ---------- Row ids ----------
+# Every expense carries an integer "id", unique within its file, so the UI
+# can address rows without matching on content. "next_id" is stored next
+# to "budget".
+def ensure_ids(data):
+    """Give id-less expenses (older files, imports) an id; returns how many."""
+    expenses = data.setdefault("expenses", [])
+    next_id = data.get("next_id")
+    if next_id is None:
+        next_id = max((e["id"] for e in expenses if isinstance(e.get("id"), int)), default=0) + 1
+    assigned = 0
+    for e in expenses:
+        if not isinstance(e.get("id"), int):
+            e["id"] = next_id
+            next_id += 1
+            assigned += 1
+    data["next_id"] = next_id
+    return assigned
+
+
+def new_id(data):
+    rid = data.get("next_id", 1)
+    data["next_id"] = rid + 1
+    return rid
+
+
+# ---------- Deltas ----------
+# A delta is a small JSON-able dict describing one change to the ledger.
+# The undo history keeps a forward and an inverse list per command and the
+# storage journal persists them, so both share this one interpreter:
+#
+#   {"op": "add", "rows": [...]}              append rows
+#   {"op": "pop", "ids": [...]}               remove rows by id (one pass; instant at the tail)
+#   {"op": "insert", "index": i, "row": r}    put a deleted row back
+#   {"op": "delete", "index": i, "id": n}
+#   {"op": "edit", "index": i, "row": r}      replace the row with r's id
+#   {"op": "budget", "value": v}
+#   {"op": "clear"} / {"op": "restore"}       swap the expense list out/in
+#   {"op": "recategorize", "changes": [[id, category], ...]}
+#   {"op": "recurring", "value": [...]}       replace the recurring templates
+#   {"op": "batch", "deltas": [...]}          several deltas as one journal line
+#
+# "index" is a hint; the row is looked up by id if it has moved.
+def _locate(expenses, index, rid):
+    if 0 <= index < len(expenses) and expenses[index].get("id") == rid:
+        return index
+    for i in range(len(expenses) - 1, -1, -1):
+        if expenses[i].get("id") == rid:
+            return i
+    return None
+
+
+def _bump_next_id(data, rows):
+    top = max((r["id"] for r in rows if isinstance(r.get("id"), int)), default=0)
+    if top >= data.get("next_id", 1):
+        data["next_id"] = top + 1
+
+
+def apply_delta(data, delta, lookup=None, cleared=None):
+    """Apply ``delta`` to ``data`` in place.
+
+    Returns ``(removed, added)`` rows so callers can update their indexes,
+    or None when the change is wholesale (clear, restore, recategorize) and
+    indexes should be rebuilt. ``lookup`` maps id -> row for recategorize;
+    ``cleared`` is a stack that lets a journal "restore" find the rows its
+    matching "clear" swapped out.
+    """
+    expenses = data["expenses"]
+    op = delta["op"]
+    if op == "add":
+        expenses.extend(delta["rows"])
+        _bump_next_id(data, delta["rows"])
+        return [], delta["rows"]
+    if op == "pop":
+        ids = set(delta["ids"])
+        removed = []
+        while expenses and expenses[-1].get("id") in ids:
+            removed.append(expenses.pop())
+        if len(removed) < len(ids):
+            # not all at the tail (e.g. journal replayed over a newer file)
+            rest = [e for e in expenses if e.get("id") in ids]
+            expenses[:] = [e for e in expenses if e.get("id") not in ids]
+            removed.extend(rest)
+        return removed, []
+    if op == "insert":
+        row = delta["row"]
+        expenses.insert(min(delta["index"], len(expenses)), row)
+        _bump_next_id(data, [row])
+        return [], [row]
+    if op == "delete":
+        i = _locate(expenses, delta["index"], delta["id"])
+        return ([expenses.pop(i)] if i is not None else []), []
+    if op == "edit":
+        row = delta["row"]
+        i = _locate(expenses, delta["index"], row["id"])
+        if i is None:
+            return [], []
+        old, expenses[i] = expenses[i], row
+        return [old], [row]
+    if op == "budget":
+        data["budget"] = delta["value"]
+        return [], []
+    if op == "recurring":
+        data["recurring"] = delta["value"]
+        return [], []
+    if op == "batch":
+        removed, added, replaced = [], [], False
+        for d in delta["deltas"]:
+            changed = apply_delta(data, d, lookup, cleared)
+            if changed is None:
+                replaced = True
+            else:
+                removed.extend(changed[0])
+                added.extend(changed[1])
+        return None if replaced else (removed, added)
+    if op == "clear":
+        if cleared is not None:
+            cleared.append(expenses)
+        data["expenses"] = []
+        return None
+    if op == "restore":
+        rows = delta.get("expenses")
+        if rows is None:
+            rows = cleared.pop() if cleared else data["expenses"]
+        data["expenses"] = rows
+        return None
+    if op == "recategorize":
+        if lookup is None:
+            lookup = {e.get("id"): e for e in expenses}.get
+        for rid, category in delta["changes"]:
+            e = lookup(rid)
+            if e is not None:
+                e["category"] = category
+        return None
+    raise ValueError(f"unknown delta op {op!r}")
+
+
+# ---------- Queries ----------
+def expense_matcher(query="", category="All"):
+    """Predicate for the dashboard search box and category filter, or None
+    when nothing is filtered."""
+    q = query.strip().lower()
+    if q == "" and category == "All":
+        return None
+
+    def matches(e):
+        matches_q = q == "" or q in e.get("description", "").lower() or q in e.get("category", "").lower()
+        matches_cat = (category == "All") or (e.get("category", "") == category)
+        return matches_q and matches_cat
+    return matches
+
+
+def filter_expenses(expenses, query="", category="All"):
+    """Newest-first expenses matching a search string and category filter."""
+    matches = expense_matcher(query, category)
+    if matches is None:
+        return expenses[::-1]
+    return [e for e in reversed(expenses) if matches(e)]
+
+
+def month_key(date_str):
+    """"YYYY-MM" of a stored date string, or "" if it doesn't start with one."""
+    if len(date_str) >= 7 and date_str[4] == "-" and date_str[:4].isdigit() and date_str[5:7].isdigit():
+        return date_str[:7]
+    return ""
+
+
+def total_spent(expenses):
+    return sum(e["amount"] for e in expenses)
+
+
+def monthly_totals(expenses):
+    """Map of "YYYY-MM" -> amount; rows without a dated month are skipped."""
+    monthly = defaultdict(float)
+    for e in expenses:
+        key = month_key(e["date"])
+        if key:
+            monthly[key] += e["amount"]
+    return monthly
+
+
+def last_n_months(now, n=12, ahead=0):
+    """Month keys for the ``n`` months ending with ``now``, oldest first,
+    followed by ``ahead`` months after it."""
+    months = []
+    for i in range(n - 1, -ahead - 1, -1):
+        m = (now.month - i - 1) % 12 + 1
+        y = now.year + ((now.month - i - 1) // 12)
+        months.append(f"{y:04d}-{m:02d}")
+    return months
+
+
+def category_totals(expenses):
+    by_cat = defaultdict(float)
+    for e in expenses:
+        by_cat[e["category"]] += e["amount"]
+    return by_cat
+
+
+# ---------- Exports ----------
+def write_report_txt(f, data, generated=None, fx=None, summary=None):
+    """Plain-text report. With ``fx`` (an fx.Converter) totals are in its
+    reporting currency and foreign rows show their own currency. ``summary``
+    is (total, {category: amount}) when already computed, e.g. by
+    precompute.ReportCache."""
+    expenses = data.get("expenses", [])
+    if summary is not None:
+        total, by_cat = summary
+    elif fx is None:
+        total = total_spent(expenses)
+        by_cat = category_totals(expenses)
+    else:
+        total = fx.total(expenses)
+        by_cat = defaultdict(float)
+        for e in expenses:
+            by_cat[e["category"]] += fx.amount(e) or 0.0
+    f.write("EMEKA Expense Report\n")
+    f.write(f"Generated: {generated or datetime.now()}\n\n")
+    f.write(f"Total Spent: {money(total)}\n\n")
+    f.write("By Category:\n")
+    for c, a in sorted(by_cat.items(), key=lambda x: x[1], reverse=True):
+        f.write(f" - {c}: {money(a)}\n")
+    f.write("\nDetails:\n")
+    fmt = money_format()
+    for e in expenses:
+        amount = fmt.money(e["amount"]) if fx is None else fx.label(e, fmt)
+        f.write(f"{e['date']} | {e['category']} | {e['description']} | {amount}\n")
+
+
+def write_csv(f, expenses):
+    writer = csv.writer(f)
+    writer.writerow(CSV_HEADER)
+    for e in expenses:
+        writer.writerow([e["date"], e["category"], e["description"], plain(e["amount"]), e.get("currency", "")])
+
+
+# ---------- Imports ----------
+def parse_amount(text):
+    """Float from user/CSV input: tolerates ₦ or the current currency symbol
+    and thousands separators. Decimal commas are left to MoneyFormat.parse."""
+    return float(str(text).replace(symbol(), "").replace("₦", "").replace(",", "").strip())
+
+
+def read_csv(f, skipped=None):
+    """Yield expenses from a CSV with date/category/description/amount columns.
+
+    The layout written by ``write_csv`` round-trips. A blank category is left
+    blank for the rules engine; a missing date becomes "now" and dates in
+    other common layouts ("31/01/2024") are rewritten as DATE_FORMAT, so
+    month grouping and sorting work on them. An optional currency column
+    (ISO code) is kept on the row; blank means the ledger's own. Rows whose
+    amount can't be parsed are skipped and their line numbers appended to
+    ``skipped`` when a list is given.
+    """
+    now = datetime.now().strftime(DATE_FORMAT)
+    reader = csv.DictReader(f)
+    for row in reader:
+        row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k is not None}
+        try:
+            amount = round(parse_amount(row.get("amount", "")), 2)
+        except ValueError:
+            if skipped is not None:
+                skipped.append(reader.line_num)
+            continue
+        e = {
+            "amount": amount,
+            "category": row.get("category", "").title(),
+            "description": row.get("description", "") or "-",
+            "date": (normalize_date(row["date"]) or row["date"]) if row.get("date") else now,
+        }
+        if row.get("currency"):
+            e["currency"] = row["currency"].upper()
+        yield e
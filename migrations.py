@@ -0,0 +1,399 @@
+#  EMEKA EXPENSE — schema versions and ledger migrations
+#
+# Ledger generations, oldest first:
+#
+#   0  expenses_premium.json (expense_tracker.py, expense_2.0): bare rows
+#      {date, category, description, amount}, no ids
+#   1  expenses_modern.json before versioning: row ids and next_id, plus
+#      rules, recurring templates and currencies as they were added
+#   2  the same with a "schema_version" header as the first key
+#      (ledger.SCHEMA_VERSION; Storage.save writes it)
+#
+# Files without the header are told apart by their content, as
+# consolidate.py does. Each MIGRATIONS entry takes a file one version up;
+# a step that changes rows does it one row at a time.
+#
+# Upgrading streams: the JSON is parsed incrementally with raw_decode over
+# a sliding buffer, one expense at a time, and the output written as the
+# rows come, so memory stays flat however big the ledger is. There are two
+# passes. The first (all --dry-run does) finds the version and the highest
+# row id and counts what would change; the second writes <out>.migrating
+# and renames it over <out> at the end. Every CHECKPOINT_ROWS rows the
+# output is flushed and the position in both files saved to
+# <out>.migrating.state, and an interrupted run picks up from there if the
+# source hasn't changed since.
+#
+#     python migrations.py expenses_premium.json --dry-run
+#     python migrations.py expenses_premium.json -o expenses_modern.json
+#
+# Encrypted ledgers aren't migrated here: none predates version 1, and the
+# app writes the header on its next save. A ledger with a pending journal
+# is refused until the app has replayed and compacted it.
+
+import argparse
+import codecs
+import json
+import os
+import re
+import sys
+from collections import Counter
+
+from encryption import is_encrypted
+from formatting import normalize_date
+from ledger import SCHEMA_VERSION, parse_amount
+
+CHUNK = 1 << 20
+MAX_VALUE = 64 << 20  # one row / top-level value bigger than this is a broken file
+CHECKPOINT_ROWS = 100_000
+
+_WS = re.compile(r"[ \t\n\r]*")
+_STORED_DATE = re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d")
+_MODERN_KEYS = ("next_id", "rules", "recurring", "currency", "fx_rates")
+_encode = json.JSONEncoder(ensure_ascii=False).encode  # json.dumps minus its per-call setup
+
+
+class MigrationError(ValueError):
+    pass
+
+
+# ---------- Streaming parser ----------
+class JSONStream:
+    """Values from a binary JSON file, parsed a buffer at a time. ``offset``
+    is the byte position in the file after the last value read."""
+
+    def __init__(self, f, offset=0, chunk=CHUNK):
+        f.seek(offset)
+        self.f = f
+        self.chunk = chunk
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.base = offset  # byte offset of buf[0]
+        self.eof = False
+
+    def _more(self):
+        block = self.f.read(self.chunk)
+        self.eof = not block
+        self.base += len(self.buf[:self.pos].encode("utf-8"))
+        self.buf = self.buf[self.pos:] + self.text.decode(block, final=self.eof)
+        self.pos = 0
+
+    def offset(self):
+        return self.base + len(self.buf[:self.pos].encode("utf-8"))
+
+    def peek(self):
+        """Next non-whitespace character, without consuming it; "" at the end."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ""
+            self._more()
+
+    def expect(self, chars):
+        c = self.peek()
+        if not c or c not in chars:
+            raise MigrationError(f"expected {' or '.join(map(repr, chars))} at byte {self.offset():,}, "
+                                 f"found {c or 'end of file'!r}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                v, end = self.json.raw_decode(self.buf, self.pos)
+                # a number can run on past the buffer: only trust an end inside it
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return v
+            except json.JSONDecodeError as exc:
+                if self.eof or len(self.buf) - self.pos > MAX_VALUE:
+                    raise MigrationError(f"bad JSON at byte {self.offset():,}: {exc.msg}") from None
+            self._more()
+
+
+def read_ledger(stream, in_rows=False):
+    """Events for a ledger object: ("key", name, value) for each top-level
+    key but "expenses", ("row", expense) for each of its rows. With
+    ``in_rows`` the stream is just after a row (a resume point)."""
+    if not in_rows:
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+    while True:
+        if not in_rows:
+            key = stream.value()
+            stream.expect(":")
+            if key != "expenses":
+                yield "key", key, stream.value()
+            else:
+                stream.expect("[")
+                if stream.peek() != "]":
+                    yield "row", stream.value()
+                in_rows = True
+        if in_rows:
+            while stream.expect(",]") == ",":
+                yield "row", stream.value()
+            in_rows = False
+        if stream.expect(",}") == "}":
+            return
+
+
+# ---------- Migrations ----------
+class Run:
+    """One migration's bookkeeping: ids handed out and what changed."""
+
+    def __init__(self, next_id=1):
+        self.next_id = next_id
+        self.counts = Counter()
+
+    def new_id(self):
+        rid = self.next_id
+        self.next_id += 1
+        return rid
+
+
+def _rows_v1(e, run):
+    d = e.get("date")
+    if not isinstance(d, str) or not _STORED_DATE.fullmatch(d):
+        fixed = normalize_date(d) if isinstance(d, str) else None
+        if fixed is None:
+            run.counts["dates unrecognised (kept as they are)"] += 1
+        else:
+            e["date"] = fixed
+            run.counts["dates rewritten"] += 1
+    amount = e.get("amount")
+    if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+        try:
+            e["amount"] = parse_amount(amount)
+            run.counts["amounts converted to numbers"] += 1
+        except (TypeError, ValueError):
+            run.counts["amounts unreadable (kept as they are)"] += 1
+    for field, default in (("category", "Other"), ("description", "")):
+        if not isinstance(e.get(field), str):
+            e[field] = default
+            run.counts[f"missing {field} filled in"] += 1
+    if not isinstance(e.get("id"), int):
+        e["id"] = run.new_id()
+        run.counts["row ids assigned"] += 1
+    return e
+
+
+# (version it produces, what it does, row function or None)
+MIGRATIONS = [
+    (1, "row ids, dates as DATE_FORMAT, numeric amounts", _rows_v1),
+    (2, "schema_version header", None),
+]
+
+
+def detect_version(keys, has_ids):
+    """Version of a ledger from its top-level ``keys`` and whether any row
+    had an id."""
+    if "schema_version" in keys:
+        return keys["schema_version"]
+    return 1 if has_ids or any(k in keys for k in _MODERN_KEYS) else 0
+
+
+def _steps(version, target):
+    return [m for m in MIGRATIONS if version < m[0] <= target]
+
+
+class Report:
+    def __init__(self, path, target):
+        self.path = path
+        self.target = target
+        self.version = None
+        self.rows = 0
+        self.next_id = 1
+        self.counts = Counter()
+        self.resumed_at = None
+
+    def steps(self):
+        return _steps(self.version, self.target)
+
+    def lines(self):
+        out = [f"{self.path}: version {self.version}, {self.rows:,} expense(s)"]
+        if not self.steps():
+            out.append(f"  already at version {self.version}; nothing to do")
+            return out
+        for version, what, _ in self.steps():
+            out.append(f"  -> {version}: {what}")
+        for what, n in sorted(self.counts.items()):
+            out.append(f"     {n:,} {what}")
+        if self.resumed_at is not None:
+            out.append(f"  resumed after row {self.resumed_at:,}")
+        return out
+
+
+def _check_source(path):
+    if is_encrypted(path):
+        raise MigrationError(f"{path} is encrypted; the app upgrades encrypted ledgers itself")
+    if os.path.exists(path + ".journal"):
+        raise MigrationError(f"{path} has unsaved journal entries; open it in the app once to compact it")
+
+
+def scan(path, target=SCHEMA_VERSION):
+    """First pass: the dry-run Report. Rows are changed in memory and
+    dropped, so the counts are exactly what ``migrate`` would do."""
+    _check_source(path)
+    report = Report(path, target)
+    keys = {}
+    top_id = 0
+    has_ids = False
+    run = Run()
+    with open(path, "rb") as f:
+        for event in read_ledger(JSONStream(f)):
+            if event[0] == "key":
+                keys[event[1]] = event[2]
+                continue
+            e = event[1]
+            report.rows += 1
+            rid = e.get("id")
+            if isinstance(rid, int):
+                has_ids = True
+                top_id = max(top_id, rid)
+            _rows_v1(e, run)
+    report.version = detect_version(keys, has_ids)
+    next_id = keys.get("next_id")
+    report.next_id = max(top_id + 1, next_id if isinstance(next_id, int) else 1)
+    if report.version < 1 <= target:
+        report.counts = run.counts
+        report.next_id += run.counts["row ids assigned"]
+    return report
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _load_state(state_file, path, target):
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("source") != os.path.abspath(path) or state.get("stamp") != _stamp(path) \
+            or state.get("target") != target:
+        return None  # the source changed: start over
+    return state
+
+
+def _save_state(state_file, state):
+    tmp = state_file + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, state_file)
+
+
+def migrate(path, out=None, target=SCHEMA_VERSION, checkpoint_rows=CHECKPOINT_ROWS, progress=None):
+    """Upgrade ledger ``path`` to version ``target``, written to ``out``
+    (default: in place). Returns the Report. ``progress(rows)`` is called at
+    each checkpoint."""
+    out = out or path
+    tmp = out + ".migrating"
+    state_file = tmp + ".state"
+    _check_source(path)
+    if out != path and os.path.exists(out + ".journal"):
+        raise MigrationError(f"{out} has a journal that would be replayed onto the new file; remove it first")
+    state = _load_state(state_file, path, target) if os.path.exists(tmp) else None
+    if state is None:
+        report = scan(path, target)
+        if not report.steps():
+            return report
+        state = {"source": os.path.abspath(path), "stamp": _stamp(path), "target": target,
+                 "version": report.version, "next_id": report.next_id, "counts": dict(report.counts),
+                 "rows": 0, "first_id": report.next_id - report.counts["row ids assigned"],
+                 "in_bytes": None, "out_bytes": 0}
+    else:
+        report = Report(path, target)
+        report.version = state["version"]
+        report.next_id = state["next_id"]
+        report.counts = Counter(state["counts"])
+        report.resumed_at = state["rows"]
+    row_steps = [fn for _, _, fn in _steps(report.version, target) if fn is not None]
+    run = Run(state["first_id"])
+    rows = state["rows"]
+
+    with open(path, "rb") as src, open(tmp, "r+b" if state["in_bytes"] else "wb") as dst:
+        def write(text):
+            dst.write(text.encode("utf-8"))
+
+        if state["in_bytes"]:
+            dst.truncate(state["out_bytes"])
+            dst.seek(state["out_bytes"])
+            stream = JSONStream(src, state["in_bytes"])
+            events = read_ledger(stream, in_rows=True)
+            in_rows = True
+        else:
+            stream = JSONStream(src)
+            events = read_ledger(stream)
+            in_rows = False
+            write("{\n")
+            if target >= 2:
+                write(f'  "schema_version": {target},\n')
+            write(f'  "next_id": {report.next_id}')
+        for event in events:
+            if event[0] == "key":
+                if in_rows:
+                    write("\n  ]")
+                    in_rows = False
+                if event[1] not in ("schema_version", "next_id"):
+                    write(f",\n  {_encode(event[1])}: {_encode(event[2])}")
+                continue
+            if not in_rows:
+                write(',\n  "expenses": [')
+                in_rows = True
+            e = event[1]
+            for fn in row_steps:
+                e = fn(e, run)
+            write(",\n    " if rows else "\n    ")
+            write(_encode(e))
+            rows += 1
+            if rows % checkpoint_rows == 0:
+                dst.flush()
+                os.fsync(dst.fileno())
+                state.update(rows=rows, first_id=run.next_id, in_bytes=stream.offset(), out_bytes=dst.tell())
+                _save_state(state_file, state)
+                if progress is not None:
+                    progress(rows)
+        if in_rows:
+            write("\n  ]")
+        elif not rows:
+            write(',\n  "expenses": []')
+        write("\n}\n")
+    os.replace(tmp, out)
+    try:
+        os.remove(state_file)
+    except OSError:
+        pass
+    report.rows = rows
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upgrade an expense ledger to the current schema version.")
+    parser.add_argument("ledger", help="expenses_premium.json, expenses_modern.json, ...")
+    parser.add_argument("-o", "--output", help="write the upgraded ledger here (default: in place)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change; write nothing")
+    args = parser.parse_args(argv)
+    try:
+        if args.dry_run:
+            report = scan(args.ledger)
+        else:
+            report = migrate(args.ledger, args.output,
+                             progress=lambda n: print(f"  {n:,} rows written", file=sys.stderr))
+    except (OSError, MigrationError) as exc:
+        sys.exit(f"migration failed: {exc}")
+    print("\n".join(report.lines()))
+    if not args.dry_run and report.steps():
+        print(f"written to {args.output or args.ledger}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#  EMEKA EXPENSE — idle-time precomputation
+#
+# Opening Reports used to redraw the chart while the user waited, and
+# "Export Report (.txt)" re-added every row's converted amount per category
+# before writing a line. IdleWorker does that work ahead of time instead:
+# IDLE_MS after the last key press or click, and only while the UI
+# scheduler has nothing queued, it runs the jobs registered with it — here,
+# refreshing the report summary and pre-rendering the hidden Reports page
+# for the current theme — so user actions find the results already warm.
+#
+# ReportCache holds the category summary the text report starts with, per
+# month: raw sums per (category, currency, day), and each month's converted
+# {category: amount}. Adding or removing a row only marks its own month
+# dirty, and the idle pass reconverts just the dirty months on IdleWorker's
+# thread. Each month carries a version; a result computed from an older
+# version is dropped, so rows that change while the thread works are never
+# lost. New rates or a new reporting currency dirty every month, which is
+# still cheap: reconverting is per key, not per row.
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import metrics
+
+IDLE_MS = 400
+POLL_MS = 20
+
+
+def convert_months(jobs, converter):
+    """[(month, version, {category: amount})] for ``ReportCache.pending()``
+    jobs. Reads only the snapshot, so it is safe off the Tk thread."""
+    results = []
+    with metrics.timer("precompute.months"):
+        for month, version, items in jobs:
+            by_cat = defaultdict(float)
+            for (category, currency, day), amount in items:
+                f = converter.factor(currency, day)
+                if f is not None:
+                    by_cat[category] += amount * f
+            results.append((month, version, dict(by_cat)))
+    return results
+
+
+class ReportCache:
+    """Per-month category totals in the reporting currency, maintained
+    incrementally. Built with ``build_steps`` like FxTotals; ``summary()``
+    serves the report once ``ready``."""
+
+    def __init__(self, converter):
+        self.converter = converter
+        self.ready = False
+        self._restart = False
+        self.sums = {}  # month -> {(category, currency, day): [amount, rows]}
+        self.summaries = {}  # month -> {category: converted amount}
+        self.versions = defaultdict(int)
+        self.dirty = set()
+
+    def _count(self, e, sign):
+        currency, day = self.converter.key(e)
+        month = day[:7]
+        keys = self.sums.get(month)
+        if keys is None:
+            keys = self.sums[month] = {}
+        key = (e["category"], currency, day)
+        s = keys.get(key)
+        if s is None:
+            s = keys[key] = [0.0, 0]
+        s[0] += sign * e["amount"]
+        s[1] += sign
+        if not s[1]:
+            del keys[key]  # no float residue left behind for a category that's gone
+        return month
+
+    def _touch(self, month):
+        self.versions[month] += 1
+        self.dirty.add(month)
+
+    def build_steps(self, expenses, chunk=5000):
+        while True:
+            self.sums = {}
+            self._restart = False
+            i = 0
+            while i < len(expenses) and not self._restart:
+                for e in expenses[i:i + chunk]:
+                    self._count(e, 1)
+                i += chunk
+                yield
+            if not self._restart:
+                break
+        self.summaries.clear()
+        for month in self.sums:
+            self._touch(month)
+        self.ready = True
+
+    def add(self, e):
+        if self.ready:
+            self._touch(self._count(e, 1))
+
+    def remove(self, e):
+        if not self.ready:
+            self._restart = True  # the build may already have counted it
+            return
+        self._touch(self._count(e, -1))
+
+    def rebase(self, converter):
+        """Switch rates or reporting currency: every month reconverts."""
+        self.converter = converter
+        if self.ready:
+            for month in self.sums:
+                self._touch(month)
+
+    # ---------- Refreshing ----------
+    def pending(self):
+        """Snapshot of the dirty months for ``convert_months``."""
+        return [(m, self.versions[m], [(k, s[0]) for k, s in self.sums.get(m, {}).items()])
+                for m in self.dirty]
+
+    def store(self, results):
+        for month, version, by_cat in results:
+            if self.versions[month] == version:
+                self.summaries[month] = by_cat
+                self.dirty.discard(month)
+
+    def refresh(self):
+        """Bring the dirty months up to date now, on this thread."""
+        if self.dirty:
+            self.store(convert_months(self.pending(), self.converter))
+
+    def summary(self):
+        """(total, {category: amount}) over the whole ledger, as
+        ``write_report_txt`` computes it."""
+        self.refresh()
+        by_cat = defaultdict(float)
+        for cats in self.summaries.values():
+            for c, a in cats.items():
+                by_cat[c] += a
+        return sum(by_cat.values()), by_cat
+
+
+class IdleWorker:
+    """Runs ``jobs`` once the user has been idle for ``idle_ms`` and
+    ``busy()`` is false. A job returns True if it did something (the next
+    one waits for another idle moment) and may hand slow, Tk-free work to
+    ``submit``. Call ``poke`` when there is new work."""
+
+    def __init__(self, root, idle_ms=IDLE_MS, busy=None):
+        self.root = root
+        self.idle_ms = idle_ms
+        self.busy = busy or (lambda: False)
+        self.jobs = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="precompute")
+        self._job = None
+        self._running = 0
+        # any input restarts the idle clock
+        root.bind_all("<KeyPress>", self.poke, add="+")
+        root.bind_all("<ButtonPress>", self.poke, add="+")
+
+    def poke(self, event=None):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+        self._job = self.root.after(self.idle_ms, self._idle)
+
+    def _idle(self):
+        self._job = None
+        if self._running or self.busy():
+            self._job = self.root.after(self.idle_ms, self._idle)
+            return
+        for job in self.jobs:
+            if job():
+                self._job = self.root.after_idle(self._idle)
+                return
+
+    def submit(self, fn, on_done):
+        """Run ``fn()`` on the worker thread, then ``on_done(result)`` on the
+        Tk thread. An exception in ``fn`` is raised from ``on_done``'s place,
+        where Tk reports it."""
+        self._running += 1
+        future = self._executor.submit(fn)
+
+        def poll():
+            if not future.done():
+                self.root.after(POLL_MS, poll)
+                return
+            self._running -= 1
+            if self._job is None:
+                self._job = self.root.after_idle(self._idle)
+            on_done(future.result())
+
+        self.root.after(POLL_MS, poll)
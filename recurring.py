@@ -0,0 +1,176 @@
+#  EMEKA EXPENSE — recurring expenses
+#
+# Templates live in the data file under "recurring" (next to "budget"):
+#
+#     {"id": 12, "description": "Rent", "category": "Bills", "amount": 250000.0,
+#      "rule": "monthly", "start": "2024-01-01 09:00:00", "next": "2024-03-01 09:00:00"}
+#
+# "rule" is daily, weekly, monthly, yearly or a five-field cron expression
+# ("minute hour day-of-month month day-of-week", e.g. "0 9 1,15 * *").
+# "next" is the first occurrence not yet written to the ledger. ``due``
+# turns every occurrence up to now into rows and moves "next" past them;
+# the caller stores both in one commit, so a restart never generates an
+# occurrence twice. Occurrences after now are never stored: ``project``
+# yields them on demand for the reports.
+
+import calendar
+from datetime import datetime, timedelta
+
+from ledger import DATE_FORMAT
+
+RULES = ("daily", "weekly", "monthly", "yearly")
+MAX_BATCH = 10000  # per template, in case "start" is years back on a daily rule
+_CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+_CRON_HORIZON = 366 * 5  # days searched for the next cron match
+
+
+def _cron_field(text, lo, hi):
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError("cron step must be positive")
+        if part in ("*", ""):
+            first, last = lo, hi
+        elif "-" in part:
+            a, b = part.split("-", 1)
+            first, last = int(a), int(b)
+        else:
+            first = int(part)
+            last = hi if step > 1 else first
+        if not lo <= first <= last <= hi:
+            raise ValueError(f"cron value {part!r} outside {lo}-{hi}")
+        values.update(range(first, last + 1, step))
+    return sorted(values)
+
+
+def parse_cron(text):
+    """Five cron fields -> (minutes, hours, days, months, weekdays, dom_any, dow_any).
+
+    Weekdays use cron numbering (0 = Sunday; 7 is accepted for Sunday too).
+    """
+    fields = text.split()
+    if len(fields) != 5:
+        raise ValueError("cron rules need five fields: minute hour day month weekday")
+    fields[4] = ",".join("0" if f == "7" else f for f in fields[4].split(","))
+    try:
+        parsed = [_cron_field(f, lo, hi) for f, (lo, hi) in zip(fields, _CRON_RANGES)]
+    except ValueError as exc:
+        raise ValueError(f"bad cron rule {text!r}: {exc}")
+    return (*parsed, fields[2] == "*", fields[4] == "*")
+
+
+def normalize_rule(text):
+    """Validated rule string; raises ValueError for anything unusable."""
+    rule = " ".join(text.strip().lower().split())
+    if rule in RULES:
+        return rule
+    parse_cron(rule)
+    return rule
+
+
+def _add_months(dt, months, day):
+    month = dt.month - 1 + months
+    year = dt.year + month // 12
+    month = month % 12 + 1
+    return dt.replace(year=year, month=month, day=min(day, calendar.monthrange(year, month)[1]))
+
+
+def _cron_after(cron, after):
+    minutes, hours, days, months, weekdays, dom_any, dow_any = cron
+    day = after.replace(hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(_CRON_HORIZON):
+        if day.month in months:
+            dom_ok = day.day in days
+            dow_ok = (day.isoweekday() % 7) in weekdays
+            # cron: when both day fields are restricted, either may match
+            if (dom_ok and dow_ok) if (dom_any or dow_any) else (dom_ok or dow_ok):
+                for h in hours:
+                    for m in minutes:
+                        t = day.replace(hour=h, minute=m)
+                        if t > after:
+                            return t
+        day += timedelta(days=1)
+    return None
+
+
+def next_occurrence(template, after):
+    """First occurrence strictly after ``after``, or None (cron that never fires)."""
+    start = datetime.strptime(template["start"], DATE_FORMAT)
+    if after < start:
+        after = start - timedelta(seconds=1)
+    rule = template["rule"]
+    if rule not in RULES:
+        return _cron_after(parse_cron(rule), after)
+    # jump close to ``after`` arithmetically, then step past it
+    if rule in ("daily", "weekly"):
+        days = 1 if rule == "daily" else 7
+        k = (after - start).days // days
+        t = start + timedelta(days=k * days)
+        while t <= after:
+            k += 1
+            t = start + timedelta(days=k * days)
+        return t
+    months = 12 if rule == "yearly" else 1
+    k = ((after.year - start.year) * 12 + after.month - start.month) // months
+    # always count from start so a 31st keeps landing on month ends
+    t = _add_months(start, k * months, start.day)
+    while t <= after:
+        k += 1
+        t = _add_months(start, k * months, start.day)
+    return t
+
+
+def new_template(tid, description, category, amount, rule, start):
+    template = {"id": tid, "description": description, "category": category, "amount": round(float(amount), 2),
+                "rule": normalize_rule(rule), "start": start.strftime(DATE_FORMAT)}
+    first = next_occurrence(template, start - timedelta(seconds=1))
+    template["next"] = first.strftime(DATE_FORMAT) if first else None
+    return template
+
+
+def _occurrences(template, until, limit):
+    nxt = template.get("next")
+    t = datetime.strptime(nxt, DATE_FORMAT) if nxt else None
+    while t is not None and t <= until and limit:
+        yield t
+        limit -= 1
+        t = next_occurrence(template, t)
+
+
+def _row(template, when):
+    return {"amount": template["amount"], "category": template.get("category", ""),
+            "description": template["description"], "date": when.strftime(DATE_FORMAT),
+            "recurring": template["id"]}
+
+
+def due(templates, now):
+    """(rows, templates) with every occurrence up to ``now`` materialized.
+
+    Returns new template dicts with "next" advanced; ``templates`` itself is
+    left untouched so the old list can serve as the undo value. Rows have no
+    "id" yet.
+    """
+    rows, updated = [], []
+    for tpl in templates:
+        when = None
+        for when in _occurrences(tpl, now, MAX_BATCH):
+            rows.append(_row(tpl, when))
+        if when is None:
+            updated.append(tpl)
+            continue
+        nxt = next_occurrence(tpl, when)
+        updated.append(dict(tpl, next=nxt.strftime(DATE_FORMAT) if nxt else None))
+    rows.sort(key=lambda e: e["date"])
+    return rows, updated
+
+
+def project(templates, now, until):
+    """Occurrences after ``now`` up to ``until`` as (not stored) rows."""
+    for tpl in templates:
+        for when in _occurrences(tpl, until, MAX_BATCH):
+            if when > now:
+                yield _row(tpl, when)
@@ -0,0 +1,194 @@
+#  EMEKA EXPENSE — categorization rules
+#
+# Assigns a category from the description and amount. Rules live in the
+# data file under "rules" (next to "budget") and are tried in list order;
+# the first rule whose keywords/pattern match and whose amount range holds
+# wins:
+#
+#     {"category": "Transport", "keywords": ["uber", "bolt"],
+#      "pattern": null, "min_amount": null, "max_amount": 20000}
+#
+# All keywords of all rules are compiled into a single trie-shaped regex and
+# the patterns into one alternation, so a description is scanned once no
+# matter how many rules exist. Patterns that can't share an alternation
+# (groups, whose numbers and names would clash; global flags like "(?i)"
+# anywhere but the start) are searched one by one instead. Candidate rules per description are cached,
+# which makes re-running the rules over a large ledger with repeated
+# merchants mostly dictionary lookups.
+
+import re
+from functools import lru_cache
+
+DEFAULT_RULES = [
+    {"category": "Transport", "keywords": ["uber", "bolt", "taxi", "danfo", "keke", "okada", "brt", "fuel",
+                                           "petrol", "parking", "bus fare", "flight"]},
+    {"category": "Bills", "keywords": ["electric", "nepa", "dstv", "gotv", "airtime", "data", "water bill",
+                                       "internet", "rent", "subscription"]},
+    {"category": "Food", "keywords": ["shoprite", "restaurant", "chicken republic", "kilimanjaro", "bukka",
+                                      "mama put", "suya", "groceries", "pizza", "bread", "lunch", "dinner"]},
+    {"category": "Health", "keywords": ["pharmacy", "clinic", "hospital", "lab test", "hmo", "gym", "drugs"]},
+    {"category": "Entertainment", "keywords": ["netflix", "spotify", "cinema", "filmhouse", "concert", "bar",
+                                               "game"]},
+    {"category": "Shopping", "keywords": ["jumia", "konga", "market", "shoes", "clothes", "mall"]},
+]
+
+
+def _trie_pattern(words):
+    """Regex for ``words`` with shared prefixes factored out (``ab(?:c|d)``).
+
+    Alternations of literals backtrack across every branch; the trie form
+    lets the regex engine discard most branches after the first character.
+    """
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # a word ending here makes the rest optional; greedy, so the longest keyword wins
+        return "(?:" + body + ")?" if "" in node else body
+    return build(trie)
+
+
+class RulesEngine:
+    def __init__(self, rules=None, cache_size=65536):
+        self.cache_size = cache_size
+        self.compile(DEFAULT_RULES if rules is None else rules)
+
+    def compile(self, rules):
+        self.rules = [dict(r) for r in rules if r.get("category")]
+        keyword_rules = {}
+        patterns = []
+        self._amount_only = []
+        for i, r in enumerate(self.rules):
+            keywords = [k.strip().lower() for k in r.get("keywords") or [] if k.strip()]
+            for k in keywords:
+                keyword_rules.setdefault(k, []).append(i)
+            if r.get("pattern"):
+                patterns.append((i, re.compile(r["pattern"], re.IGNORECASE)))
+            if not keywords and not r.get("pattern"):
+                self._amount_only.append(i)
+        self._keyword_rules = keyword_rules
+        self._keyword_re = None
+        if keyword_rules:
+            # whole words only, so "bar" doesn't fire on "barber"
+            self._keyword_re = re.compile(r"(?<!\w)" + _trie_pattern(keyword_rules) + r"(?!\w)")
+        self._patterns = [(i, p) for i, p in patterns if not p.groups]
+        self._separate = [(i, p) for i, p in patterns if p.groups]
+        self._pattern_re = None
+        if self._patterns:
+            try:
+                self._pattern_re = re.compile("|".join(f"(?:{p.pattern})" for _, p in self._patterns),
+                                              re.IGNORECASE)
+            except re.error:
+                self._separate, self._patterns = patterns, []
+        self._candidates = lru_cache(maxsize=self.cache_size)(self._match_description)
+        self._source = [dict(r) for r in rules]
+
+    def ensure(self, rules):
+        """Recompile only if ``rules`` differ from what is compiled."""
+        rules = DEFAULT_RULES if rules is None else rules
+        if rules != self._source:
+            self.compile(rules)
+
+    def _match_description(self, description):
+        text = description.lower()
+        hits = set()
+        if self._keyword_re is not None:
+            for m in self._keyword_re.finditer(text):
+                hits.update(self._keyword_rules[m.group(0)])
+        if self._pattern_re is not None and self._pattern_re.search(description):
+            # the merged regex only says "some pattern matched"; resolve which
+            hits.update(i for i, p in self._patterns if p.search(description))
+        hits.update(i for i, p in self._separate if p.search(description))
+        hits.update(self._amount_only)
+        return tuple(sorted(hits))
+
+    def categorize(self, description, amount=None, default=None):
+        for i in self._candidates(description or ""):
+            r = self.rules[i]
+            lo, hi = r.get("min_amount"), r.get("max_amount")
+            if amount is not None and ((lo is not None and amount < lo) or (hi is not None and amount > hi)):
+                continue
+            if amount is None and (lo is not None or hi is not None):
+                continue
+            return r["category"]
+        return default
+
+    def changes(self, expenses, overwrite=False):
+        """(row, new category) for every row the rules would change.
+
+        Without ``overwrite`` only rows with no category (or "Other") are
+        considered, so categories picked by hand survive a re-run.
+        """
+        out = []
+        for e in expenses:
+            if not overwrite and e.get("category") not in (None, "", "Other"):
+                continue
+            cat = self.categorize(e.get("description", ""), e.get("amount"))
+            if cat and cat != e.get("category"):
+                out.append((e, cat))
+        return out
+
+    def apply(self, expenses, overwrite=False):
+        """Categorize ``expenses`` in place; returns the number of rows changed."""
+        changes = self.changes(expenses, overwrite)
+        for e, cat in changes:
+            e["category"] = cat
+        return len(changes)
+
+    def cache_info(self):
+        return self._candidates.cache_info()
+
+
+# ---------- Text form (Settings page editor) ----------
+# One rule per line:  Category: keyword, keyword, re:<regex>, amount:<min>-<max>
+def parse_rules_text(text):
+    rules = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if ":" not in line:
+            raise ValueError(f"Line {lineno}: expected 'Category: keywords…'")
+        category, rest = line.split(":", 1)
+        rule = {"category": category.strip().title(), "keywords": []}
+        for part in (p.strip() for p in rest.split(",")):
+            if not part:
+                continue
+            if part.startswith("re:"):
+                try:
+                    re.compile(part[3:])
+                except re.error as exc:
+                    raise ValueError(f"Line {lineno}: bad pattern {part[3:]!r} ({exc})")
+                rule["pattern"] = part[3:]
+            elif part.startswith("amount:"):
+                lo, _, hi = part[7:].partition("-")
+                try:
+                    rule["min_amount"] = float(lo.replace(",", "")) if lo.strip() else None
+                    rule["max_amount"] = float(hi.replace(",", "")) if hi.strip() else None
+                except ValueError:
+                    raise ValueError(f"Line {lineno}: amount range must look like amount:1000-5000")
+            else:
+                rule["keywords"].append(part.lower())
+        rules.append(rule)
+    return rules
+
+
+def format_rules_text(rules):
+    lines = []
+    for r in rules:
+        parts = list(r.get("keywords") or [])
+        if r.get("pattern"):
+            parts.append("re:" + r["pattern"])
+        lo, hi = r.get("min_amount"), r.get("max_amount")
+        if lo is not None or hi is not None:
+            parts.append(f"amount:{'' if lo is None else f'{lo:g}'}-{'' if hi is None else f'{hi:g}'}")
+        lines.append(f"{r['category']}: {', '.join(parts)}")
+    return "\n".join(lines)
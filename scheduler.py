@@ -0,0 +1,127 @@
+#  EMEKA EXPENSE — cooperative UI task scheduler
+#
+# Long UI work (refreshing pages over big ledgers, re-theming every widget)
+# is written as generators that ``yield`` between small steps. The scheduler
+# runs steps from the highest-priority task until its time slice is used up,
+# then hands control back to Tk with ``after()`` so keystrokes and clicks are
+# processed between slices. Submitting a task under a key that is already
+# queued cancels the older one: a refresh superseded by newer input never
+# finishes wasted work.
+#
+#     scheduler.submit("ui.refresh_dashboard", self._dashboard_steps(), PRIORITY_VISIBLE)
+
+import heapq
+import itertools
+import time
+
+from instrumentation import metrics
+
+PRIORITY_INPUT = 0       # direct response to the user (theme toggle, typing)
+PRIORITY_VISIBLE = 1     # the page on screen
+PRIORITY_BACKGROUND = 2  # hidden pages, housekeeping
+
+
+class Task:
+    __slots__ = ("key", "steps", "priority", "seq", "submitted", "busy", "cancelled", "on_done")
+
+    def __init__(self, key, steps, priority, seq, on_done=None):
+        self.key = key
+        self.steps = steps
+        self.priority = priority
+        self.seq = seq
+        self.submitted = time.perf_counter()
+        self.busy = 0.0
+        self.cancelled = False
+        self.on_done = on_done
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class TaskScheduler:
+    def __init__(self, root, slice_ms=8, gap_ms=1):
+        self.root = root
+        self.slice = slice_ms / 1000
+        self.gap_ms = gap_ms
+        self._heap = []
+        self._tasks = {}
+        self._seq = itertools.count()
+        self._job = None
+
+    def submit(self, key, steps, priority=PRIORITY_VISIBLE, on_done=None):
+        """Queue a generator under ``key``, cancelling any queued task with that key."""
+        self.cancel(key)
+        task = Task(key, steps, priority, next(self._seq), on_done)
+        self._tasks[key] = task
+        heapq.heappush(self._heap, task)
+        self._wake()
+        return task
+
+    def cancel(self, key):
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancelled = True
+            task.steps.close()
+            metrics.count("scheduler.cancelled")
+
+    def pending(self, key=None):
+        return key in self._tasks if key is not None else bool(self._tasks)
+
+    def run_now(self, key):
+        """Finish a queued task synchronously (e.g. before reading its results)."""
+        task = self._tasks.get(key)
+        while task is not None and not task.cancelled and self._step(task):
+            pass
+
+    def _wake(self):
+        if self._job is None:
+            self._job = self.root.after(self.gap_ms, self._run)
+
+    def _run(self):
+        self._job = None
+        deadline = time.perf_counter() + self.slice
+        t0 = time.perf_counter()
+        try:
+            while self._heap and time.perf_counter() < deadline:
+                task = self._heap[0]
+                if task.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+                if not self._step(task) and self._heap and self._heap[0] is task:
+                    heapq.heappop(self._heap)
+                # else on_done queued something ahead of it; a finished task
+                # is cancelled, so it is dropped when it surfaces again
+        finally:
+            metrics.record("scheduler.slice", time.perf_counter() - t0)
+            if self._heap:
+                self._wake()
+
+    def _step(self, task):
+        """Advance ``task`` by one step; False once it is finished."""
+        metrics.enter(task.key)
+        t0 = time.perf_counter()
+        try:
+            next(task.steps)
+            done = False
+        except StopIteration:
+            done = True
+        except Exception:
+            # drop the broken task and let Tk report the error; _run's
+            # finally keeps the rest of the queue moving
+            self._finish(task)
+            raise
+        finally:
+            task.busy += time.perf_counter() - t0
+            metrics.exit()
+        if done:
+            self._finish(task)
+        return not done
+
+    def _finish(self, task):
+        if self._tasks.get(task.key) is task:
+            del self._tasks[task.key]
+        task.cancelled = True
+        metrics.record(task.key, task.busy)
+        metrics.record(task.key + ".latency", time.perf_counter() - task.submitted, task.submitted)
+        if task.on_done is not None:
+            task.on_done()
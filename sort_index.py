@@ -0,0 +1,67 @@
+#  EMEKA EXPENSE — per-column sort indexes for the dashboard
+#
+# For each sortable column a list of (key, id) pairs is kept in sorted order
+# with bisect. Adding, removing or editing an expense moves one entry per
+# built column (O(log n) search plus a memmove), and reading a page of k rows
+# in either direction is a slice: O(log n + k) instead of sorting the ledger
+# on every click. Columns are built lazily the first time they're sorted on,
+# so an unused column costs nothing.
+
+from bisect import bisect_left, insort
+
+COLUMN_KEYS = {
+    "date": lambda e: e.get("date", ""),
+    "category": lambda e: e.get("category", "").casefold(),
+    "description": lambda e: e.get("description", "").casefold(),
+    "amount": lambda e: e.get("amount", 0.0),
+}
+
+
+class SortIndex:
+    def __init__(self, columns=COLUMN_KEYS):
+        self.columns = columns
+        self._expenses = []
+        self._sorted = {}  # column -> [(key, id), ...] for built columns
+
+    def rebuild(self, expenses):
+        """Drop every column; they rebuild lazily from ``expenses``."""
+        self._expenses = expenses
+        self._sorted.clear()
+
+    def _column(self, column):
+        entries = self._sorted.get(column)
+        if entries is None:
+            key = self.columns[column]
+            entries = sorted((key(e), e["id"]) for e in self._expenses)
+            self._sorted[column] = entries
+        return entries
+
+    # ---- mutation ----
+    def add(self, e):
+        for column, entries in self._sorted.items():
+            insort(entries, (self.columns[column](e), e["id"]))
+
+    def remove(self, e):
+        for column, entries in self._sorted.items():
+            item = (self.columns[column](e), e["id"])
+            i = bisect_left(entries, item)
+            if i < len(entries) and entries[i] == item:
+                del entries[i]
+
+    # ---- reading ----
+    def ids(self, column, descending=False, start=0, stop=None):
+        """Row ids ordered by ``column``, sliced to ``[start:stop]``."""
+        entries = self._column(column)
+        n = len(entries)
+        stop = n if stop is None else min(stop, n)
+        if descending:
+            return [entries[n - 1 - i][1] for i in range(start, stop)]
+        return [entries[i][1] for i in range(start, stop)]
+
+    def iter_ids(self, column, descending=False):
+        entries = self._column(column)
+        it = reversed(entries) if descending else iter(entries)
+        return (rid for _, rid in it)
+
+    def top(self, column, k, descending=True):
+        return self.ids(column, descending, 0, k)
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+
+from api_server import HTTPError, LedgerService, route
+from ledger import Storage
+
+
+def _post(service, body):
+    async def go():
+        writer = asyncio.create_task(service.writer())
+        try:
+            return await route(service, "POST", "/expenses", {}, json.dumps(body).encode())
+        finally:
+            writer.cancel()
+    return asyncio.run(go())
+
+
+def _summary(service):
+    return asyncio.run(route(service, "GET", "/summary", {}, b""))[1]
+
+
+def _on_disk(service):
+    return Storage(service.storage.filename, create=False).load()["expenses"]
+
+
+@pytest.fixture
+def service(tmp_path):
+    return LedgerService(Storage(str(tmp_path / "ledger.json")))
+
+
+def test_post_is_committed(service):
+    status, row, _ = _post(service, {"amount": "12.50", "category": "food", "date": "2024-03-05"})
+    assert status == 201 and row["category"] == "Food"
+    assert _on_disk(service) == service.data["expenses"] == [row]
+    assert _summary(service) == {"total": 12.5, "budget": 0.0, "count": 1, "currency": "NGN", "no_rate": 0}
+
+
+def test_failed_commit_leaves_memory_matching_the_file(service, monkeypatch):
+    _post(service, {"amount": 5, "category": "Food", "date": "2024-03-05"})
+
+    def broken(data, deltas):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(service.storage, "commit", broken)
+    with pytest.raises(OSError):
+        _post(service, [{"amount": 7, "category": "Rent", "date": "2024-04-01"},
+                        {"amount": 3, "category": "Food", "date": "2024-04-02"}])
+    assert service.data["expenses"] == _on_disk(service)
+    assert len(service.by_id) == 1
+    assert _summary(service)["total"] == 5.0 and _summary(service)["count"] == 1
+    assert dict(service.by_category) == {"Food": 5.0}
+    assert dict(service.monthly) == {"2024-03": 5.0}
+
+    monkeypatch.undo()
+    _post(service, {"amount": 1, "category": "Food", "date": "2024-04-03"})
+    assert service.data["expenses"] == _on_disk(service)
+    assert _summary(service)["total"] == 6.0
+
+
+def test_foreign_rows_are_converted(tmp_path):
+    storage = Storage(str(tmp_path / "ledger.json"))
+    storage.save({"expenses": [], "budget": 0.0, "base_currency": "NGN", "reporting_currency": "USD",
+                  "fx_rates": {"base": "NGN", "rates": {"USD": {"2024-01-01": 1500.0}}}})
+    service = LedgerService(storage)
+    _, rows, _ = _post(service, [{"amount": 3000, "category": "Food", "date": "2024-03-05"},
+                                 {"amount": 10, "currency": "usd", "category": "Food", "date": "2024-03-06"},
+                                 {"amount": 4, "currency": "EUR", "category": "Food", "date": "2024-03-07"}])
+    assert [r.get("currency") for r in rows] == [None, "USD", "EUR"]
+    summary = _summary(service)
+    assert (summary["total"], summary["currency"], summary["no_rate"]) == (12.0, "USD", 1)
+    assert dict(service.by_category) == {"Food": 12.0}
+
+    with pytest.raises(HTTPError):
+        _post(service, {"amount": 1, "currency": "dollars"})
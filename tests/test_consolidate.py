@@ -0,0 +1,40 @@
+import io
+
+from consolidate import ledger_partial, merge, write_consolidated_txt
+from ledger import Storage
+
+RATES = {"base": "NGN", "rates": {"USD": {"2024-01-01": 1500.0}}}
+
+
+def _ledger(path, **data):
+    Storage(str(path)).save({"expenses": [], "budget": 0.0, **data})
+    return str(path)
+
+
+def test_each_ledger_converts_into_one_currency(tmp_path):
+    naira = _ledger(tmp_path / "a.json", budget=30000.0, fx_rates=RATES, expenses=[
+        {"id": 1, "amount": 1500.0, "category": "Food", "description": "", "date": "2024-03-05 10:00:00"},
+        {"id": 2, "amount": 2.0, "currency": "USD", "category": "Food", "description": "",
+         "date": "2024-03-06 10:00:00"},
+        {"id": 3, "amount": 9.0, "currency": "GBP", "category": "Food", "description": "",
+         "date": "2024-03-07 10:00:00"}])
+    dollars = _ledger(tmp_path / "b.json", base_currency="USD", budget=100.0, expenses=[
+        {"id": 1, "amount": 5.0, "category": "Rent", "description": "", "date": "2024-04-01 10:00:00"}])
+
+    combined = merge([ledger_partial(p, "USD") for p in (naira, dollars)], "USD")
+    assert combined["total"] == 1.0 + 2.0 + 5.0
+    assert dict(combined["monthly"]) == {"2024-03": 3.0, "2024-04": 5.0}
+    assert dict(combined["categories"]) == {"Food": 3.0, "Rent": 5.0}
+    assert combined["budget"] == 20.0 + 100.0
+    assert combined["ledgers"][0]["missing"] == {"GBP": 1}
+
+    out = io.StringIO()
+    write_consolidated_txt(out, combined, generated="now")
+    assert "Amounts in USD" in out.getvalue()
+    assert "excl. 1 GBP row(s): no rate" in out.getvalue()
+
+
+def test_no_rate_into_the_report_currency(tmp_path):
+    part = ledger_partial(_ledger(tmp_path / "a.json", budget=10.0, expenses=[
+        {"id": 1, "amount": 10.0, "category": "Food", "description": "", "date": "2024-03-05 10:00:00"}]), "EUR")
+    assert part["total"] == 0.0 and part["missing"] == {"NGN": 1} and part["budget"] is None
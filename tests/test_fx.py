@@ -0,0 +1,44 @@
+from formatting import MoneyFormat
+from fx import Converter, FxTotals, RateTable, base_currency, reporting_currency
+
+RATES = {"base": "NGN", "rates": {"USD": {"2024-05-01": 1500.0}, "EUR": {"2024-05-01": 1600.0}}}
+ROWS = [
+    {"amount": 3000.0, "category": "Food", "date": "2024-05-02 10:00:00"},
+    {"amount": 10.0, "category": "Travel", "date": "2024-05-03 10:00:00", "currency": "USD"},
+]
+
+
+def test_legacy_ledgers_are_in_naira_whatever_the_locale():
+    data = {"expenses": ROWS, "fx_rates": RATES, "currency": {"locale": "en_US", "symbol": "$"}}
+    assert base_currency(data) == reporting_currency(data) == "NGN"
+    assert Converter.for_ledger(data).total(ROWS) == 3000.0 + 15000.0
+
+
+def test_rows_without_a_currency_convert_from_the_base():
+    data = {"expenses": ROWS, "fx_rates": RATES, "base_currency": "NGN", "reporting_currency": "USD"}
+    fx = Converter.for_ledger(data)
+    assert fx.total(ROWS) == 2.0 + 10.0
+    assert fx.monthly(ROWS) == {"2024-05": 12.0}
+    assert fx.amount(ROWS[0]) == 2.0
+
+    totals = FxTotals(fx)
+    for _ in totals.build_steps(ROWS):
+        pass
+    assert totals.total == 12.0
+    totals.rebase(Converter.for_ledger(data, "EUR"))
+    assert totals.total == 3000.0 / 1600 + 15000.0 / 1600
+
+
+def test_missing_rate_leaves_the_row_out():
+    fx = Converter(RateTable("NGN"), "USD", "NGN")
+    assert fx.amount(ROWS[0]) is None
+    assert fx.total(ROWS) == 10.0
+
+
+def test_labels_use_the_locale_layout_with_the_code():
+    fmt = MoneyFormat("de_DE", "€")
+    fx = Converter(RateTable("NGN"), "EUR", "NGN")
+    assert fx.label({"amount": 1234.5, "currency": "EUR"}, fmt) == "1.234,50 €"
+    assert fx.label({"amount": 1234.5, "currency": "USD"}, fmt) == "1.234,50 USD"
+    assert fx.label({"amount": 1234.5}, fmt) == "1.234,50 NGN"
+    assert fx.label({"amount": -5}, MoneyFormat("en_US", "$")) == "-NGN 5.00"
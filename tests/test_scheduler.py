@@ -0,0 +1,72 @@
+from scheduler import PRIORITY_BACKGROUND, PRIORITY_INPUT, PRIORITY_VISIBLE, TaskScheduler
+
+
+class FakeRoot:
+    """Just enough of Tk's timer API: callbacks run when ``drain`` says so."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def after(self, ms, fn):
+        self.jobs.append(fn)
+        return fn
+
+    def after_cancel(self, job):
+        self.jobs.remove(job)
+
+    def drain(self, limit=1000):
+        while self.jobs and limit:
+            self.jobs.pop(0)()
+            limit -= 1
+
+
+def _steps(log, name, n=2):
+    for i in range(n):
+        log.append((name, i))
+        yield
+
+
+def test_tasks_run_by_priority():
+    root, log = FakeRoot(), []
+    sched = TaskScheduler(root)
+    sched.submit("bg", _steps(log, "bg"), PRIORITY_BACKGROUND)
+    sched.submit("input", _steps(log, "input"), PRIORITY_INPUT)
+    sched.submit("visible", _steps(log, "visible"), PRIORITY_VISIBLE)
+    root.drain()
+    assert [name for name, _ in log] == ["input", "input", "visible", "visible", "bg", "bg"]
+    assert not sched.pending()
+
+
+def test_resubmitting_a_key_cancels_the_queued_task():
+    root, log = FakeRoot(), []
+    sched = TaskScheduler(root)
+    sched.submit("refresh", _steps(log, "old"))
+    sched.submit("refresh", _steps(log, "new"))
+    root.drain()
+    assert [name for name, _ in log] == ["new", "new"]
+
+
+def test_on_done_may_submit_a_task_that_runs_first():
+    root, log = FakeRoot(), []
+    sched = TaskScheduler(root)
+
+    def follow_up():
+        sched.submit("follow_up", _steps(log, "follow_up"), PRIORITY_INPUT)
+
+    sched.submit("first", _steps(log, "first"), PRIORITY_BACKGROUND, on_done=follow_up)
+    root.drain()
+    assert [name for name, _ in log] == ["first", "first", "follow_up", "follow_up"]
+    assert not sched.pending()
+    assert not sched._heap
+
+
+def test_run_now_finishes_a_task_synchronously():
+    root, log = FakeRoot(), []
+    sched = TaskScheduler(root)
+    done = []
+    sched.submit("report", _steps(log, "report", 3), on_done=lambda: done.append(True))
+    sched.run_now("report")
+    assert len(log) == 3 and done == [True]
+    assert not sched.pending()
+    root.drain()
+    assert len(log) == 3
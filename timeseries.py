@@ -0,0 +1,124 @@
+#  EMEKA EXPENSE — long-history spending timeline
+#
+# Daily totals are rolled up once into dense day / week / month levels
+# (zero-filled; ten years is ~3,650 daily points), each point being the
+# average spend per day over its bucket so the y scale doesn't jump when
+# the level changes. A view of an x-range picks the finest level that has
+# at most 2x the plot's pixel width of points in range, then downsamples
+# that to the pixel width with LTTB (Largest-Triangle-Three-Buckets,
+# Steinarsson 2013), which keeps the peaks a plain stride would drop.
+# Whatever the history length or zoom, about ``width`` points get drawn.
+
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+LEVELS = ("day", "week", "month")
+
+
+def lttb(xs, ys, n):
+    """``n`` of the points (xs, ys) picked by LTTB; first and last are kept."""
+    size = len(xs)
+    if n >= size or n < 3:
+        return list(xs), list(ys)
+    out_x, out_y = [xs[0]], [ys[0]]
+    every = (size - 2) / (n - 2)
+    a = 0
+    for i in range(n - 2):
+        # average of the next bucket is the third triangle corner
+        nxt_lo = int((i + 1) * every) + 1
+        nxt_hi = min(int((i + 2) * every) + 1, size)
+        span = nxt_hi - nxt_lo
+        avg_x = sum(xs[nxt_lo:nxt_hi]) / span
+        avg_y = sum(ys[nxt_lo:nxt_hi]) / span
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out_x.append(xs[best])
+        out_y.append(ys[best])
+        a = best
+    out_x.append(xs[-1])
+    out_y.append(ys[-1])
+    return out_x, out_y
+
+
+def minmax(xs, ys, n):
+    """Min and max of each of ``n // 2`` buckets, in x order. Cheaper than
+    LTTB and never loses an extreme, but draws a denser band."""
+    size = len(xs)
+    buckets = max(n // 2, 1)
+    if size <= n:
+        return list(xs), list(ys)
+    out_x, out_y = [], []
+    every = size / buckets
+    for b in range(buckets):
+        lo, hi = int(b * every), int((b + 1) * every)
+        seg = range(lo, max(hi, lo + 1))
+        i = min(seg, key=ys.__getitem__)
+        j = max(seg, key=ys.__getitem__)
+        for k in sorted({i, j}):
+            out_x.append(xs[k])
+            out_y.append(ys[k])
+    return out_x, out_y
+
+
+DOWNSAMPLERS = {"lttb": lttb, "minmax": minmax}
+
+
+def _month_start(day):
+    return date.fromordinal(day).replace(day=1).toordinal()
+
+
+class Timeline:
+    """Day/week/month levels of ``daily`` ({day ordinal: amount})."""
+
+    def __init__(self, daily):
+        self.levels = {level: ([], []) for level in LEVELS}
+        days = [d for d, v in daily.items() if v]
+        if not days:
+            return
+        first, last = min(days), max(days)
+        xs = list(range(first, last + 1))
+        ys = [daily.get(d, 0.0) for d in xs]
+        self.levels["day"] = (xs, ys)
+        # weeks start on Monday (ordinal 1 was a Monday)
+        self.levels["week"] = self._rollup(xs, ys, lambda d: d - (d - 1) % 7)
+        self.levels["month"] = self._rollup(xs, ys, _month_start)
+
+    @staticmethod
+    def _rollup(xs, ys, bucket):
+        out_x, sums, counts = [], [], []
+        for x, y in zip(xs, ys):
+            b = bucket(x)
+            if not out_x or out_x[-1] != b:
+                out_x.append(b)
+                sums.append(0.0)
+                counts.append(0)
+            sums[-1] += y
+            counts[-1] += 1
+        return out_x, [s / c for s, c in zip(sums, counts)]
+
+    def bounds(self):
+        xs = self.levels["day"][0]
+        return (xs[0], xs[-1]) if xs else None
+
+    def view(self, lo=None, hi=None, width=800, method="lttb"):
+        """(level, xs, ys) to draw for days ``lo``..``hi`` at ``width`` pixels.
+
+        One point either side of the range is included so the line runs
+        off the plot edges instead of stopping short while panning.
+        """
+        width = max(int(width), 3)
+        for level in LEVELS:
+            xs, ys = self.levels[level]
+            i = max(bisect_left(xs, lo) - 1, 0) if lo is not None else 0
+            j = min(bisect_right(xs, hi) + 1, len(xs)) if hi is not None else len(xs)
+            if j - i <= 2 * width:
+                break
+        xs, ys = xs[i:j], ys[i:j]
+        if len(xs) > width:
+            xs, ys = DOWNSAMPLERS[method](xs, ys, width)
+        return level, xs, ys
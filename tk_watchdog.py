@@ -0,0 +1,130 @@
+#  EMEKA EXPENSE — Tk event-loop watchdog
+#
+# A heartbeat scheduled with ``after()`` measures how late the Tk main loop
+# services it. A daemon sampling thread wakes every ``sample_interval`` and,
+# only while the heartbeat is overdue, grabs the main thread's stack with
+# sys._current_frames(). When the late heartbeat finally fires, the stall is
+# logged with its duration, the instrumented callback that was running (from
+# ``metrics.running``) and the most frequently sampled stack.
+#
+# Idle cost is one after() callback per interval and one sleeping thread,
+# so it is meant to stay enabled.
+
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+
+from instrumentation import metrics
+
+
+class Watchdog:
+    def __init__(self, root, interval_ms=100, threshold=0.2, sample_interval=0.05, max_stalls=200):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.stalls = deque(maxlen=max_stalls)
+        self._expected = None
+        self._samples = []
+        self._active = []
+        self._lock = threading.Lock()
+        self._main_id = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._job = None
+
+    # ---- lifecycle ----
+    def start(self):
+        """Start beating; must be called from the Tk thread."""
+        if self._thread is not None:
+            return
+        self._main_id = threading.get_ident()
+        self._stop.clear()
+        self._expected = time.perf_counter() + self.interval_ms / 1000
+        self._job = self.root.after(self.interval_ms, self._beat)
+        self._thread = threading.Thread(target=self._sample_loop, name="tk-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._job is not None:
+            try:
+                self.root.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
+        self._thread = None
+
+    # ---- main thread ----
+    def _beat(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self._expected)
+        metrics.record("tk.loop_lag", lag)
+        with self._lock:
+            samples, self._samples = self._samples, []
+            active, self._active = self._active, []
+            self._expected = now + self.interval_ms / 1000
+        if lag > self.threshold:
+            self._log_stall(lag, samples, active)
+        self._job = self.root.after(self.interval_ms, self._beat)
+
+    def _log_stall(self, lag, samples, active):
+        metrics.count("tk.stalls")
+        metrics.record("tk.stall", lag)
+        stack = []
+        if samples:
+            stack = list(Counter(samples).most_common(1)[0][0])
+        if active:
+            callback = active[0]
+        elif stack:
+            # not an instrumented span: the callback is the frame Tk's
+            # CallWrapper dispatched into, i.e. the one after the last tkinter frame
+            last_tk = max((i for i, (file, _, _) in enumerate(stack) if "tkinter" in file), default=-1)
+            file, line, fn = stack[min(last_tk + 1, len(stack) - 1)]
+            callback = f"{fn} ({os.path.basename(file)}:{line})"
+        else:
+            callback = "unknown"
+        self.stalls.append({
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": round(lag * 1000, 1),
+            "callback": callback,
+            "spans": active,
+            "samples": len(samples),
+            "stack": [f"{file}:{line} in {fn}" for file, line, fn in stack],
+        })
+
+    # ---- sampling thread ----
+    def _sample_loop(self):
+        while not self._stop.wait(self.sample_interval):
+            with self._lock:
+                expected = self._expected
+            if time.perf_counter() - expected < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._main_id)
+            if frame is None:
+                continue
+            stack = tuple((fs.filename, fs.lineno, fs.name) for fs in traceback.extract_stack(frame, limit=40))
+            active = metrics.running(self._main_id)
+            with self._lock:
+                if len(self._samples) < 200:
+                    self._samples.append(stack)
+                if len(active) > len(self._active):
+                    self._active = active
+
+    # ---- reporting ----
+    def recent(self, n=10):
+        return list(self.stalls)[-n:][::-1]
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "interval_ms": self.interval_ms,
+                "threshold_ms": self.threshold * 1000,
+                "stalls": list(self.stalls),
+            }, f, indent=2)
+        return len(self.stalls)